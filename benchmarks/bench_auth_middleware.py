@@ -0,0 +1,149 @@
+"""
+Keycloak auth middleware microbenchmark: requests/sec through the pure ASGI
+KeycloakAuthenticationMiddleware vs the BaseHTTPMiddleware version it
+replaced.
+
+    python benchmarks/bench_auth_middleware.py [--requests 20000] [--concurrency 50]
+
+Both middlewares share the token verification (and its cache), so the
+numbers differ only by the request plumbing. Requests are driven straight
+into the ASGI app (no sockets / HTTP client) against a small JSON route and
+a streamed one. Needs the service's config.settings importable; second_main
+is imported from services/.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from jwcrypto import jwk, jwt
+from jwcrypto.jws import InvalidJWSObject, InvalidJWSSignature
+from starlette.middleware.base import BaseHTTPMiddleware
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "services"))
+
+from config.settings import settings  # noqa: E402
+from second_main import EXCLUDED_PATHS, KeycloakAuthenticationMiddleware  # noqa: E402
+
+
+class LegacyKeycloakAuthenticationMiddleware(BaseHTTPMiddleware):
+    """The previous dispatch() (minus the per-request print), for comparison."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.auth = KeycloakAuthenticationMiddleware(None, log_sample_rate=0, rejected_log_sample_rate=0)
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method == "OPTIONS" or request.url.path in EXCLUDED_PATHS:
+            return await call_next(request)
+        try:
+            token = self.auth._get_bearer_token(request.scope)
+            decoded_token = self.auth._decode_token(token=token)
+            request.state.user = {"email": decoded_token.get("email")}
+            return await call_next(request)
+        except HTTPException as err:
+            return JSONResponse(status_code=err.status_code, content={"detail": err.detail})
+        except (InvalidJWSSignature, InvalidJWSObject):
+            return JSONResponse(status_code=401, content={"detail": "JWT Signature Verification failed"})
+        except jwt.JWTExpired as err:
+            return JSONResponse(status_code=401, content={"detail": f"Expired Token provided - {err}"})
+
+
+def build_app(middleware) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/me")
+    def me(request: Request):
+        return request.state.user
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b"x" * 256 for _ in range(8)), media_type="application/octet-stream")
+
+    if middleware is KeycloakAuthenticationMiddleware:
+        app.add_middleware(middleware, log_sample_rate=0, rejected_log_sample_rate=0)
+    else:
+        app.add_middleware(middleware)
+    return app
+
+
+def signed_token(key: jwk.JWK) -> str:
+    token = jwt.JWT(
+        header={"alg": "RS256"},
+        claims={"email": "bench@example.com", "sub": "bench", "exp": int(time.time()) + 3600},
+    )
+    token.make_signed_token(key)
+    return token.serialize()
+
+
+async def call(app, path: str, auth: bytes) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"authorization", auth)], "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+    status = 0
+    sent_body = False
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # the client stays connected; streamed responses stop listening when done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run(app, path: str, auth: bytes, requests: int, concurrency: int) -> float:
+    async def worker(count: int):
+        for _ in range(count):
+            if await call(app, path, auth) != 200:
+                raise SystemExit("unexpected status on %s" % path)
+
+    await call(app, path, auth)  # warm: token verified and cached, routes built
+    per_worker = requests // concurrency
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+    return per_worker * concurrency / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    key = jwk.JWK.generate(kty="RSA", size=2048)
+    # the setting holds the bare base64 body, as Keycloak's realm page shows it
+    settings.KEYCLOAK_PUBLIC_KEY = "".join(key.export_to_pem().decode().splitlines()[1:-1])
+    auth = ("Bearer " + signed_token(key)).encode()
+
+    apps = {
+        "BaseHTTPMiddleware": build_app(LegacyKeycloakAuthenticationMiddleware),
+        "pure ASGI": build_app(KeycloakAuthenticationMiddleware),
+    }
+    print("%d requests, concurrency %d" % (args.requests, args.concurrency))
+    for path in ("/me", "/stream"):
+        rates = {}
+        for name, app in apps.items():
+            rates[name] = await run(app, path, auth, args.requests, args.concurrency)
+            print("  %-8s %-20s %9.0f req/s" % (path, name, rates[name]))
+        print("  %-8s speedup %.2fx" % (path, rates["pure ASGI"] / rates["BaseHTTPMiddleware"]))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,330 @@
+"""
+Extraction benchmark suite over the synthetic corpus (benchmarks/corpus.py).
+
+    python benchmarks/bench_extraction.py run [--out results.json] [--scale 1.0]
+        [--paths classify,extract,ocr,headings,heading_rules,merge] [--repeat 5]
+        [--compare baseline.json]
+    python benchmarks/bench_extraction.py compare baseline.json results.json
+
+Paths and the documents they run on:
+
+    classify       classify_pdf()                          every document
+    extract        extract_structured()                    every document
+    ocr            ocr_text_from_pdf_bytes()               scanned, mixed
+    headings       classify_pages() (batch heading rules)  born-digital documents
+    heading_rules  determine_heading_level() per block     born-digital documents
+    merge          merge_tables_across_pages()             tables
+
+Each (path, document) case runs in a fresh interpreter, so its peak RSS
+(including the OCR worker processes, reported separately) is its own. The
+corpus is built once; a case only reads its document. A warm-up run is
+not timed; the converter pool is warmed before it. The page cache is off
+in the cases, so every timed run converts its document. Results
+are pages/sec, per-run latency percentiles and peak RSS, written as JSON.
+`compare` (or `run --compare`) flags cases whose pages/sec, p90 latency or
+peak RSS got worse by more than --threshold, and exits non-zero.
+
+Everything runs offline: the corpus is generated locally and the Hugging
+Face hub is put in offline mode, so Docling must find its models in the
+local cache (`--allow-network` lifts that). Needs the app package (and
+pratice2 for `merge`) importable, e.g. in the service image.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PATHS = ("classify", "extract", "ocr", "headings", "heading_rules", "merge")
+DOCUMENTS_FOR = {
+    "ocr": ("scanned", "mixed"),
+    "headings": ("digital", "mixed", "tables", "long"),
+    "heading_rules": ("digital", "mixed", "tables", "long"),
+    "merge": ("tables",),
+}
+OFFLINE_ENV = {"HF_HUB_OFFLINE": "1", "TRANSFORMERS_OFFLINE": "1"}
+# every timed run converts: no page results carried over from the warm-up or an earlier run
+CASE_ENV = {"PAGE_CACHE_ENABLED": "false"}
+DEFAULT_CORPUS_DIR = "/tmp/extraction-corpus"
+
+
+# ---- one case (runs in a child interpreter) ----
+
+def fitz_blocks(data: bytes) -> List[List[Any]]:
+    """Per page, the text blocks as Docling-like objects (.text, .spans[0].size/.font, .bbox)."""
+    import fitz
+
+    pages = []
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page in doc:
+            blocks = []
+            for block in page.get_text("dict")["blocks"]:
+                lines = block.get("lines") or []
+                spans = [span for line in lines for span in line["spans"]]
+                if not spans:
+                    continue
+                text = " ".join(span["text"] for span in spans)
+                first = SimpleNamespace(size=spans[0]["size"], font=spans[0]["font"])
+                blocks.append(SimpleNamespace(text=text, spans=[first], bbox=tuple(block["bbox"])))
+            pages.append(blocks)
+    return pages
+
+
+def prepare(path: str, data: bytes, info: Dict[str, Any]) -> Callable[[], None]:
+    """Load what the path needs (outside the timing) and return one timed run."""
+    if path == "classify":
+        from app.pdf_detect import classify_pdf
+        return lambda: classify_pdf(BytesIO(data)).close()
+    if path == "extract":
+        from app.converter_pool import converter_pool
+        from app.docling_parser import extract_structured
+        converter_pool.warm()
+        return lambda: extract_structured(BytesIO(data))
+    if path == "ocr":
+        from app.ocr import ocr_text_from_pdf_bytes
+        return lambda: ocr_text_from_pdf_bytes(BytesIO(data))
+    if path == "headings":
+        from app.heading_classifier import classify_pages
+        pages = fitz_blocks(data)
+        return lambda: classify_pages(pages)
+    if path == "heading_rules":
+        from app.heading_utils import determine_heading_level
+        blocks = [block for page in fitz_blocks(data) for block in page]
+        return lambda: [determine_heading_level(block) for block in blocks]
+    if path == "merge":
+        from pratice2 import merge_tables_across_pages
+        tables = info["tables"]
+        return lambda: merge_tables_across_pages(tables)
+    raise ValueError("unknown path %r" % path)
+
+
+def peak_rss_mb(who: int) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(path: str, info_path: str, repeat: int) -> Dict[str, Any]:
+    """One case over the document described by `info_path` (see case_info())."""
+    with open(info_path) as f:
+        info = json.load(f)
+    with open(info["path"], "rb") as f:
+        data = f.read()
+    run = prepare(path, data, info)
+    run()  # warm-up: imports, models, caches
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+    if "app.ocr" in sys.modules:
+        # RUSAGE_CHILDREN only counts workers that have exited and been waited for
+        sys.modules["app.ocr"].shutdown_ocr_executor(wait=True)
+    return {
+        "latencies": latencies,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_children_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+# ---- suite ----
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(path: str, doc: str, pages: int, raw: Dict[str, Any]) -> Dict[str, Any]:
+    latencies = raw["latencies"]
+    total = sum(latencies)
+    return {
+        "path": path,
+        "document": doc,
+        "pages": pages,
+        "runs": len(latencies),
+        "pages_per_sec": round(pages * len(latencies) / total, 3) if total > 0 else None,
+        "latency_seconds": {
+            "min": round(min(latencies), 6),
+            "mean": round(total / len(latencies), 6),
+            "p50": round(percentile(latencies, 50), 6),
+            "p90": round(percentile(latencies, 90), 6),
+            "p99": round(percentile(latencies, 99), 6),
+            "max": round(max(latencies), 6),
+        },
+        "peak_rss_mb": raw["peak_rss_mb"],
+        "peak_children_rss_mb": raw["peak_children_rss_mb"],
+    }
+
+
+def case_info(corpus_dir: str, doc: str, info: Dict[str, Any]) -> str:
+    """Write a document's corpus entry next to it for the case interpreters; returns its path."""
+    info_path = os.path.join(corpus_dir, "%s.json" % doc)
+    with open(info_path, "w") as f:
+        json.dump(info, f)
+    return info_path
+
+
+def child(args: argparse.Namespace, path: str, info_path: str) -> Dict[str, Any]:
+    env = dict(os.environ, **CASE_ENV)
+    if not args.allow_network:
+        env.update(OFFLINE_ENV)
+    cmd = [sys.executable, os.path.abspath(__file__), "case", path, info_path, "--repeat", str(args.repeat)]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["exit %d" % proc.returncode])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def environment() -> Dict[str, Any]:
+    env: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+    try:
+        env["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        env["git_commit"] = None
+    try:
+        from app.config import settings
+        env["settings"] = {name: getattr(settings, name, None) for name in (
+            "CONVERTER_POOL_SIZE", "OCR_WORKERS", "OCR_DPI", "DETECT_MAX_SAMPLE_PAGES", "STREAM_CHUNK_PAGES")}
+    except Exception:  # settings are informative only
+        env["settings"] = None
+    return env
+
+
+def run_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    from corpus import DOCUMENTS, build_corpus
+
+    corpus = build_corpus(args.corpus_dir, args.scale)
+    paths = [p for p in args.paths.split(",") if p]
+    for path in paths:
+        if path not in PATHS:
+            sys.exit("unknown path %r (expected one of %s)" % (path, ", ".join(PATHS)))
+    info_paths = {doc: case_info(args.corpus_dir, doc, info) for doc, info in corpus.items()}
+
+    results = []
+    for path in paths:
+        for doc in DOCUMENTS_FOR.get(path, tuple(DOCUMENTS)):
+            raw = child(args, path, info_paths[doc])
+            if "error" in raw:
+                print("  %-13s %-8s failed: %s" % (path, doc, raw["error"]))
+                results.append({"path": path, "document": doc, "error": raw["error"]})
+                continue
+            entry = summarize(path, doc, corpus[doc]["pages"], raw)
+            results.append(entry)
+            print("  %-13s %-8s %9.2f pages/s  p50 %8.4fs  p90 %8.4fs  rss %7.1f MiB"
+                  % (path, doc, entry["pages_per_sec"], entry["latency_seconds"]["p50"],
+                     entry["latency_seconds"]["p90"], entry["peak_rss_mb"]))
+    return {
+        "suite": "extraction",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "corpus": {name: {k: v for k, v in info.items() if k not in ("path", "tables")}
+                   for name, info in corpus.items()},
+        "results": results,
+    }
+
+
+# ---- comparison ----
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Printable regressions of `current` against `baseline` (empty when none)."""
+    if baseline.get("corpus") != current.get("corpus"):
+        print("warning: the two runs used different corpora; ratios may not be meaningful")
+    before = {(r["path"], r["document"]): r for r in baseline["results"] if "error" not in r}
+    regressions = []
+    for entry in current["results"]:
+        key = (entry["path"], entry["document"])
+        old = before.get(key)
+        if old is None or "error" in entry:
+            continue
+        checks: List[Tuple[str, Optional[float], Optional[float], bool]] = [
+            ("pages/sec", old["pages_per_sec"], entry["pages_per_sec"], True),
+            ("p90 latency", old["latency_seconds"]["p90"], entry["latency_seconds"]["p90"], False),
+            ("peak RSS", old["peak_rss_mb"], entry["peak_rss_mb"], False),
+        ]
+        for label, was, now, higher_is_better in checks:
+            if not was or now is None:
+                continue
+            change = now / was - 1
+            worse = -change if higher_is_better else change
+            marker = ""
+            if worse > threshold:
+                marker = "  REGRESSION"
+                regressions.append("%s %s: %s %+.1f%%" % (key[0], key[1], label, change * 100))
+            print("  %-13s %-8s %-12s %12.4f -> %12.4f (%+6.1f%%)%s"
+                  % (key[0], key[1], label, was, now, change * 100, marker))
+    return regressions
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def report_regressions(regressions: List[str]) -> None:
+    if regressions:
+        print("%d regression(s):" % len(regressions))
+        for line in regressions:
+            print("  " + line)
+        sys.exit(1)
+    print("no regressions")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+
+    run = sub.add_parser("run", parents=[common], help="run the suite")
+    run.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    run.add_argument("--scale", type=float, default=1.0, help="multiplies every document's page count")
+    run.add_argument("--paths", default=",".join(PATHS))
+    run.add_argument("--out", default="bench_extraction.json")
+    run.add_argument("--compare", metavar="BASELINE", help="compare against an earlier results file")
+    run.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    run.add_argument("--allow-network", action="store_true", help="do not force the model hub offline")
+
+    cmp_parser = sub.add_parser("compare", help="compare two results files")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("current")
+    cmp_parser.add_argument("--threshold", type=float, default=0.10)
+
+    case = sub.add_parser("case", parents=[common], help=argparse.SUPPRESS)
+    case.add_argument("path")
+    case.add_argument("info", help="document entry written by case_info()")
+
+    args = parser.parse_args()
+    if args.command == "case":
+        print(json.dumps(run_case(args.path, args.info, args.repeat)))
+    elif args.command == "compare":
+        report_regressions(compare(load(args.baseline), load(args.current), args.threshold))
+    else:
+        results = run_suite(args)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print("wrote %s" % args.out)
+        if args.compare:
+            report_regressions(compare(load(args.compare), results, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
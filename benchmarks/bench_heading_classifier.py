@@ -0,0 +1,151 @@
+"""
+Heading classifier parity check and benchmark.
+
+    python benchmarks/bench_heading_classifier.py [--blocks 20000] [--pages 1000]
+
+1. Parity: random blocks (including malformed spans / bboxes) must get the
+   same level from heading_levels() as from determine_heading_level(), the
+   same structure entries from classify_pages() as from the per-block loop,
+   and the same level from dict_heading_levels() as from pratice2's
+   is_heading / is_subheading. Exits non-zero on the first mismatch.
+2. Timing: per-block rules vs the batch classifier on a synthetic manual.
+
+Needs the app package and pratice2 importable (e.g. the service image) and
+numpy (requirements.txt). The parity cases also run under pytest in
+tests/test_heading_classifier.py.
+"""
+import argparse
+import random
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from app.heading_classifier import (
+    POINT_PREFIXES, BlockColumns, classify_pages, dict_heading_levels, heading_levels,
+)
+from app.heading_utils import determine_heading_level
+from pratice2 import is_heading, is_subheading
+
+TEXTS = [
+    "", "   ", "1 Introduction", "1.2 Scope of work", "1.2.3.4 Deep numbering", "12.  Spaced",
+    "A. Appendix", "B.Missing space", "OVERVIEW", "A VERY LONG UPPERCASE HEADING THAT GOES ON AND ON",
+    "Project Summary", "This Title Case Line Has More Than Ten Words In It For Sure Yes",
+    "- dash point", "* star point", "• bullet", "— em dash", "-no space", "*no space",
+    "Plain paragraph text that is not a heading.", "3) numbered with paren", "2. numbered item",
+    "x" * 130, "١٢ arabic digits", "  padded Title  ",
+]
+SIZES = [None, "12", float("nan"), 8, 11.5, 12, 13, 14, 15.9, 16, 17.99, 18, 24]
+FONTS = [None, "", "Helvetica", "Helvetica-Bold", "ArialBold", 5]
+X0S = [None, "7", 0, 39.9, 40, 60, 89.9, 90, 300]
+
+
+def random_block(rng: random.Random) -> Any:
+    spans = None
+    r = rng.random()
+    if r < 0.7:
+        spans = [SimpleNamespace(size=rng.choice(SIZES), font=rng.choice(FONTS))]
+    elif r < 0.75:
+        spans = []
+    bbox = None
+    r = rng.random()
+    if r < 0.8:
+        bbox = (rng.choice(X0S), 0, 100, 20)
+    elif r < 0.85:
+        bbox = ()
+    return SimpleNamespace(text=rng.choice(TEXTS + [None]), spans=spans, bbox=bbox)
+
+
+def random_dict_block(rng: random.Random) -> Dict[str, Any]:
+    block: Dict[str, Any] = {"text": rng.choice(TEXTS + [None])}
+    if rng.random() < 0.5:
+        block["font_size"] = rng.choice([0, 9, 12, 13, 15.5, 16, 20])
+    else:
+        block["style"] = {"font_size": rng.choice([10, 13, 16]), "font_weight": rng.choice(["", "Bold", "normal"])}
+    if rng.random() < 0.3:
+        block["font_weight"] = rng.choice(["bold", "semibold", "400", ""])
+    if rng.random() < 0.2:
+        block[rng.choice(["role", "semantic_role"])] = rng.choice(["heading", "section_heading", "paragraph", None])
+    return block
+
+
+def legacy_structure(blocks: List[Any], prefixes=POINT_PREFIXES) -> List[Dict[str, Any]]:
+    structure = []
+    for block in blocks:
+        text = (block.text or "").strip()
+        if not text:
+            continue
+        level = determine_heading_level(block)
+        if level in (1, 2):
+            structure.append({"type": "heading", "level": level, "text": text})
+        elif text.lstrip().startswith(prefixes):
+            structure.append({"type": "point", "text": text})
+        else:
+            structure.append({"type": "paragraph", "text": text})
+    return structure
+
+
+def legacy_dict_level(block: Dict[str, Any]) -> int:
+    if is_heading(block):
+        return 1
+    if is_subheading(block):
+        return 2
+    return 0
+
+
+def check_parity(count: int, seed: int) -> None:
+    rng = random.Random(seed)
+    blocks = [random_block(rng) for _ in range(count)]
+    levels = heading_levels(BlockColumns.from_docling_blocks(blocks)).tolist()
+    for block, level in zip(blocks, levels):
+        if level != determine_heading_level(block):
+            sys.exit("heading level mismatch for %r: batch %d, per-block %d"
+                     % (vars(block), level, determine_heading_level(block)))
+
+    pages = [blocks[i:i + 37] for i in range(0, len(blocks), 37)]
+    for prefixes in (POINT_PREFIXES, POINT_PREFIXES + ("-", "*")):
+        batch = [[item.to_dict() for item in structure] for structure in classify_pages(pages, prefixes)]
+        if batch != [legacy_structure(p, prefixes) for p in pages]:
+            sys.exit("structure mismatch (prefixes %r)" % (prefixes,))
+
+    dict_blocks = [random_dict_block(rng) for _ in range(count)]
+    dict_levels = dict_heading_levels(BlockColumns.from_dict_blocks(dict_blocks)).tolist()
+    for block, level in zip(dict_blocks, dict_levels):
+        text = (block.get("text") or "").strip()
+        expected = legacy_dict_level(block) if text else 0
+        if level != expected:
+            sys.exit("dict heading mismatch for %r: batch %d, per-block %d" % (block, level, expected))
+    print("parity ok: %d docling blocks, %d dict blocks" % (count, count))
+
+
+def best_of(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=20000, help="random blocks for the parity check")
+    parser.add_argument("--pages", type=int, default=1000, help="pages in the timed manual")
+    parser.add_argument("--blocks-per-page", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    check_parity(args.blocks, args.seed)
+
+    rng = random.Random(args.seed)
+    pages = [[random_block(rng) for _ in range(args.blocks_per_page)] for _ in range(args.pages)]
+    legacy = best_of(lambda: [legacy_structure(p) for p in pages])
+    batch = best_of(classify_pages, pages)
+    total = args.pages * args.blocks_per_page
+    print("%d pages, %d blocks" % (args.pages, total))
+    print("  per-block rules: %.3fs (%.2f us/block)" % (legacy, legacy / total * 1e6))
+    print("  batch classifier: %.3fs (%.2f us/block), %.2fx" % (batch, batch / total * 1e6, legacy / batch))
+
+
+if __name__ == "__main__":
+    main()
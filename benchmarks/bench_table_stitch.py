@@ -0,0 +1,130 @@
+"""
+Table stitching benchmark: time stitch_tables() on synthetic spreadsheet-style
+reports of growing size and check that the cost grows about linearly.
+
+    python benchmarks/bench_table_stitch.py [--max-fragments 64000] [--legacy]
+
+--legacy also times the old all-pairs merge (pratice2) up to 4000 fragments
+for comparison.
+"""
+import argparse
+import gc
+import math
+import random
+import time
+from typing import Any, Dict, List
+
+from app.table_stitch import stitch_tables
+
+WORDS = ["region", "account", "amount", "date", "owner", "status", "category",
+         "quantity", "price", "total", "vendor", "invoice", "balance", "notes"]
+
+
+def synthetic_fragments(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """
+    `count` table fragments, 3 per page. Each logical table runs over several
+    pages; ~1 in 10 repeated headers carries an OCR-style typo.
+    """
+    rng = random.Random(seed)
+    fragments = []
+    open_tables: List[List[str]] = []
+    page = 1
+    while len(fragments) < count:
+        next_open = []
+        for slot in range(3):
+            if slot < len(open_tables) and rng.random() < 0.8:
+                header = list(open_tables[slot])
+                if rng.random() < 0.1:
+                    i = rng.randrange(len(header))
+                    header[i] = header[i][:-1] + "x"  # typo, still a fuzzy match
+            else:
+                header = ["%s %d" % (w, rng.randrange(1000)) for w in rng.sample(WORDS, rng.randint(3, 7))]
+            rows = [header] + [[str(rng.randrange(10 ** 6)) for _ in header] for _ in range(5)]
+            fragments.append({"page": page, "rows": rows})
+            next_open.append(header)
+            if len(fragments) >= count:
+                break
+        open_tables = next_open
+        page += 1
+    return fragments
+
+
+def legacy_merge(tables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The pre-stitching all-pairs merge from pratice2, kept for comparison."""
+    def normalize(headers):
+        return [h.strip().lower() for h in headers if h.strip()]
+
+    merged = []
+    used = [False] * len(tables)
+    for i, t1 in enumerate(tables):
+        if used[i]:
+            continue
+        cur = {"start_page": t1["page"], "end_page": t1["page"], "rows": t1["rows"].copy()}
+        used[i] = True
+        for j, t2 in enumerate(tables[i + 1:], start=i + 1):
+            if used[j]:
+                continue
+            h1 = normalize(t1["rows"][0]) if t1["rows"] else []
+            h2 = normalize(t2["rows"][0]) if t2["rows"] else []
+            if h1 and h2 and (h1 == h2 or len(set(h1).intersection(h2)) / len(h1) > 0.7):
+                cur["rows"].extend(t2["rows"][1:])
+                cur["end_page"] = t2["page"]
+                used[j] = True
+        merged.append(cur)
+    return merged
+
+
+def best_of(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    gc.collect()
+    gc.disable()  # collector pauses on the growing row lists would swamp the signal
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(*args)
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-fragments", type=int, default=64000)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    sizes = []
+    n = 1000
+    while n <= args.max_fragments:
+        sizes.append(n)
+        n *= 2
+
+    print("%10s %12s %12s %10s %10s %12s" % ("fragments", "adjacent_s", "any_page_s", "us/frag", "growth", "legacy_s"))
+    prev = None
+    times = {}
+    for n in sizes:
+        fragments = synthetic_fragments(n)
+        adjacent = best_of(stitch_tables, fragments, True)
+        any_page = best_of(stitch_tables, fragments, False)
+        growth = adjacent / prev if prev else None
+        times[n] = (adjacent, any_page)
+        legacy = best_of(legacy_merge, fragments, repeat=1) if args.legacy and n <= 4000 else None
+        print("%10d %12.4f %12.4f %10.2f %10s %12s" % (
+            n, adjacent, any_page, adjacent / n * 1e6,
+            "%.2fx" % growth if growth else "-",
+            "%.4f" % legacy if legacy is not None else "-",
+        ))
+        prev = adjacent
+
+    # time ~ fragments ** exponent between the smallest and largest size; 1.0 is linear,
+    # single doublings are too noisy at the small end to judge by
+    if len(sizes) > 1:
+        first, last = sizes[0], sizes[-1]
+        for i, mode in enumerate(("adjacent", "any_page")):
+            exponent = math.log(times[last][i] / times[first][i]) / math.log(last / first)
+            print("%s scaling exponent: %.2f (%s)" % (mode, exponent, "near-linear" if exponent < 1.25 else "SUPERLINEAR"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Deterministic synthetic PDF corpus for the extraction benchmarks.
+
+Every document is generated from a fixed seed with PyMuPDF only (no
+network, no fonts beyond the PDF base 14), so the same corpus, byte for
+byte, can be rebuilt on any machine:
+
+    digital  born-digital pages: numbered headings, paragraphs, bullet points
+    scanned  the same kind of pages rasterized to images (no text layer)
+    mixed    born-digital with every fourth page scanned
+    tables   table-heavy pages; tables continue across pages with a repeated header
+    long     a long born-digital manual
+
+    python benchmarks/corpus.py [--out-dir /tmp/extraction-corpus] [--scale 1.0]
+"""
+import argparse
+import hashlib
+import os
+import random
+from typing import Any, Dict, List, Tuple
+
+import fitz
+
+# name -> (pages at scale 1.0, seed)
+DOCUMENTS = {
+    "digital": (20, 101),
+    "scanned": (6, 102),
+    "mixed": (12, 103),
+    "tables": (30, 104),
+    "long": (500, 105),
+}
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+SCAN_DPI = 150
+# fixed metadata so the bytes do not depend on when the corpus was built
+METADATA = {"producer": "extraction benchmark corpus", "creationDate": "D:20240101000000Z",
+            "modDate": "D:20240101000000Z"}
+
+WORDS = ("invoice", "contract", "amount", "delivery", "schedule", "payment", "customer", "service",
+         "report", "quarter", "balance", "region", "account", "period", "review", "approval",
+         "warehouse", "shipment", "policy", "coverage", "the", "of", "and", "for", "with", "per")
+TITLES = ("Introduction", "Scope Of Work", "Payment Terms", "Delivery Schedule", "Warranty",
+          "Definitions", "Responsibilities", "Termination", "Summary", "Appendix")
+COLUMNS = ("Item", "Description", "Quantity", "Unit Price", "Amount", "Region", "Status", "Date")
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _write_text_page(page: "fitz.Page", rng: random.Random, section: int) -> None:
+    """Headings, paragraphs and bullet points down the page."""
+    shape = page.new_shape()  # one content stream update per page
+    y = MARGIN + 20
+    sub = 0
+    while y < PAGE_HEIGHT - 160:
+        if sub == 0:
+            shape.insert_text((MARGIN, y), "%d %s" % (section, rng.choice(TITLES)), fontname="hebo", fontsize=18)
+            y += 30
+        else:
+            shape.insert_text((MARGIN + 10, y), "%d.%d %s" % (section, sub, rng.choice(TITLES)),
+                              fontname="hebo", fontsize=14)
+            y += 24
+        sub += 1
+        para = " ".join(sentence(rng, rng.randint(8, 18)) for _ in range(rng.randint(2, 4)))
+        rect = fitz.Rect(MARGIN, y, PAGE_WIDTH - MARGIN, y + 90)
+        shape.insert_textbox(rect, para, fontname="helv", fontsize=10)
+        y += 95
+        for _ in range(rng.randint(0, 3)):
+            shape.insert_text((MARGIN + 20, y), "- " + sentence(rng, rng.randint(4, 9)), fontname="helv", fontsize=10)
+            y += 15
+        y += 10
+    shape.commit()
+
+
+def _table_fragment(rng: random.Random, header: List[str], rows: int) -> List[List[str]]:
+    body = []
+    for _ in range(rows):
+        body.append([
+            "%d" % rng.randint(1, 999) if col in ("Item", "Quantity") else
+            "%.2f" % (rng.random() * 1000) if col in ("Unit Price", "Amount") else
+            "2024-%02d-%02d" % (rng.randint(1, 12), rng.randint(1, 28)) if col == "Date" else
+            rng.choice(WORDS)
+            for col in header
+        ])
+    return [list(header)] + body
+
+
+def _draw_table(shape: "fitz.Shape", top: float, rows: List[List[str]]) -> float:
+    """Ruled grid with one text line per cell; returns the y below the table."""
+    col_width = (PAGE_WIDTH - 2 * MARGIN) / len(rows[0])
+    row_height = 16
+    for r, row in enumerate(rows):
+        y = top + r * row_height
+        for c in range(len(row)):
+            x = MARGIN + c * col_width
+            shape.draw_rect(fitz.Rect(x, y, x + col_width, y + row_height))
+    shape.finish(color=(0, 0, 0), width=0.5)
+    for r, row in enumerate(rows):
+        y = top + r * row_height
+        for c, cell in enumerate(row):
+            shape.insert_text((MARGIN + c * col_width + 3, y + 12), cell[:14],
+                              fontname="hebo" if r == 0 else "helv", fontsize=8)
+    return top + len(rows) * row_height
+
+
+def _write_table_page(page: "fitz.Page", rng: random.Random, page_number: int,
+                      open_tables: List[List[str]]) -> List[Dict[str, Any]]:
+    """
+    Two tables per page. Each continues the table in the same slot on the
+    previous page (same header) most of the time, or starts a new one.
+    Returns the fragments as extraction-style {"page", "rows"} dicts.
+    """
+    fragments = []
+    shape = page.new_shape()
+    y = MARGIN + 20
+    shape.insert_text((MARGIN, y), "Schedule %d" % page_number, fontname="hebo", fontsize=14)
+    y += 20
+    for slot in range(2):
+        if slot < len(open_tables) and rng.random() < 0.75:
+            header = open_tables[slot]
+        else:
+            header = rng.sample(COLUMNS, rng.randint(4, 7))
+            if slot < len(open_tables):
+                open_tables[slot] = header
+            else:
+                open_tables.append(header)
+        rows = _table_fragment(rng, header, rng.randint(8, 18))
+        y = _draw_table(shape, y, rows) + 24
+        fragments.append({"page": page_number, "rows": rows})
+    shape.commit()
+    return fragments
+
+
+def _scan(doc: "fitz.Document", page_number: int, rng: random.Random) -> None:
+    """Append a page that is only an image of a text page (what a scanner produces)."""
+    src = fitz.open()
+    _write_text_page(src.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT), rng, page_number)
+    pix = src[0].get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY)
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_image(page.rect, pixmap=pix)
+    src.close()
+
+
+def build_document(name: str, scale: float = 1.0) -> Tuple[bytes, List[Dict[str, Any]]]:
+    """(PDF bytes, table fragments drawn into it) for one corpus document."""
+    base_pages, seed = DOCUMENTS[name]
+    pages = max(1, int(round(base_pages * scale)))
+    rng = random.Random(seed)
+    doc = fitz.open()
+    tables: List[Dict[str, Any]] = []
+    open_tables: List[List[str]] = []
+    for n in range(1, pages + 1):
+        if name == "scanned" or (name == "mixed" and n % 4 == 0):
+            _scan(doc, n, rng)
+        elif name == "tables":
+            tables.extend(_write_table_page(doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT), rng, n, open_tables))
+        else:
+            _write_text_page(doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT), rng, n)
+    doc.set_metadata(METADATA)
+    data = doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+    return data, tables
+
+
+def build_corpus(out_dir: str, scale: float = 1.0) -> Dict[str, Dict[str, Any]]:
+    """
+    Write every document to `out_dir` (skipping ones already there with
+    the same content) and return {name: {path, pages, bytes, sha256, tables}}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    corpus = {}
+    for name in DOCUMENTS:
+        data, tables = build_document(name, scale)
+        path = os.path.join(out_dir, "%s.pdf" % name)
+        digest = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(path) or _sha256(path) != digest:
+            with open(path, "wb") as f:
+                f.write(data)
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            page_count = doc.page_count
+        corpus[name] = {"path": path, "pages": page_count, "bytes": len(data), "sha256": digest, "tables": tables}
+    return corpus
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out-dir", default="/tmp/extraction-corpus")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every document's page count")
+    args = parser.parse_args()
+    for name, info in build_corpus(args.out_dir, args.scale).items():
+        print("%-8s %4d pages %9d bytes  %s" % (name, info["pages"], info["bytes"], info["sha256"][:16]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,399 @@
+import hashlib
 import json
+import logging
+import random
+import threading
+import time
+import urllib.request
 from base64 import b64decode
-from typing import override
+from collections import OrderedDict
+from typing import Any
 
-from fastapi import HTTPException, Request
+from fastapi import HTTPException
 from fastapi.responses import JSONResponse
 from jwcrypto import jwk, jwt
-from jwcrypto.common import json_decode
+from jwcrypto.common import base64url_decode, json_decode
 from jwcrypto.jws import InvalidJWSObject, InvalidJWSSignature
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
 
 from config.settings import settings
 
 EXCLUDED_PATHS = {"/docs", "/redoc", "/api/v1/openapi.json"}
+# a stats_path for services that want the middleware to answer it (authenticated)
+# with cache_stats() as JSON; it shadows any app route there, so it is off by default
+AUTH_STATS_PATH = "/auth/stats"
 
+# leeway refers to the amount of time tolerance allowed when checking
+# the validity of time-based claims in the token
+ONE_MINUTE_IN_SECONDS = 60  # pylint: disable=invalid-name
 
-class KeycloakAuthenticationMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, excluded_paths: set[str] | None = None):
-        super().__init__(app)
-        self.excluded_paths = excluded_paths
+TOKEN_CACHE_MAX_ITEMS = 10_000
+TOKEN_CACHE_MAX_TTL_SECONDS = 300
+
+JWKS_REFRESH_SECONDS = 300
+JWKS_REFRESH_JITTER = 0.1  # +-10% so replicas do not refresh in lockstep
+JWKS_MIN_REFRESH_GAP_SECONDS = 10  # unknown kids cannot force refreshes faster than this
+JWKS_FETCH_TIMEOUT_SECONDS = 5
+
+AUTH_LOG_SAMPLE_RATE = 0.01  # fraction of accepted requests logged
+AUTH_REJECTED_LOG_SAMPLE_RATE = 1.0  # fraction of rejected requests logged
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownKeyIdError(HTTPException):
+    def __init__(self, kid: str | None):
+        super().__init__(status_code=401, detail="Unknown signing key")
+        self.kid = kid
+
+
+class PublicKeyCache:
+    """
+    The Keycloak public key parsed once.
+
+    `settings.KEYCLOAK_PUBLIC_KEY` is compared on every call (a string
+    compare); when it changes the key is parsed again and `on_rotate` runs.
+    """
+
+    def __init__(self, on_rotate=None):
+        self._raw: str | None = None
+        self._key: jwk.JWK | None = None
+        self._lock = threading.Lock()
+        self._on_rotate = on_rotate
+        self.reloads = 0
+
+    def get(self) -> jwk.JWK:
+        raw = settings.KEYCLOAK_PUBLIC_KEY
+        if raw == self._raw and self._key is not None:
+            return self._key
+        with self._lock:
+            if raw != self._raw or self._key is None:
+                public_key: str = (
+                    "-----BEGIN PUBLIC KEY-----\n"
+                    + raw
+                    + "\n-----END PUBLIC KEY-----"
+                )
+                self._key = jwk.JWK.from_pem(public_key.encode("utf-8"))
+                rotated = self._raw is not None
+                self._raw = raw
+                self.reloads += 1
+                if rotated and self._on_rotate is not None:
+                    self._on_rotate()
+            return self._key
+
+
+class JwksKeyStore:
+    """
+    Signing keys from a JWKS document, indexed by `kid`.
+
+    `source` is an http(s) URL or a file path (optionally file://). Keys are
+    reloaded in a background thread every `refresh_seconds` +- jitter; a
+    failed reload keeps the previous keys. An unknown kid triggers at most
+    one refresh at a time (callers arriving meanwhile wait for it and take
+    its answer instead of fetching again), and not more often than
+    `min_refresh_gap` seconds. `on_keys_removed` runs when a reload drops
+    keys that were known. start() fetches, so call it off the event loop.
+    """
 
-    @override
-    async def dispatch(self, request: Request, call_next):
-        # NOTE: Skip OPTIONS (CORS preflight) and excluded paths
-        if request.method == "OPTIONS" or request.url.path in EXCLUDED_PATHS:
-            return await call_next(request)
+    def __init__(
+        self,
+        source: str,
+        refresh_seconds: float = JWKS_REFRESH_SECONDS,
+        jitter: float = JWKS_REFRESH_JITTER,
+        min_refresh_gap: float = JWKS_MIN_REFRESH_GAP_SECONDS,
+        timeout: float = JWKS_FETCH_TIMEOUT_SECONDS,
+        on_keys_removed=None,
+    ):
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self.jitter = jitter
+        self.min_refresh_gap = min_refresh_gap
+        self.timeout = timeout
+        self._on_keys_removed = on_keys_removed
+        self._keys: dict[str | None, jwk.JWK] = {}
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._last_refresh = float("-inf")
+        self._attempts = 0  # refreshes finished, failed ones included
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.refreshes = 0
+        self.refresh_failures = 0
 
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        """Load the keys now and keep them fresh in the background; callers racing it wait for the load."""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self.refresh()
+            self._thread = threading.Thread(target=self._run, name="jwks-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def get(self, kid: str | None) -> jwk.JWK | None:
+        key = self._keys.get(kid)
+        if key is None and kid is None and len(self._keys) == 1:
+            # token without a kid and a single-key set: the only candidate
+            key = next(iter(self._keys.values()))
+        return key
+
+    def refresh_for(self, kid: str | None) -> None:
+        """Coalesced refresh after a lookup for `kid` missed."""
+        attempts = self._attempts
+        with self._refresh_lock:
+            if self.get(kid) is not None:
+                return  # another caller's refresh already brought it in
+            if self._attempts != attempts:
+                return  # a refresh ran while we waited: the kid is not there
+            if time.monotonic() - self._last_refresh < self.min_refresh_gap:
+                return
+            self._refresh_locked()
+
+    def refresh(self) -> None:
+        with self._refresh_lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self) -> None:
+        self._last_refresh = time.monotonic()
         try:
-            token = self._get_bearer_token(request)
-            decoded_token = self._decode_token(token=token)
-            print(decoded_token)
+            keys = self._load()
+        except Exception as err:  # pylint: disable=broad-except
+            self.refresh_failures += 1
+            logger.warning("JWKS refresh from %s failed: %s", self.source, err)
+            return
+        finally:
+            self._attempts += 1
+        removed = self._keys.keys() - keys.keys()
+        self._keys = keys
+        self.refreshes += 1
+        if removed and self._on_keys_removed is not None:
+            self._on_keys_removed()
 
-            request.state.user = {"email": decoded_token.get("email")}
+    def _load(self) -> dict[str | None, jwk.JWK]:
+        if self.source.startswith(("http://", "https://")):
+            with urllib.request.urlopen(self.source, timeout=self.timeout) as resp:
+                raw = resp.read()
+        else:
+            path = self.source.removeprefix("file://")
+            with open(path, "rb") as f:
+                raw = f.read()
+        key_set = jwk.JWKSet.from_json(raw)
+        return {key.get("kid"): key for key in key_set}
 
-            response = await call_next(request)
-            return response
-        except HTTPException as err:
-            return JSONResponse(
-                status_code=err.status_code, content={"detail": err.detail}
+    def _run(self) -> None:
+        while True:
+            delay = self.refresh_seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+            if self._stop.wait(delay):
+                return
+            self.refresh()
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of verified token claims keyed by the SHA-256 of the token.
+
+    An entry lives at most `max_ttl` seconds and never past the token's
+    `exp`, so an expired token is always re-validated (and rejected).
+    """
+
+    def __init__(self, max_items: int = TOKEN_CACHE_MAX_ITEMS, max_ttl: float = TOKEN_CACHE_MAX_TTL_SECONDS):
+        self.max_items = max_items
+        self.max_ttl = max_ttl
+        self._entries: OrderedDict[bytes, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        key = self.key_for(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, claims: dict[str, Any]) -> None:
+        expires = time.time() + self.max_ttl
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            expires = min(expires, exp)
+        if expires <= time.time() or self.max_items <= 0:
+            return
+        key = self.key_for(token)
+        with self._lock:
+            self._entries[key] = (expires, claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+
+class SampledLogger:
+    """
+    Structured auth log lines, sampled.
+
+    Each line is the event name plus its fields as JSON; the fields are
+    also attached as `record.auth` for structured handlers. Only a
+    `sample_rate` fraction of calls are logged so a busy service (or a
+    client retrying a bad token) cannot flood the log.
+    """
+
+    def __init__(self, log: logging.Logger, sample_rate: float):
+        self._log = log
+        self.sample_rate = sample_rate
+
+    def log(self, level: int, event: str, sample_rate: float | None = None, **fields: Any) -> None:
+        rate = self.sample_rate if sample_rate is None else sample_rate
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return
+        if not self._log.isEnabledFor(level):
+            return
+        fields["sample_rate"] = rate
+        self._log.log(level, "%s %s", event, json.dumps(fields, default=str), extra={"auth": fields})
+
+
+class KeycloakAuthenticationMiddleware:
+    """
+    Pure ASGI middleware that verifies the Keycloak bearer token.
+
+    OPTIONS requests (CORS preflight) and the excluded paths pass straight
+    through; otherwise the verified user is stored in the request state
+    (`request.state.user`) or an error JSON response is sent. Nothing wraps
+    the response, so streamed bodies go out untouched. With a `stats_path`
+    (e.g. AUTH_STATS_PATH) an authenticated GET of it is answered with
+    cache_stats() instead of reaching the app; off by default.
+    """
+
+    def __init__(
+        self,
+        app,
+        excluded_paths: set[str] | None = None,
+        token_cache_size: int = TOKEN_CACHE_MAX_ITEMS,
+        token_cache_ttl: float = TOKEN_CACHE_MAX_TTL_SECONDS,
+        jwks_source: str | None = None,
+        log_sample_rate: float | None = None,
+        rejected_log_sample_rate: float | None = None,
+        stats_path: str | None = None,
+    ):
+        self.app = app
+        self.stats_path = stats_path
+        # kept for callers, but as before only the module's EXCLUDED_PATHS
+        # are let through unauthenticated
+        self.excluded_paths = excluded_paths
+        self.token_cache = VerifiedTokenCache(token_cache_size, token_cache_ttl)
+        # claims verified with a rotated-out key must not be served again
+        self.public_key = PublicKeyCache(on_rotate=self.token_cache.clear)
+        # JWKS URL / file; without one the static KEYCLOAK_PUBLIC_KEY is used
+        jwks_source = jwks_source or getattr(settings, "KEYCLOAK_JWKS_SOURCE", None)
+        self.jwks: JwksKeyStore | None = None
+        if jwks_source:
+            # started by the first request, in the threadpool: Starlette builds
+            # middleware on the event loop, where the fetch would block
+            self.jwks = JwksKeyStore(jwks_source, on_keys_removed=self.token_cache.clear)
+        if log_sample_rate is None:
+            log_sample_rate = getattr(settings, "AUTH_LOG_SAMPLE_RATE", AUTH_LOG_SAMPLE_RATE)
+        if rejected_log_sample_rate is None:
+            rejected_log_sample_rate = getattr(
+                settings, "AUTH_REJECTED_LOG_SAMPLE_RATE", AUTH_REJECTED_LOG_SAMPLE_RATE
             )
+        self.auth_log = SampledLogger(logger, log_sample_rate)
+        self.rejected_log_sample_rate = rejected_log_sample_rate
+
+    def cache_stats(self) -> dict[str, int]:
+        """Verified-token cache hits / misses / evictions / size and key reloads."""
+        stats = dict(self.token_cache.stats(), key_reloads=self.public_key.reloads)
+        if self.jwks is not None:
+            stats.update(jwks_refreshes=self.jwks.refreshes, jwks_refresh_failures=self.jwks.refresh_failures)
+        return stats
+
+    async def __call__(self, scope, receive, send) -> None:
+        # NOTE: Skip non-HTTP scopes, OPTIONS (CORS preflight) and excluded paths
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or scope["path"] in EXCLUDED_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if self.jwks is not None and not self.jwks.started:
+            await run_in_threadpool(self.jwks.start)
+
+        try:
+            token = self._get_bearer_token(scope)
+            try:
+                decoded_token = self._decode_token(token=token)
+            except UnknownKeyIdError as err:
+                if self.jwks is None:
+                    raise
+                # keys may have rotated: one shared refresh, then one retry
+                await run_in_threadpool(self.jwks.refresh_for, err.kid)
+                decoded_token = self._decode_token(token=token)
+        except HTTPException as err:
+            status_code, detail = err.status_code, err.detail
         except (InvalidJWSSignature, InvalidJWSObject):
-            return JSONResponse(
-                status_code=401, content={"detail": "JWT Signature Verification failed"}
-            )
+            status_code, detail = 401, "JWT Signature Verification failed"
         except jwt.JWTExpired as err:
-            return JSONResponse(
-                status_code=401, content={"detail": f"Expired Token provided - {err}"}
+            status_code, detail = 401, f"Expired Token provided - {err}"
+        else:
+            self.auth_log.log(
+                logging.INFO,
+                "auth.accepted",
+                method=scope["method"],
+                path=scope["path"],
+                sub=decoded_token.get("sub"),
+                client=decoded_token.get("azp"),
             )
+            if scope["method"] == "GET" and scope["path"] == self.stats_path:
+                await JSONResponse(self.cache_stats())(scope, receive, send)
+                return
+            scope.setdefault("state", {})["user"] = {"email": decoded_token.get("email")}
+            await self.app(scope, receive, send)
+            return
 
-    def _get_bearer_token(self, request: Request) -> str:
+        self.auth_log.log(
+            logging.WARNING,
+            "auth.rejected",
+            sample_rate=self.rejected_log_sample_rate,
+            method=scope["method"],
+            path=scope["path"],
+            status=status_code,
+            detail=detail,
+        )
+        response = JSONResponse(status_code=status_code, content={"detail": detail})
+        await response(scope, receive, send)
+
+    def _get_bearer_token(self, scope) -> str:
         """
         Extracts and validates the Bearer token from the Authorization header.
 
@@ -57,7 +403,12 @@ class KeycloakAuthenticationMiddleware(BaseHTTPMiddleware):
         Raises:
             UnauthorizedError: If the token is missing or invalid.
         """
-        auth_header = request.headers.get("Authorization")
+        auth_header = None
+        # ASGI header names are lower-case bytes
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                break
         if not auth_header:
             raise HTTPException(status_code=401, detail="Missing Authorization header")
 
@@ -67,6 +418,22 @@ class KeycloakAuthenticationMiddleware(BaseHTTPMiddleware):
 
         return token_parts[1]
 
+    def _signing_key(self, token: str) -> jwk.JWK:
+        """The key for this token: by its `kid` from the JWKS, else the static key."""
+        if self.jwks is None:
+            return self.public_key.get()
+        try:
+            header = json.loads(base64url_decode(token.split(".")[0]))
+        except ValueError as err:
+            raise HTTPException(status_code=401, detail="Invalid keycloak token") from err
+        if not isinstance(header, dict):
+            raise HTTPException(status_code=401, detail="Invalid keycloak token")
+        kid = header.get("kid")
+        key = self.jwks.get(kid)
+        if key is None:
+            raise UnknownKeyIdError(kid)
+        return key
+
     def _decode_token(self, token: str, **kwargs):
         """
         Decode user token.
@@ -74,7 +441,8 @@ class KeycloakAuthenticationMiddleware(BaseHTTPMiddleware):
 
         :param token: Keycloak token
         :param kwargs: Additional keyword arguments for jwcrypto's JWT object
-        :returns: Decoded token
+        :returns: Decoded token (from the verified-token cache when this
+            exact token was verified before and has not expired)
         """
         if settings.BYPASS_AUTH_SIG_CHECK:
             token_payload = token.split(".")[1]
@@ -85,12 +453,14 @@ class KeycloakAuthenticationMiddleware(BaseHTTPMiddleware):
             data = json.loads(decoded_token)
             return data
 
-        public_key: str = (
-            "-----BEGIN PUBLIC KEY-----\n"
-            + settings.KEYCLOAK_PUBLIC_KEY
-            + "\n-----END PUBLIC KEY-----"
-        )
-        json_web_key = jwk.JWK.from_pem(public_key.encode("utf-8"))
+        # resolve the key first: a rotated static key clears the cache, and
+        # a kid that left the JWKS is rejected even for a cached token
+        json_web_key = self._signing_key(token)
+
+        if not kwargs:
+            cached = self.token_cache.get(token)
+            if cached is not None:
+                return cached
 
         try:
             full_jwt = jwt.JWT(jwt=token, **kwargs)
@@ -99,10 +469,10 @@ class KeycloakAuthenticationMiddleware(BaseHTTPMiddleware):
                 status_code=401, detail="Invalid keycloak token"
             ) from err
 
-        # leeway refers to the amount of time tolerance allowed when checking
-        # the validity of time-based claims in the token
-        ONE_MINUTE_IN_SECONDS = 60  # pylint: disable=invalid-name
         full_jwt.leeway = ONE_MINUTE_IN_SECONDS
 
         full_jwt.validate(json_web_key)
-        return json_decode(full_jwt.claims)
+        claims = json_decode(full_jwt.claims)
+        if not kwargs:
+            self.token_cache.put(token, claims)
+        return claims
@@ -1,114 +1,300 @@
 # app/docling_parser.py
 from io import BytesIO
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple
 from app.config import settings
 from app.logger import logger
-from app.heading_utils import determine_heading_level, headers_match
-from app.utils_imports import safe_import_docling
+from app.heading_classifier import classify_pages
+from app.result_model import ENGINE_DOCLING, ENGINE_FAST, ExtractionResult, Page, Table
+from app.table_stitch import stitch_tables
+from app.converter_pool import converter_pool
 
-DocumentConverter, InputFormat = safe_import_docling()
+# OCR fallback (page-parallel tesseract workers)
+from app.ocr import collect_ocr_stats, iter_ocr_pages
 
-# OCR fallback
-from pdf2image import convert_from_bytes
-import pytesseract
+# Docling-free text extraction for born-digital pages (engine="fast")
+from app.native_text import fast_pages
 
-# PyMuPDF for quick scanned detection
-import fitz
+# PyMuPDF page classification (opened once, shared with later stages)
+from app.pdf_detect import PAGE_SCANNED, PdfClassification, classify_pdf
 
-def ocr_text_from_pdf_bytes(pdf_bytes: BytesIO) -> List[str]:
-    pdf_bytes.seek(0)
-    images = convert_from_bytes(pdf_bytes.read(), dpi=300)
-    texts = []
-    for img in images:
-        texts.append(pytesseract.image_to_string(img))
-    pdf_bytes.seek(0)
-    return texts
+# results of pages unchanged since an earlier revision of the document
+from app.page_cache import remember_pages, reuse_pages
+from app.pdf_buffer import converter_source
+from app.page_ranges import ALL_PAGES, PageSelection, contiguous_runs
+from app.metrics import timed
+
+# per-page deadlines; the request deadline / client disconnect stop the whole extraction
+from app.deadlines import DeadlineExceeded, ExtractionCancelled, PageTimeout, check_deadline, run_with_deadline
+
+# bullets may or may not have a space after the marker here
+POINT_PREFIXES = ("- ", "* ", "•", "—", "-", "*")
 
 def is_scanned_pdf(pdf_bytes: BytesIO) -> bool:
-    pdf_bytes.seek(0)
-    try:
-        data = pdf_bytes.read()
-        doc = fitz.open(stream=data, filetype="pdf")
-        for p in doc:
-            if p.get_text().strip():
-                pdf_bytes.seek(0)
-                return False
-        pdf_bytes.seek(0)
-        return True
-    except Exception as e:
-        logger.warning("fitz check failed: %s; treating as not scanned", e)
-        pdf_bytes.seek(0)
-        return False
+    classification = classify_pdf(pdf_bytes)
+    classification.close()
+    return classification.is_scanned
 
-def extract_structured(pdf_stream: BytesIO) -> Dict[str, Any]:
+@timed("extract")
+def extract_structured(pdf_stream: BytesIO, selection: PageSelection = ALL_PAGES,
+                       engine: str = ENGINE_DOCLING) -> ExtractionResult:
     """
-    Returns JSON dict:
+    engine="docling" runs layout analysis on every born-digital page;
+    engine="fast" reads them from their PyMuPDF text and only sends pages
+    that look like they hold a table to Docling.
+
+    Returns an ExtractionResult that serializes to:
     {
       "file": null,
       "pages": [
-         { "page_number":1, "structure":[{"type":"heading","level":1,"text":...}, ...], "tables":[...] },
+         { "page_number":1, "structure":[{"type":"heading","level":1,"text":...}, ...], "tables":[...],
+           "engine":"docling" | "fast" | "ocr" },
          ...
       ],
-      "merged_tables": [ {"start_page":1,"end_page":2,"rows":[...]} ]
+      "merged_tables": [ {"start_page":1,"end_page":2,"rows":[...]} ],
+      "reused_pages": 0,  # pages served from the page cache (absent when it is off)
+      "ocr": {"pages":3, "dpi":300, "low_dpi":200, "full_dpi_pages":1,
+              "cpu_seconds":..., "cpu_seconds_saved":...}   # only when pages were OCRed
     }
     """
-    logger.info("Starting extraction (CPU mode)")
+    logger.info("Starting extraction (CPU mode, %s engine)", engine)
 
-    # detect scanned
-    if is_scanned_pdf(pdf_stream):
-        logger.info("Scanned PDF detected -> OCRing each page")
-        ocr_pages = ocr_text_from_pdf_bytes(pdf_stream)
-        pages = []
-        for i, t in enumerate(ocr_pages, start=1):
-            pages.append({
-                "page_number": i,
-                "structure": [{"type":"paragraph", "text": t.strip()}],
-                "tables": []
-            })
-        return {"file": None, "pages": pages, "merged_tables": []}
-
-    # Use Docling converter (CPU only)
-    converter = DocumentConverter()  # CPU mode by default
-    pdf_stream.seek(0)
+    # classify pages once; the fitz document is kept for later stages
+    classification = classify_pdf(pdf_stream, selection)
     try:
-        result = converter.convert(pdf_stream)
-    except Exception as e:
-        logger.exception("Docling convert failed; falling back to OCR-only: %s", e)
-        ocr_pages = ocr_text_from_pdf_bytes(pdf_stream)
-        pages = []
-        for i, t in enumerate(ocr_pages, start=1):
-            pages.append({
-                "page_number": i,
-                "structure": [{"type":"paragraph", "text": t.strip()}],
-                "tables": []
-            })
-        return {"file": None, "pages": pages, "merged_tables": []}
-
-    # iterate pages
+        # only convert / OCR the pages the page cache has no result for
+        keys, reused = reuse_pages(classification, engine)
+        if reused:
+            logger.info("Reusing %d cached pages", len(reused))
+            pending = classification.subset([n for n in classification.selected_pages if n not in reused])
+        else:
+            pending = classification
+        with collect_ocr_stats() as ocr_stats:
+            docling_pages, ocr_pages = convert_document(pdf_stream, pending, engine)
+    finally:
+        classification.close()
+    if ocr_stats.pages:
+        logger.info("OCRed %d pages, %d at %d DPI, ~%.1fs CPU saved", ocr_stats.pages,
+                    ocr_stats.full_dpi_pages, settings.OCR_DPI, ocr_stats.cpu_seconds_saved)
+    pages_out, _ = structure_pages(docling_pages, ocr_pages)
+    remember_pages(keys, pages_out, classification)
+    # cross-page tables are merged again from the cached and the new pages
+    pages_out = sorted(pages_out + list(reused.values()), key=lambda p: p.page_number)
+    all_tables = [table for page in pages_out for table in page.tables]
+    return build_result(pages_out, all_tables, reused_pages=len(reused) if keys else None,
+                        ocr=ocr_stats.summary() if ocr_stats.pages else None)
+
+def iter_extract(pdf_stream: BytesIO, selection: PageSelection = ALL_PAGES,
+                 engine: str = ENGINE_DOCLING) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming extract_structured(): yields ("page", Page) as each page is
+    converted or OCRed, in page order, then ("result", ExtractionResult).
+    """
+    logger.info("Starting streamed extraction (CPU mode, %s engine)", engine)
+    classification = classify_pdf(pdf_stream, selection)
     pages_out = []
     all_tables = []
-    for page in result.document.pages:
-        page_num = getattr(page, "page_number", None) or (len(pages_out) + 1)
-        structure = []
-        page_tables = []
+    try:
+        for page in iter_pages(pdf_stream, classification, engine):
+            pages_out.append(page)
+            all_tables.extend(page.tables)
+            yield "page", page
+    finally:
+        classification.close()
+    yield "result", build_result(pages_out, all_tables)
+
+def iter_pages(pdf_stream: BytesIO, classification: PdfClassification,
+               engine: str = ENGINE_DOCLING) -> Iterator[Page]:
+    """
+    Pages in order: OCR page by page, Docling STREAM_CHUNK_PAGES pages at a
+    time; with engine="fast", Docling only for the pages with tables.
+    """
+    if not classification.page_kinds:
+        # could not classify: one Docling pass over everything, as extract_structured does
+        docling_pages, ocr_pages = convert_document(pdf_stream, classification)
+        yield from structure_pages(docling_pages, ocr_pages)[0]
+        return
+
+    for kind, first, last in classification.runs():
+        check_deadline()
+        if kind == PAGE_SCANNED:
+            logger.info("OCRing scanned pages %d-%d", first, last)
+            yield from iter_ocr_pages(pdf_stream, pages=range(first, last + 1))
+            continue
+        if engine != ENGINE_FAST:
+            yield from iter_docling_pages(pdf_stream, first, last)
+            continue
+        built, table_pages = fast_pages(classification.doc, range(first, last + 1), POINT_PREFIXES)
+        n = first
+        for start, end in contiguous_runs(table_pages):
+            yield from (built[i] for i in range(n, start))
+            yield from iter_docling_pages(pdf_stream, start, end)
+            n = end + 1
+        yield from (built[i] for i in range(n, last + 1))
+
+def iter_docling_pages(pdf_stream: BytesIO, first: int, last: int) -> Iterator[Page]:
+    """Docling over pages first..last, chunk by chunk; pages it fails on are OCRed."""
+    for docling_pages, failed_pages in iter_docling_chunks(pdf_stream, range(first, last + 1)):
+        ocr_pages = {}
+        if failed_pages:
+            ocr_pages = {p.page_number: p for p in iter_ocr_pages(pdf_stream, pages=failed_pages)}
+        yield from structure_pages(docling_pages, ocr_pages)[0]
+
+def iter_docling_chunks(pdf_stream: BytesIO,
+                        pages: Sequence[int]) -> Iterator[Tuple[List[Tuple[int, Any]], List[int]]]:
+    """
+    Docling over `pages`, STREAM_CHUNK_PAGES at a time: yields ((page
+    number, Docling page) pairs, page numbers it failed on) per chunk,
+    numbered from the chunk's first page. A chunk that raises is retried
+    page by page; a page that raises, runs past
+    PAGE_DEADLINE_SECONDS or is missing from the result counts as failed,
+    so only those pages need OCR.
+    """
+    chunk = max(1, settings.STREAM_CHUNK_PAGES)
+    for start, end in contiguous_runs(pages):
+        for first in range(start, end + 1, chunk):
+            yield _convert_chunk(pdf_stream, first, min(first + chunk - 1, end))
+
+def _convert_chunk(pdf_stream: BytesIO, first: int, last: int,
+                   split: bool = True) -> Tuple[List[Tuple[int, Any]], List[int]]:
+    pages = list(range(first, last + 1))
+    try:
+        # a convert we stop waiting for keeps running, so it gets its own
+        # source (never this thread's stream) and hands its converter back
+        # itself when it finishes; waiting for a free converter does not
+        # count against the page deadline
+        source = converter_source(pdf_stream)
+        converter = converter_pool.acquire(check=check_deadline)
+        docling_pages = run_with_deadline(
+            _convert_range, converter, source, first, last,
+            timeout=settings.PAGE_DEADLINE_SECONDS * len(pages) or None,
+            cleanup=lambda: converter_pool.release(converter),
+        )
+    except (ExtractionCancelled, DeadlineExceeded):
+        raise
+    except PageTimeout as e:
+        logger.warning("Docling deadline passed for pages %d-%d; OCRing them: %s", first, last, e)
+        return [], pages
+    except Exception as e:
+        if not split or first == last:
+            logger.exception("Docling convert failed for pages %d-%d; OCRing them: %s", first, last, e)
+            return [], pages
+        logger.warning("Docling convert failed for pages %d-%d; retrying page by page: %s", first, last, e)
+        docling_pages = None
+    if docling_pages is None:
+        results = [_convert_chunk(pdf_stream, n, n, split=False) for n in pages]
+        return [p for converted, _ in results for p in converted], [n for _, failed in results for n in failed]
+    numbers = {n for n, _ in docling_pages}
+    missing = [n for n in pages if n not in numbers]
+    if missing:
+        logger.warning("Docling returned no result for pages %s; OCRing them", missing)
+    return docling_pages, missing
+
+def _convert_range(converter: Any, source: Any, first: int, last: int) -> List[Tuple[int, Any]]:
+    with timed("convert"):
+        return number_pages(converter.convert(source, page_range=(first, last)).document.pages, first)
+
+def number_pages(docling_pages: Sequence[Any], first: int) -> List[Tuple[int, Any]]:
+    """
+    (page number, Docling page) pairs for a conversion that started at page
+    `first`: a page without its own page_number is first + its offset.
+    """
+    return [(getattr(page, "page_number", None) or first + offset, page)
+            for offset, page in enumerate(docling_pages)]
+
+# ---- stages (also driven one by one by app/pipeline.py) ----
+
+def convert_document(pdf_stream: BytesIO, classification: PdfClassification,
+                     engine: str = ENGINE_DOCLING) -> Tuple[List[Any], Dict[int, Page]]:
+    """
+    Convert stage: Docling (or, with engine="fast", PyMuPDF text) for
+    born-digital pages, OCR for scanned ones and for the pages Docling
+    failed on or ran out of time for.
+    Returns ((page number, Docling page) pairs, {page_number: page built without Docling}).
+    """
+    if classification.is_scanned:
+        logger.info("Scanned PDF detected -> OCRing each page")
+        pages = iter_ocr_pages(pdf_stream, pages=classification.scanned_pages)
+        return [], {p.page_number: p for p in pages}
+
+    ocr_pages = {}
+    if engine == ENGINE_FAST and classification.page_kinds:
+        ocr_pages, table_pages = fast_pages(classification.doc, classification.digital_pages, POINT_PREFIXES)
+        logger.info("Fast engine: %d pages from PDF text, %d table pages to Docling", len(ocr_pages), len(table_pages))
+        docling_classification = classification.subset(table_pages)
+    else:
+        docling_classification = classification
+
+    # Use a warm Docling converter from the shared pool (CPU only)
+    docling_pages, failed_pages = [], []
+    if docling_classification.digital_pages or not docling_classification.page_kinds:
+        try:
+            docling_pages, failed_pages = convert_docling_pages(pdf_stream, docling_classification)
+        except (ExtractionCancelled, DeadlineExceeded):
+            raise
+        except Exception as e:
+            # only a document that could not be classified is converted in one piece
+            logger.exception("Docling convert failed; falling back to OCR-only: %s", e)
+            for p in iter_ocr_pages(pdf_stream):
+                ocr_pages[p.page_number] = p
+            return [], ocr_pages
+
+    # scanned pages of a mixed document, plus the pages Docling failed on
+    wanted = sorted(set(classification.scanned_pages) | set(failed_pages))
+    if wanted:
+        logger.info("OCRing %d pages (%d scanned, %d Docling failures)",
+                    len(wanted), len(classification.scanned_pages), len(failed_pages))
+        for p in iter_ocr_pages(pdf_stream, pages=wanted):
+            ocr_pages[p.page_number] = p
+    return docling_pages, ocr_pages
+
+def convert_docling_pages(pdf_stream: BytesIO,
+                          classification: PdfClassification) -> Tuple[List[Tuple[int, Any]], List[int]]:
+    """
+    Run Docling over the born-digital pages, chunk by chunk.
+    Returns ((page number, Docling page) pairs, page numbers to OCR instead). A document that
+    could not be classified is converted in one call, which raises on failure.
+    """
+    if not classification.page_kinds:
+        return _convert_document(pdf_stream), []
+    docling_pages, failed_pages = [], []
+    for converted, failed in iter_docling_chunks(pdf_stream, classification.digital_pages):
+        docling_pages.extend(converted)
+        failed_pages.extend(failed)
+    return docling_pages, failed_pages
+
+@timed("convert")
+def _convert_document(pdf_stream: BytesIO) -> List[Tuple[int, Any]]:
+    with converter_pool.borrow() as converter:
+        return number_pages(converter.convert(converter_source(pdf_stream)).document.pages, 1)
+
+@timed("structure")
+def structure_pages(docling_pages: List[Tuple[int, Any]],
+                    ocr_pages: Dict[int, Page]) -> Tuple[List[Page], List[Table]]:
+    """
+    Structure stage: page dicts in page order plus every table found.
+    `docling_pages` are the convert stage's (page number, Docling page) pairs.
+    """
+    ocr_pages = dict(ocr_pages)
+    # iterate pages; scanned ones were already OCRed
+    pages_out = []
+    text_pages = []  # (slot in pages_out, page number, docling page)
+    for page_num, page in docling_pages:
+        if page_num in ocr_pages:
+            pages_out.append(ocr_pages.pop(page_num))
+        else:
+            text_pages.append((len(pages_out), page_num, page))
+            pages_out.append(None)
 
-        # process text blocks in reading order
-        for block in getattr(page, "blocks", []) or []:
-            text = (block.text or "").strip()
-            if not text:
-                continue
-
-            level = determine_heading_level(block)
-            if level in (1,2):
-                structure.append({"type":"heading", "level": level, "text": text})
-            else:
-                # detect bullets / points
-                if text.lstrip().startswith(("- ", "* ", "•", "—")) or text.startswith(("•", "-", "*")):
-                    structure.append({"type":"point", "text": text})
-                else:
-                    structure.append({"type":"paragraph", "text": text})
+    # classify the text blocks of all pages in one batch (headings / points / paragraphs)
+    structures = classify_pages(
+        [list(getattr(page, "blocks", []) or []) for _, _, page in text_pages],
+        point_prefixes=POINT_PREFIXES,
+    )
 
+    all_tables = []
+    for (slot, page_num, page), structure in zip(text_pages, structures):
         # extract tables on this page
+        page_tables = []
         for tbl in getattr(page, "tables", []) or []:
             rows = []
             for r in getattr(tbl, "rows", []) or []:
@@ -117,32 +303,26 @@ def extract_structured(pdf_stream: BytesIO) -> Dict[str, Any]:
                     cells.append((c.text or "").strip())
                 rows.append(cells)
             if rows:
-                table_obj = {"page": page_num, "rows": rows}
+                table_obj = Table(page_num, rows)
                 page_tables.append(table_obj)
                 all_tables.append(table_obj)
 
-        pages_out.append({"page_number": page_num, "structure": structure, "tables": page_tables})
-
-    # merge consecutive tables with matching headers
-    merged = []
-    prev = None
-    for t in all_tables:
-        if not t["rows"]:
-            continue
-        header = t["rows"][0]
-        if prev and headers_match(prev["rows"][0], header) and t["page"] == prev["end_page"] + 1:
-            prev["rows"].extend(t["rows"][1:])
-            prev["end_page"] = t["page"]
-        else:
-            if prev:
-                merged.append(prev)
-            prev = {"start_page": t["page"], "end_page": t["page"], "rows": [row[:] for row in t["rows"]]}
-    if prev:
-        merged.append(prev)
-
-    merged_out = [{"start_page": m["start_page"], "end_page": m["end_page"], "rows": m["rows"]} for m in merged]
-
-    return {"file": None, "pages": pages_out, "merged_tables": merged_out}
+        pages_out[slot] = Page(page_num, structure, page_tables, engine=ENGINE_DOCLING)
+    if ocr_pages:
+        pages_out.extend(ocr_pages.values())
+        pages_out.sort(key=lambda p: p.page_number)
+    return pages_out, all_tables
+
+def build_result(pages_out: List[Page], all_tables: List[Table], reused_pages: Optional[int] = None,
+                 ocr: Optional[Dict[str, Any]] = None) -> ExtractionResult:
+    """Merge stage: final result with cross-page tables merged."""
+    return ExtractionResult(pages_out, merge_tables(all_tables), leading={"file": None},
+                            reused_pages=reused_pages, ocr=ocr)
+
+@timed("merge")
+def merge_tables(all_tables: List[Table]) -> List[Dict[str, Any]]:
+    """Join consecutive-page tables whose headers match."""
+    return stitch_tables(all_tables, adjacent_pages=True)
 
 
 
@@ -0,0 +1,18 @@
+# app/batch.py
+from typing import Any, Dict, Iterable, Iterator
+
+from app.pipeline import ExtractionPipeline
+
+
+def extract_batch(file_uris: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Extract many documents, yielding one record per document as it finishes
+    (completion order, not input order).
+
+    Each record is {"file_uri": ..., "result": {...}} or
+    {"file_uri": ..., "error": "..."}; one bad document does not stop the batch.
+    Documents flow through the staged ExtractionPipeline, so downloads,
+    classification and conversion of different documents overlap while
+    conversion shares the process-wide converter pool and OCR workers.
+    """
+    yield from ExtractionPipeline().run(file_uris)
@@ -0,0 +1,140 @@
+# app/converter_pool.py
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue, Empty
+from typing import Any, Callable, Dict, Optional
+
+from app.config import settings
+from app.logger import logger
+from app.metrics import StatsMetrics, register_metrics
+from app.utils_imports import safe_import_docling
+
+DocumentConverter, InputFormat = safe_import_docling()
+
+# how often a waiting acquire() runs its `check`
+_WAIT_POLL_SECONDS = 0.25
+
+
+class ConverterPool:
+    """
+    Process-wide pool of preloaded Docling converters.
+
+    Building a DocumentConverter loads the layout and table models, so we
+    build at most `size` of them and hand them out to requests:
+      - hit:  an idle converter was available immediately
+      - miss: the caller had to build one or wait for one to be returned
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle: Queue = Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.hits = 0
+        self.misses = 0
+        self.wait_seconds = 0.0
+
+    def warm(self) -> None:
+        """Build converters until the pool is full (called at startup)."""
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    break
+                self._created += 1
+            try:
+                self._idle.put(self._build())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        logger.info("Converter pool warmed with %d converters", self.size)
+
+    def _build(self):
+        converter = DocumentConverter()  # CPU mode by default
+        # load the pipeline models now instead of on the first convert
+        initialize = getattr(converter, "initialize_pipeline", None)
+        if initialize is not None:
+            initialize(InputFormat.PDF)
+        return converter
+
+    def acquire(self, timeout: Optional[float] = None, check: Optional[Callable[[], None]] = None):
+        """
+        Take a converter out of the pool; hand it back with release(). While
+        waiting for one, `check()` runs every few hundred milliseconds and
+        may raise to stop waiting (e.g. the request was cancelled).
+        """
+        try:
+            converter = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return converter
+        except Empty:
+            pass
+
+        with self._lock:
+            self.misses += 1
+            can_build = self._created < self.size
+            if can_build:
+                self._created += 1
+        if can_build:
+            try:
+                return self._build()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        start = time.perf_counter()
+        give_up_at = None if timeout is None else start + timeout
+        try:
+            while True:
+                if check is not None:
+                    check()
+                wait = None if give_up_at is None else give_up_at - time.perf_counter()
+                if check is not None:
+                    wait = _WAIT_POLL_SECONDS if wait is None else min(wait, _WAIT_POLL_SECONDS)
+                if wait is not None and wait <= 0:
+                    raise TimeoutError("No converter available after %.1fs" % timeout)
+                try:
+                    return self._idle.get(timeout=wait)
+                except Empty:
+                    pass
+        finally:
+            with self._lock:
+                self.wait_seconds += time.perf_counter() - start
+
+    def release(self, converter) -> None:
+        self._idle.put(converter)
+
+    @contextmanager
+    def borrow(self, timeout: Optional[float] = None):
+        """Borrow a converter for the duration of a `with` block."""
+        converter = self.acquire(timeout)
+        try:
+            yield converter
+        finally:
+            self.release(converter)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": self._idle.qsize(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "wait_seconds": round(self.wait_seconds, 6),
+            }
+
+
+converter_pool = ConverterPool(settings.CONVERTER_POOL_SIZE)
+
+register_metrics(StatsMetrics("converter_pool", converter_pool.stats, {
+    "size": ("gauge", "Converters the pool builds at most (CONVERTER_POOL_SIZE)."),
+    "created": ("gauge", "Converters built so far."),
+    "idle": ("gauge", "Converters waiting in the pool."),
+    "hits": ("counter", "Acquires served by an idle converter."),
+    "misses": ("counter", "Acquires that had to build a converter or wait for one."),
+    "wait_seconds": ("counter", "Time spent waiting for a converter to be returned."),
+}))
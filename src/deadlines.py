@@ -0,0 +1,218 @@
+# app/deadlines.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+from app.config import settings
+from app.metrics import profile_call
+
+T = TypeVar("T")
+
+# how often a bounded wait looks at the request's cancellation flag
+_POLL_SECONDS = 0.25
+
+
+class ExtractionCancelled(Exception):
+    """The request was cancelled (its client disconnected)."""
+
+
+class DeadlineExceeded(Exception):
+    """The request ran past its overall deadline."""
+
+
+class PageTimeout(Exception):
+    """A bounded piece of page work ran past its own deadline."""
+
+
+class Deadline:
+    """
+    Overall deadline and cancellation flag of one request. Long-running
+    stages call check() between pages and give up with ExtractionCancelled
+    or DeadlineExceeded instead of finishing a result nobody will read.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None without an overall deadline."""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def check(self) -> None:
+        if self._cancelled.is_set():
+            raise ExtractionCancelled("Request cancelled")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+
+
+# work outside a request (jobs, batches) only has per-page deadlines
+_deadline: ContextVar[Deadline] = ContextVar("deadline", default=Deadline())
+
+
+def check_deadline() -> None:
+    _deadline.get().check()
+
+
+@contextmanager
+def request_deadline(deadline: Deadline) -> Iterator[Deadline]:
+    """Make `deadline` the one check_deadline() / run_with_deadline() use in this context."""
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_iter(deadline: Deadline, items: Iterable[T]) -> Iterator[T]:
+    """
+    Re-yield `items` with `deadline` active while each one is produced. A
+    generator runs in the context of whoever resumes it, and a streamed
+    response resumes it from a different threadpool thread every time.
+    """
+    it = iter(items)
+    try:
+        while True:
+            with request_deadline(deadline):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(it, "close", None)
+        if close is not None:
+            with request_deadline(deadline):
+                close()
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# calls that were given up on but are still running; new calls wait while
+# there are this many, so runaway work cannot pile up behind a slow page
+_MAX_ABANDONED = max(1, settings.CONVERTER_POOL_SIZE)
+_abandoned = 0
+_abandoned_changed = threading.Condition()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # one thread per pooled converter, plus one per call that was given up on
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.CONVERTER_POOL_SIZE) + _MAX_ABANDONED, thread_name_prefix="bounded"
+            )
+        return _executor
+
+
+def _wait_for_abandoned_slot(deadline: Deadline) -> None:
+    with _abandoned_changed:
+        while _abandoned >= _MAX_ABANDONED:
+            deadline.check()
+            _abandoned_changed.wait(_POLL_SECONDS)
+
+
+def _add_abandoned(delta: int) -> None:
+    global _abandoned
+    with _abandoned_changed:
+        _abandoned += delta
+        _abandoned_changed.notify_all()
+
+
+class _BoundedCall:
+    """
+    One run_with_deadline() call. Starting it and giving up on it are
+    decided under one lock: a call given up on before it started is
+    skipped, one given up on while running counts as abandoned until it
+    finishes.
+    """
+
+    def __init__(self, fn: Callable[..., T], args: tuple, cleanup: Optional[Callable[[], None]]):
+        self.fn = fn
+        self.args = args
+        self.cleanup = cleanup
+        self.started_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._given_up = False
+        self._finished = False
+
+    def run(self) -> Optional[T]:
+        with self._lock:
+            if not self._given_up:
+                self.started_at = time.monotonic()
+        try:
+            if self.started_at is None:
+                return None
+            return profile_call(self.fn, *self.args)
+        finally:
+            with self._lock:
+                self._finished = True
+                abandoned = self._given_up and self.started_at is not None
+            try:
+                if self.cleanup is not None:
+                    self.cleanup()
+            finally:
+                if abandoned:
+                    _add_abandoned(-1)
+
+    def give_up(self) -> None:
+        with self._lock:
+            self._given_up = True
+            if self.started_at is not None and not self._finished:
+                _add_abandoned(1)
+
+
+def run_with_deadline(fn: Callable[..., T], *args, timeout: Optional[float] = None,
+                      cleanup: Optional[Callable[[], None]] = None) -> T:
+    """
+    fn(*args) on a worker thread, waited for at most `timeout` seconds once
+    it has started (PageTimeout) and never past the request's deadline or
+    cancellation. `cleanup()` runs once fn is done with: after it returns
+    or raises, or in place of it when the call was given up on before it
+    started. Resources fn uses (e.g. a pooled converter) are handed back
+    there rather than by the caller.
+
+    Python cannot stop a running thread: a call that is given up on runs to
+    completion in the background and its result is dropped, so `fn` must
+    not share mutable state (e.g. a stream position) with the caller. At
+    most _MAX_ABANDONED such calls run at once; new calls wait for them.
+    """
+    deadline = _deadline.get()
+    call = _BoundedCall(fn, args, cleanup)
+    try:
+        deadline.check()
+        _wait_for_abandoned_slot(deadline)
+        future = _get_executor().submit(copy_context().run, call.run)
+    except BaseException:
+        if cleanup is not None:
+            cleanup()
+        raise
+    while True:
+        try:
+            return future.result(timeout=_POLL_SECONDS)
+        except FutureTimeoutError:
+            pass
+        try:
+            deadline.check()
+        except Exception:
+            call.give_up()
+            raise
+        started_at = call.started_at
+        if timeout is not None and started_at is not None and time.monotonic() - started_at >= timeout:
+            call.give_up()
+            raise PageTimeout("Gave up after %.1fs" % timeout)
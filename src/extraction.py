@@ -0,0 +1,89 @@
+# app/extraction.py
+from typing import Any, Dict, Iterator, Tuple
+
+from app.s3_utils import get_pdf_stream, head_source
+from app.docling_parser import extract_structured, iter_extract
+from app.ocr import ocr_settings_tag
+from app.result_cache import result_cache
+from app.page_ranges import ALL_PAGES, PageSelection
+from app.result_model import ENGINE_DOCLING
+
+# streamed results are built chunk by chunk and are not guaranteed to match
+# a whole-document extraction, so the two never share cache entries
+_STREAM_TAG = "-stream"
+
+
+def _variant(selection: PageSelection, engine: str) -> str:
+    """
+    Cache key suffix: results for other pages / engines, or extracted under
+    other OCR settings (any document may have scanned pages), are kept apart.
+    """
+    tag = selection.cache_tag()
+    if engine != ENGINE_DOCLING:
+        tag += "-engine-%s" % engine
+    return tag + "-" + ocr_settings_tag()
+
+
+def extract_uri(file_uri: str, selection: PageSelection = ALL_PAGES,
+                engine: str = ENGINE_DOCLING) -> Dict[str, Any]:
+    """
+    Download, extract and cache one PDF (or only the pages in `selection`).
+    Stages are timed by app.metrics (see request_timings()).
+    """
+    variant = _variant(selection, engine)
+    # fast path: same object (by ETag) already extracted, skip the download
+    head = head_source(file_uri)
+    etag = head.etag if head is not None else None
+    if etag:
+        cached = result_cache.get_by_source(file_uri, etag, variant)
+        if cached is not None:
+            return cached
+
+    with get_pdf_stream(file_uri, head) as pdf_stream:
+        key = result_cache.key_for(pdf_stream)
+        result = result_cache.get(key + variant)
+        if result is None:
+            result = extract_structured(pdf_stream, selection, engine)
+            result_cache.put(key + variant, result)
+    if etag:
+        result_cache.remember_source(file_uri, etag, key)
+    return result
+
+
+def stream_uri(file_uri: str, selection: PageSelection = ALL_PAGES,
+               engine: str = ENGINE_DOCLING) -> Iterator[Tuple[str, Any]]:
+    """
+    extract_uri() as events: ("page", page) as each page is ready, then
+    ("merged_tables", [...]). Cached results are replayed the same way. A
+    finished stream is cached apart from extract_uri() results.
+    """
+    variant = _variant(selection, engine) + _STREAM_TAG
+    head = head_source(file_uri)
+    etag = head.etag if head is not None else None
+    if etag:
+        cached = result_cache.get_by_source(file_uri, etag, variant)
+        if cached is not None:
+            yield from _replay(cached)
+            return
+
+    with get_pdf_stream(file_uri, head) as pdf_stream:
+        key = result_cache.key_for(pdf_stream)
+        cached = result_cache.get(key + variant)
+        if cached is not None:
+            yield from _replay(cached)
+        else:
+            for event, value in iter_extract(pdf_stream, selection, engine):
+                if event == "result":
+                    result_cache.put(key + variant, value)
+                    yield "merged_tables", value.merged_tables
+                else:
+                    yield event, value
+    if etag:
+        result_cache.remember_source(file_uri, etag, key)
+
+
+def _replay(result: Any) -> Iterator[Tuple[str, Any]]:
+    fields = result if isinstance(result, dict) else result.json_fields()
+    for page in fields["pages"]:
+        yield "page", page
+    yield "merged_tables", fields["merged_tables"]
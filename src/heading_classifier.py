@@ -0,0 +1,181 @@
+# app/heading_classifier.py
+import re
+from numbers import Real
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.result_model import StructureItem
+
+# "1.2 Title" (numbering -> level) or "A. Title" (level 1), in one match
+_PREFIX_RE = re.compile(r"(\d+(?:\.\d+)*)\s|[A-Z]\.\s")
+_NAN = float("nan")
+
+POINT_PREFIXES = ("- ", "* ", "•", "—")
+
+
+class BlockColumns:
+    """
+    Text blocks as parallel columns (text, font size, bold, x0, ...), read
+    from the blocks once so the rules can run over whole arrays.
+
+    text is stripped; has_size is False when the block had no usable first
+    span (size is then NaN); x0 is NaN without a usable bbox.
+    """
+
+    __slots__ = ("text", "size", "has_size", "bold", "x0", "role_heading")
+
+    def __init__(self):
+        self.text: List[str] = []
+        self.size: List[float] = []
+        self.has_size: List[bool] = []
+        self.bold: List[bool] = []
+        self.x0: List[float] = []
+        self.role_heading: List[bool] = []
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    @classmethod
+    def from_docling_blocks(cls, blocks: Sequence[Any]) -> "BlockColumns":
+        """Docling blocks with .text, .spans[0].size/.font and .bbox."""
+        cols = cls()
+        cols.text = [(block.text or "").strip() for block in blocks]
+        styles = [_block_style(block) for block in blocks]
+        if styles:
+            has_size, size, bold, x0 = zip(*styles)
+            cols.has_size, cols.size, cols.bold, cols.x0 = list(has_size), list(size), list(bold), list(x0)
+        cols.role_heading = [False] * len(blocks)
+        return cols
+
+    @classmethod
+    def from_dict_blocks(cls, blocks: Sequence[Dict[str, Any]]) -> "BlockColumns":
+        """Docling dict blocks (text, font_size / style, font_weight, role)."""
+        cols = cls()
+        for block in blocks:
+            style = block.get("style", {})
+            size = block.get("font_size") or style.get("font_size", 12)
+            weight = str(block.get("font_weight") or style.get("font_weight", "")).lower()
+            role = str(block.get("role") or block.get("semantic_role") or "").lower()
+            cols.text.append((block.get("text") or "").strip())
+            cols.has_size.append(True)
+            cols.size.append(size)
+            cols.bold.append("bold" in weight)
+            cols.x0.append(_NAN)
+            cols.role_heading.append("heading" in role)
+        return cols
+
+
+def _block_style(block: Any) -> Tuple[bool, float, bool, float]:
+    """
+    (has_size, size, bold, x0) of one block. has_size is False and x0 NaN
+    wherever determine_heading_level() would give up on the span / bbox.
+    """
+    has_size, size, bold, x0 = False, _NAN, False, _NAN
+    try:
+        spans = getattr(block, "spans", None)
+        if spans and len(spans) > 0:
+            span = spans[0]
+            span_size = span.size
+            span_bold = "Bold" in (span.font or "")
+            if isinstance(span_size, Real):
+                has_size, size, bold = True, span_size, span_bold
+    except Exception:
+        pass
+    try:
+        bbox = getattr(block, "bbox", None)
+        if bbox and isinstance(bbox[0], Real):
+            x0 = bbox[0]
+    except Exception:
+        pass
+    return has_size, size, bold, x0
+
+
+def _text_level(text: str) -> int:
+    """Level from the text alone: -1 empty, 0 no text rule applies, else 1-3."""
+    if not text:
+        return -1
+    m = _PREFIX_RE.match(text)
+    if m:
+        numbering = m.group(1)
+        return min(numbering.count(".") + 1, 3) if numbering else 1
+    upper = text.isupper()
+    if upper or text.istitle():
+        words = len(text.split())
+        if upper and words <= 8:
+            return 1
+        if text.istitle() and words <= 10:
+            return 2
+    return 0
+
+
+def heading_levels(cols: BlockColumns) -> np.ndarray:
+    """
+    determine_heading_level() for every block at once: 0 for empty text,
+    else 1-3. Numbering / case rules come from the text; the rest is
+    array arithmetic over size, bold and x0.
+    """
+    n = len(cols)
+    text_level = np.fromiter((_text_level(t) for t in cols.text), dtype=np.int8, count=n)
+    size = np.asarray(cols.size, dtype=np.float64)
+    bold = np.asarray(cols.bold, dtype=bool)
+    x0 = np.asarray(cols.x0, dtype=np.float64)
+    has_size = np.asarray(cols.has_size, dtype=bool)
+
+    size_level = np.where((size >= 18) | (bold & (size >= 14)), 1, np.where(size >= 14, 2, 3))
+    x0_level = np.where(x0 < 40, 1, np.where(x0 < 90, 2, 3))
+    levels = np.where(text_level > 0, text_level, np.where(has_size, size_level, x0_level))
+    return np.where(text_level < 0, 0, levels).astype(np.int8)
+
+
+def dict_heading_levels(cols: BlockColumns) -> np.ndarray:
+    """
+    pratice2's is_heading / is_subheading for every block at once:
+    1 heading, 2 subheading, 0 neither (or empty).
+    """
+    n = len(cols)
+    length = np.fromiter((len(t) for t in cols.text), dtype=np.int64, count=n)
+    numbered = np.fromiter((_starts_numbered(t) for t in cols.text), dtype=bool, count=n)
+    size = np.asarray(cols.size, dtype=np.float64)
+    bold = np.asarray(cols.bold, dtype=bool)
+    role = np.asarray(cols.role_heading, dtype=bool)
+    nonempty = length > 0
+
+    heading = role | (((size >= 16) | bold) & (length < 120))
+    subheading = ((size >= 13) & (size < 16)) | (numbered & (length < 100))
+    return np.where(nonempty & heading, 1, np.where(nonempty & subheading, 2, 0)).astype(np.int8)
+
+
+def _starts_numbered(text: str) -> bool:
+    if not text:
+        return False
+    first_word = text.split()[0].rstrip(".").replace(")", "")
+    return first_word.replace(".", "").isdigit()
+
+
+def classify_pages(pages_blocks: Sequence[Sequence[Any]],
+                   point_prefixes: Sequence[str] = POINT_PREFIXES) -> List[List[StructureItem]]:
+    """
+    Structure entries (heading / point / paragraph) for several pages of
+    Docling blocks, classified in one pass over all of their blocks.
+    """
+    cols = BlockColumns.from_docling_blocks([b for blocks in pages_blocks for b in blocks])
+    levels = heading_levels(cols).tolist()
+    prefixes = tuple(point_prefixes)
+
+    out = []
+    i = 0
+    for blocks in pages_blocks:
+        structure = []
+        for text, level in zip(cols.text[i:i + len(blocks)], levels[i:i + len(blocks)]):
+            if not text:
+                continue
+            if level in (1, 2):
+                structure.append(StructureItem("heading", text, level))
+            elif text.startswith(prefixes):
+                structure.append(StructureItem("point", text))
+            else:
+                structure.append(StructureItem("paragraph", text))
+        out.append(structure)
+        i += len(blocks)
+    return out
@@ -0,0 +1,148 @@
+# app/jobs.py
+import threading
+import time
+import uuid
+from queue import Queue, Full
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.logger import logger
+from app.extraction import extract_uri
+from app.metrics import request_timings
+from app.page_ranges import ALL_PAGES, PageSelection
+from app.result_model import ENGINE_DOCLING
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, file_uri: str, selection: PageSelection = ALL_PAGES, engine: str = ENGINE_DOCLING):
+        self.job_id = uuid.uuid4().hex
+        self.file_uri = file_uri
+        self.selection = selection
+        self.engine = engine
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stages: Dict[str, float] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        # bumped on every change so progress streams know when to emit
+        self.version = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def record_stage(self, stage: str, seconds: float) -> None:
+        """Add one run of `stage` (stages that run per page or per chunk are summed)."""
+        self.stages[stage] = round(self.stages.get(stage, 0.0) + seconds, 6)
+        self.version += 1
+
+    def to_status(self, include_result: bool = True) -> Dict[str, Any]:
+        status = {
+            "job_id": self.job_id,
+            "file_uri": self.file_uri,
+            "status": self.status,
+            "stages": dict(self.stages),
+        }
+        if self.error is not None:
+            status["error"] = self.error
+        if include_result and self.status == JOB_DONE:
+            status["result"] = self.result
+        return status
+
+
+class JobManager:
+    """
+    Runs extraction jobs on a fixed pool of worker threads.
+
+    The queue is bounded: submit() raises QueueFullError instead of letting
+    work pile up, so callers can retry later. Finished jobs are kept for
+    JOB_RESULT_TTL_SECONDS so clients can poll for them.
+    """
+
+    def __init__(self, workers: int, queue_size: int, result_ttl: int):
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self._queue: Queue = Queue(maxsize=queue_size)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        for i in range(self.workers - len(self._threads)):
+            t = threading.Thread(target=self._run, name="extract-worker-%d" % i, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except Full:
+                break  # workers are daemon threads; they die with the process
+        self._threads = []
+
+    def submit(self, file_uri: str, selection: PageSelection = ALL_PAGES, engine: str = ENGINE_DOCLING) -> Job:
+        self._prune()
+        job = Job(file_uri, selection, engine)
+        try:
+            self._queue.put_nowait(job)
+        except Full:
+            raise QueueFullError("Job queue is full")
+        with self._lock:
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            job.started_at = time.time()
+            job.status = JOB_RUNNING
+            job.record_stage("queued", job.started_at - job.created_at)
+            try:
+                with request_timings(on_stage=job.record_stage):
+                    job.result = extract_uri(job.file_uri, selection=job.selection, engine=job.engine)
+                status = JOB_DONE
+            except Exception as e:
+                logger.exception("Extraction job %s failed", job.job_id)
+                job.error = str(e)
+                status = JOB_FAILED
+            job.finished_at = time.time()
+            job.status = status
+            job.version += 1
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+job_manager = JobManager(
+    workers=settings.JOB_WORKERS,
+    queue_size=settings.JOB_QUEUE_SIZE,
+    result_ttl=settings.JOB_RESULT_TTL_SECONDS,
+)
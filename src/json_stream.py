@@ -0,0 +1,38 @@
+# app/json_stream.py
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # plain json is slower but produces the same documents
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    fields = getattr(obj, "json_fields", None)
+    if fields is None:
+        raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+    return fields()
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    UTF-8 JSON for plain values and result models. Models are visited
+    through json_fields(), so no full dict copy is built first.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_event(event: str, data: Any, fmt: str = "ndjson") -> bytes:
+    """One streamed event: an NDJSON line {"event", "data"} or an SSE frame."""
+    if fmt == "sse":
+        return b"event: " + event.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
+    return dumps({"event": event, "data": data}) + b"\n"
@@ -0,0 +1,83 @@
+# app/lazy_result.py
+from io import BytesIO
+from typing import Any, Dict, Iterator, List
+
+from app.page_ranges import ALL_PAGES, PageSelection
+from app.pdf_detect import classify_pdf
+from app.result_model import ENGINE_DOCLING, ExtractionResult, Page, Table
+from app.docling_parser import convert_document, structure_pages, build_result, merge_tables
+
+
+class LazyExtraction:
+    """
+    Extraction result that converts a page only when it is asked for.
+
+    result[n] / iteration convert one page at a time and keep it, so a caller
+    that reads the first few pages never pays for the rest. merged_tables and
+    result() convert whatever has not been read yet. Owns the PDF stream;
+    close() (or use as a context manager) when done.
+    """
+
+    def __init__(self, pdf_stream: BytesIO, selection: PageSelection = ALL_PAGES):
+        self._pdf = pdf_stream
+        self._classification = classify_pdf(pdf_stream, selection)
+        self._pages: Dict[int, Page] = {}
+        self._tables: Dict[int, List[Table]] = {}
+
+    @property
+    def page_numbers(self) -> List[int]:
+        return self._classification.selected_pages
+
+    def __len__(self) -> int:
+        return len(self.page_numbers)
+
+    def __getitem__(self, page_number: int) -> Page:
+        if page_number not in self._pages:
+            if page_number not in self.page_numbers:
+                raise KeyError(page_number)
+            self._convert(page_number)
+        return self._pages[page_number]
+
+    def __iter__(self) -> Iterator[Page]:
+        for page_number in self.page_numbers:
+            yield self[page_number]
+
+    @property
+    def merged_tables(self) -> List[Dict[str, Any]]:
+        return merge_tables(self._all_tables())
+
+    def result(self) -> ExtractionResult:
+        """Same as extract_structured() for the selected pages."""
+        pages = list(self)
+        return build_result(pages, self._all_tables())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.result().to_dict()
+
+    def _all_tables(self) -> List[Table]:
+        tables = []
+        for page_number in self.page_numbers:
+            self[page_number]
+            tables.extend(self._tables.get(page_number, []))
+        return tables
+
+    def _convert(self, page_number: int) -> None:
+        single = self._classification.subset([page_number])
+        docling_pages, ocr_pages = convert_document(self._pdf, single)
+        pages_out, tables = structure_pages(docling_pages, ocr_pages)
+        for page in pages_out:
+            self._pages[page.page_number] = page
+        for table in tables:
+            self._tables.setdefault(table.page, []).append(table)
+        # a page Docling returned nothing for is still "converted"
+        self._pages.setdefault(page_number, Page(page_number, [], [], engine=ENGINE_DOCLING))
+
+    def close(self) -> None:
+        self._classification.close()
+        self._pdf.close()
+
+    def __enter__(self) -> "LazyExtraction":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,321 @@
+# app/metrics.py
+import cProfile
+import io
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+    from pyinstrument.renderers import ConsoleRenderer
+    from pyinstrument.session import Session
+except ImportError:  # optional: only needed for profile="pyinstrument"
+    PyinstrumentProfiler = None
+
+T = TypeVar("T")
+
+# seconds; extraction stages range from sub-millisecond hashing to minutes of OCR
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+PROFILE_TOP_FUNCTIONS = 60
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with one label, rendered in the Prometheus
+    text exposition format.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Iterable[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[str, Tuple[List[int], List[float]]] = {}  # label -> (counts, [sum])
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        i = bisect_left(self.buckets, value)  # le semantics: value <= bound
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = ["# HELP %s %s" % (self.name, self.help_text), "# TYPE %s histogram" % self.name]
+        with self._lock:
+            snapshot = {k: (list(c), s[0]) for k, (c, s) in self._series.items()}
+        for label_value in sorted(snapshot):
+            counts, total = snapshot[label_value]
+            labels = '%s="%s"' % (self.label, label_value)
+            running = 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                lines.append('%s_bucket{%s,le="%s"} %d' % (self.name, labels, _fmt(bound), running))
+            running += counts[-1]
+            lines.append('%s_bucket{%s,le="+Inf"} %d' % (self.name, labels, running))
+            lines.append("%s_sum{%s} %s" % (self.name, labels, repr(total)))
+            lines.append("%s_count{%s} %d" % (self.name, labels, running))
+        return lines
+
+
+def _fmt(bound: float) -> str:
+    return str(int(bound)) if bound == int(bound) else repr(bound)
+
+
+stage_seconds = Histogram(
+    "extraction_stage_seconds",
+    "Wall time of each extraction stage (one observation per stage run).",
+    "stage",
+    STAGE_BUCKETS,
+)
+
+
+
+class StatsMetrics:
+    """
+    Counters and gauges read from a component's stats() dict when /metrics
+    is rendered: `fields` maps each stats key to ("counter" | "gauge", help).
+    Counters get the conventional _total suffix.
+    """
+
+    def __init__(self, prefix: str, stats: Callable[[], Dict[str, float]], fields: Dict[str, Tuple[str, str]]):
+        self.prefix = prefix
+        self.stats = stats
+        self.fields = fields
+
+    def render(self) -> List[str]:
+        stats = self.stats()
+        lines = []
+        for key, (kind, help_text) in self.fields.items():
+            name = "%s_%s%s" % (self.prefix, key, "_total" if kind == "counter" else "")
+            lines += ["# HELP %s %s" % (name, help_text), "# TYPE %s %s" % (name, kind)]
+            lines.append("%s %s" % (name, _fmt(stats[key])))
+        return lines
+
+
+# rendered by /metrics, in registration order
+_collectors: List[Any] = [stage_seconds]
+
+
+def register_metrics(collector: Any) -> None:
+    """Add a collector (anything with render() -> lines) to /metrics."""
+    _collectors.append(collector)
+
+
+StageCallback = Callable[[str, float], None]
+
+
+class RequestTimings:
+    """
+    Per-request stage totals, collected while the request's context is
+    active. `on_stage(stage, seconds)` is called as each stage run finishes.
+    """
+
+    __slots__ = ("started", "stages", "on_stage")
+
+    def __init__(self, on_stage: Optional[StageCallback] = None):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}  # stage -> [seconds, runs]
+        self.on_stage = on_stage
+
+    def add(self, stage: str, seconds: float) -> None:
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+        if self.on_stage is not None:
+            self.on_stage(stage, seconds)
+
+    def breakdown(self) -> Dict[str, object]:
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 6),
+            "stages": {
+                stage: {"seconds": round(seconds, 6), "runs": int(runs)}
+                for stage, (seconds, runs) in self.stages.items()
+            },
+        }
+
+    def server_timing(self) -> str:
+        """The same breakdown as a Server-Timing header value (milliseconds)."""
+        return ", ".join(
+            "%s;dur=%.1f" % (stage, seconds * 1000) for stage, (seconds, _) in self.stages.items()
+        )
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record(stage: str, seconds: float) -> None:
+    stage_seconds.observe(stage, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time the block as one run of `stage` (also when it raises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed_iter(stage: str, items: Iterable[T]) -> Iterator[T]:
+    """
+    Re-yield `items`, timing only the time spent producing them (not the
+    consumer's work between items); recorded as one run of `stage`.
+    """
+    it = iter(items)
+    spent = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                spent += time.perf_counter() - start
+                return
+            spent += time.perf_counter() - start
+            yield item
+    finally:
+        record(stage, spent)
+
+
+@contextmanager
+def request_timings(on_stage: Optional[StageCallback] = None) -> Iterator[RequestTimings]:
+    """
+    Collect a stage breakdown for the work done in this context, including
+    run_with_deadline() calls made from it.
+    """
+    timings = RequestTimings(on_stage)
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+class Profile:
+    """
+    Holds the text report once the profiled block has finished. Calls
+    handed to other threads through profile_call() get profilers of their
+    own, merged into the report.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.report = ""
+        self._calls: List[Any] = []  # cProfile profilers / pyinstrument sessions of profile_call()s
+        self._lock = threading.Lock()
+
+    def run(self, fn: Callable[..., T], *args) -> T:
+        if self.kind == "cprofile":
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+: the request's profiler is interpreter-wide and sees this thread already
+                return fn(*args)
+            try:
+                return fn(*args)
+            finally:
+                profiler.disable()
+                self._add(profiler)
+        profiler = PyinstrumentProfiler(async_mode="disabled")
+        profiler.start()
+        try:
+            return fn(*args)
+        finally:
+            self._add(profiler.stop())
+
+    def _add(self, profiled_call: Any) -> None:
+        with self._lock:
+            self._calls.append(profiled_call)
+
+    def calls(self) -> List[Any]:
+        with self._lock:
+            return list(self._calls)
+
+
+_active_profile: ContextVar[Optional[Profile]] = ContextVar("active_profile", default=None)
+
+# cProfile / pyinstrument hook the interpreter, so one profiled request at a time
+_profile_lock = threading.Lock()
+
+
+def profile_call(fn: Callable[..., T], *args) -> T:
+    """
+    fn(*args), profiled into the request's profile when there is one.
+    For work run on another thread (a profiler only sees its own thread);
+    the context must be the request's (copy_context()).
+    """
+    profile = _active_profile.get()
+    if profile is None:
+        return fn(*args)
+    return profile.run(fn, *args)
+
+
+@contextmanager
+def profiled(kind: str) -> Iterator[Profile]:
+    """
+    Profile the block with cProfile (top functions by cumulative time) or
+    pyinstrument (call tree), together with the profile_call()s it makes on
+    other threads (Docling converts on the run_with_deadline() workers).
+    Work done in the OCR worker processes is not included. Raises
+    ProfilerBusyError if another request is being profiled.
+    """
+    if kind not in PROFILERS:
+        raise ValueError("profile must be one of %s" % ", ".join(PROFILERS))
+    if kind == "pyinstrument" and PyinstrumentProfiler is None:
+        raise ValueError("pyinstrument is not installed")
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("another request is being profiled")
+    profile = Profile(kind)
+    token = _active_profile.set(profile)
+    try:
+        if kind == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield profile
+            finally:
+                profiler.disable()
+                out = io.StringIO()
+                stats = pstats.Stats(profiler, stream=out)
+                for call in profile.calls():
+                    stats.add(call)
+                stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+                profile.report = out.getvalue()
+        else:
+            profiler = PyinstrumentProfiler(async_mode="disabled")
+            profiler.start()
+            try:
+                yield profile
+            finally:
+                session = profiler.stop()
+                for call in profile.calls():
+                    session = Session.combine(session, call)
+                profile.report = ConsoleRenderer(unicode=True, color=False).render(session)
+    finally:
+        _active_profile.reset(token)
+        _profile_lock.release()
+
+
+def render_prometheus() -> str:
+    return "\n".join(line for collector in _collectors for line in collector.render()) + "\n"
@@ -0,0 +1,122 @@
+# app/native_text.py
+from typing import Dict, List, Sequence, Tuple
+
+import fitz
+
+from app.config import settings
+from app.heading_classifier import POINT_PREFIXES, classify_pages
+from app.metrics import timed
+from app.result_model import ENGINE_FAST, Page
+
+_BOLD = 16  # span flag bit: bold font
+# a ruling line must be this long (points) to count towards a table grid
+_MIN_RULE_LENGTH = 8
+_RULE_THICKNESS = 2  # a filled rect thinner than this is drawn as a rule
+
+
+class NativeSpan:
+    __slots__ = ("size", "font")
+
+    def __init__(self, size: float, font: str):
+        self.size = size
+        self.font = font
+
+
+class NativeBlock:
+    """A PyMuPDF text block shaped like the Docling blocks the heading rules read."""
+
+    __slots__ = ("text", "spans", "bbox")
+
+    def __init__(self, text: str, spans: List[NativeSpan], bbox: Tuple[float, float, float, float]):
+        self.text = text
+        self.spans = spans
+        self.bbox = bbox
+
+
+def page_blocks(page: "fitz.Page", point_prefixes: Sequence[str] = POINT_PREFIXES) -> List[NativeBlock]:
+    """
+    Text blocks of one page: text (lines joined with spaces), the first
+    span's size / font, and the bbox. PyMuPDF puts a run of bullet lines in
+    one block, so a block is split where a line starts with a point prefix,
+    as Docling would. The heading rules look for "Bold" in the font name,
+    so a span PyMuPDF flags as bold gets ",Bold" appended when its name
+    does not say so already.
+    """
+    prefixes = tuple(point_prefixes)
+    blocks = []
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        if block.get("type") != 0:
+            continue
+        segments = []  # [texts, first span, bbox]
+        for line in block.get("lines", ()):
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            if not text:
+                continue
+            if not segments or text.startswith(prefixes):
+                first = next(span for span in line["spans"] if span["text"].strip())
+                segments.append([[text], first, fitz.Rect(line["bbox"])])
+            else:
+                segments[-1][0].append(text)
+                segments[-1][2] |= line["bbox"]
+        for texts, first, bbox in segments:
+            font = first["font"] or ""
+            if first["flags"] & _BOLD and "bold" not in font.lower():
+                font += ",Bold"
+            blocks.append(NativeBlock(" ".join(texts), [NativeSpan(first["size"], font)], tuple(bbox)))
+    return blocks
+
+
+def has_ruled_table(page: "fitz.Page") -> bool:
+    """
+    True when the page's vector drawings contain a grid: at least
+    FAST_TABLE_MIN_RULES horizontal and vertical ruling lines (cell borders
+    count as two of each). Tables without rules are not detected; ask for
+    the Docling engine for those documents.
+    """
+    horizontal = vertical = 0
+    for path in page.get_drawings():
+        for item in path["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) < 1 and abs(p1.x - p2.x) >= _MIN_RULE_LENGTH:
+                    horizontal += 1
+                elif abs(p1.x - p2.x) < 1 and abs(p1.y - p2.y) >= _MIN_RULE_LENGTH:
+                    vertical += 1
+            elif item[0] == "re":
+                rect = item[1]
+                if rect.height < _RULE_THICKNESS and rect.width >= _MIN_RULE_LENGTH:
+                    horizontal += 1
+                elif rect.width < _RULE_THICKNESS and rect.height >= _MIN_RULE_LENGTH:
+                    vertical += 1
+                elif rect.width >= _MIN_RULE_LENGTH and rect.height >= _MIN_RULE_LENGTH:
+                    horizontal += 2
+                    vertical += 2
+        if horizontal >= settings.FAST_TABLE_MIN_RULES and vertical >= settings.FAST_TABLE_MIN_RULES:
+            return True
+    return False
+
+
+@timed("fast_text")
+def fast_pages(doc: "fitz.Document", page_numbers: Sequence[int],
+               point_prefixes: Sequence[str] = POINT_PREFIXES) -> Tuple[Dict[int, Page], List[int]]:
+    """
+    Structure the given 1-based pages straight from their PyMuPDF text.
+
+    Returns ({page_number: Page}, table_pages): pages that look like they
+    hold a table are left out of the dict and listed in table_pages so the
+    caller can hand them to Docling.
+    """
+    text_pages = []
+    table_pages = []
+    blocks = []
+    for n in page_numbers:
+        page = doc[n - 1]
+        if has_ruled_table(page):
+            table_pages.append(n)
+            continue
+        text_pages.append(n)
+        blocks.append(page_blocks(page, point_prefixes))
+
+    structures = classify_pages(blocks, point_prefixes)
+    pages = {n: Page(n, structure, [], engine=ENGINE_FAST) for n, structure in zip(text_pages, structures)}
+    return pages, table_pages
@@ -0,0 +1,238 @@
+# app/ocr.py
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pdf2image import convert_from_path, pdfinfo_from_path
+import pytesseract
+
+from app.config import settings
+from app.deadlines import check_deadline
+from app.metrics import timed_iter
+from app.pdf_buffer import local_pdf_path
+from app.result_model import ENGINE_OCR, Page, StructureItem
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_ocr_executor() -> ProcessPoolExecutor:
+    """Process-wide pool of tesseract workers, created on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.OCR_WORKERS)
+        return _executor
+
+
+def shutdown_ocr_executor(wait: bool = False) -> None:
+    """Stop the worker pool; wait=True also waits for the workers to exit."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+            _executor = None
+
+
+def ocr_settings_tag() -> str:
+    """The OCR settings a scanned page's text depends on, for cache keys."""
+    tag = "ocr%d" % settings.OCR_DPI
+    if settings.OCR_ADAPTIVE:
+        tag += "-adaptive%d-%g" % (settings.OCR_LOW_DPI, settings.OCR_MIN_CONFIDENCE)
+    return tag
+
+
+class OcrStats:
+    """
+    OCR work done for one extraction: pages OCRed, how many of them were
+    rendered at the full OCR_DPI, worker CPU seconds (tesseract and
+    pdftoppm included) and the CPU seconds adaptive mode saved against
+    OCRing every page at OCR_DPI (an estimate, see _ocr_page).
+    """
+
+    __slots__ = ("pages", "full_dpi_pages", "cpu_seconds", "cpu_seconds_saved")
+
+    def __init__(self):
+        self.pages = 0
+        self.full_dpi_pages = 0
+        self.cpu_seconds = 0.0
+        self.cpu_seconds_saved = 0.0
+
+    def add(self, full_dpi: bool, cpu_seconds: float, cpu_seconds_saved: float) -> None:
+        self.pages += 1
+        self.full_dpi_pages += full_dpi
+        self.cpu_seconds += cpu_seconds
+        self.cpu_seconds_saved += cpu_seconds_saved
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "pages": self.pages,
+            "dpi": settings.OCR_DPI,
+            "low_dpi": settings.OCR_LOW_DPI if settings.OCR_ADAPTIVE else None,
+            "full_dpi_pages": self.full_dpi_pages,
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "cpu_seconds_saved": round(self.cpu_seconds_saved, 3),
+        }
+
+
+_ocr_stats: ContextVar[Optional[OcrStats]] = ContextVar("ocr_stats", default=None)
+
+
+@contextmanager
+def collect_ocr_stats() -> Iterator[OcrStats]:
+    """Add up the OCR work done in this context (thread)."""
+    stats = OcrStats()
+    token = _ocr_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _ocr_stats.reset(token)
+
+
+def _cpu_seconds() -> float:
+    """
+    CPU time of the calling thread and of finished child processes
+    (pdftoppm, tesseract). A pool worker runs one page at a time; inline
+    (OCR_WORKERS <= 1) the child time of a concurrent OCR on another
+    thread can still be counted.
+    """
+    t = os.times()
+    return time.thread_time() + t.children_user + t.children_system
+
+
+def _render_and_ocr(pdf_path: str, page_number: int, dpi: int, ocr):
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    try:
+        return ocr(images[0]) if images else ocr(None)
+    finally:
+        for img in images:
+            img.close()
+
+
+def _text(image) -> str:
+    return pytesseract.image_to_string(image) if image is not None else ""
+
+
+def _text_and_confidence(image) -> Tuple[str, Optional[float]]:
+    """
+    The text image_to_string() would give and the mean confidence of the
+    recognised words (None without words), from a single tesseract run.
+    """
+    if image is None:
+        return "", None
+    text, tsv = pytesseract.run_and_get_multiple_output(image, extensions=["txt", "tsv"])
+    rows = tsv.splitlines()
+    columns = rows[0].split("\t") if rows else []
+    confidences = []
+    if "conf" in columns and "text" in columns:
+        conf_at, text_at = columns.index("conf"), columns.index("text")
+        for row in rows[1:]:
+            fields = row.split("\t")
+            if len(fields) <= text_at or not fields[text_at].strip():
+                continue
+            confidence = float(fields[conf_at])
+            if confidence >= 0:
+                confidences.append(confidence)
+    return text, (sum(confidences) / len(confidences) if confidences else None)
+
+
+def _ocr_page(pdf_path: str, page_number: int, dpi: int, low_dpi: Optional[int] = None,
+              min_confidence: float = 0.0) -> Tuple[str, bool, float, float]:
+    """
+    Runs in a worker: render a single page, OCR it, drop the bitmap.
+    Returns (text, rendered at `dpi`, CPU seconds, CPU seconds saved).
+
+    With `low_dpi` the page is OCRed at low_dpi first and only rendered
+    again at `dpi` when no words were found or their mean confidence is
+    below `min_confidence`. Rendering and tesseract time grow with the
+    pixel count, so the saving on a page kept at low_dpi is estimated as
+    its cost times (dpi / low_dpi)^2 - 1; an escalated page loses its
+    low_dpi pass.
+    """
+    start = _cpu_seconds()
+    if low_dpi is None or low_dpi >= dpi:
+        text = _render_and_ocr(pdf_path, page_number, dpi, _text)
+        return text, True, _cpu_seconds() - start, 0.0
+    text, confidence = _render_and_ocr(pdf_path, page_number, low_dpi, _text_and_confidence)
+    low_cpu = _cpu_seconds() - start
+    if confidence is not None and confidence >= min_confidence:
+        return text, False, low_cpu, low_cpu * ((dpi / low_dpi) ** 2 - 1)
+    text = _render_and_ocr(pdf_path, page_number, dpi, _text)
+    return text, True, _cpu_seconds() - start, -low_cpu
+
+
+def iter_ocr_text(
+    pdf_bytes: BytesIO, dpi: Optional[int] = None, pages: Optional[Sequence[int]] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) in page order as each page finishes OCR.
+
+    `pages` restricts OCR to the given 1-based page numbers (e.g. the
+    scanned pages of a mixed document); by default every page is OCRed.
+
+    Workers read the PDF from disk (the spilled download itself, or a temp
+    copy made without reading it into memory), pages are rendered one at a
+    time inside the workers, and at most
+    2 * OCR_WORKERS pages are in flight, so memory stays flat whatever the
+    page count. Stops between pages once the request is cancelled or past
+    its deadline.
+
+    Without an explicit `dpi`, OCR_ADAPTIVE pages are OCRed at OCR_LOW_DPI
+    and only the ones tesseract is unsure about (OCR_MIN_CONFIDENCE) again
+    at OCR_DPI; the work done is added to the collect_ocr_stats() in effect.
+    """
+    task = (dpi or settings.OCR_DPI,)
+    if dpi is None and settings.OCR_ADAPTIVE:
+        task += (settings.OCR_LOW_DPI, settings.OCR_MIN_CONFIDENCE)
+    stats = _ocr_stats.get()
+
+    def page_text(page_number: int, result: Tuple[str, bool, float, float]) -> Tuple[int, str]:
+        if stats is not None:
+            stats.add(*result[1:])
+        return page_number, result[0]
+
+    with local_pdf_path(pdf_bytes) as pdf_path:
+        if pages is None:
+            pages = range(1, pdfinfo_from_path(pdf_path)["Pages"] + 1)
+
+        if settings.OCR_WORKERS <= 1:
+            for n in pages:
+                check_deadline()
+                yield page_text(n, _ocr_page(pdf_path, n, *task))
+            return
+
+        executor = get_ocr_executor()
+        window = settings.OCR_WORKERS * 2
+        pending = deque()
+        try:
+            for n in pages:
+                check_deadline()
+                pending.append((n, executor.submit(_ocr_page, pdf_path, n, *task)))
+                if len(pending) >= window:
+                    page_number, fut = pending.popleft()
+                    yield page_text(page_number, fut.result())
+            while pending:
+                check_deadline()
+                page_number, fut = pending.popleft()
+                yield page_text(page_number, fut.result())
+        finally:
+            for _, fut in pending:
+                fut.cancel()
+
+
+def iter_ocr_pages(
+    pdf_bytes: BytesIO, dpi: Optional[int] = None, pages: Optional[Sequence[int]] = None
+) -> Iterator[Page]:
+    """Yield one extraction page per OCRed page."""
+    for page_number, text in timed_iter("ocr", iter_ocr_text(pdf_bytes, dpi=dpi, pages=pages)):
+        yield Page(page_number, [StructureItem("paragraph", text.strip())], [], engine=ENGINE_OCR)
+
+
+def ocr_text_from_pdf_bytes(pdf_bytes: BytesIO, dpi: Optional[int] = None) -> List[str]:
+    return [text for _, text in timed_iter("ocr", iter_ocr_text(pdf_bytes, dpi=dpi))]
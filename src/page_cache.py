@@ -0,0 +1,121 @@
+# app/page_cache.py
+import hashlib
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+import fitz
+
+from app.config import settings
+from app.metrics import timed
+from app.ocr import ocr_settings_tag
+from app.pdf_detect import PAGE_DIGITAL, PdfClassification
+from app.result_cache import ResultCache
+from app.result_model import ENGINE_OCR, Page
+
+# an indirect reference inside an object's source, e.g. "12 0 R"
+_REF_RE = re.compile(r"\b(\d+) (\d+) R\b")
+_MAX_PARENTS = 32  # /Parent hops when looking for inherited /Resources
+
+
+def _inherited(doc: "fitz.Document", xref: int, key: str) -> Tuple[str, str]:
+    """A page attribute that may be inherited from the page tree (e.g. /Resources)."""
+    for _ in range(_MAX_PARENTS):
+        kind, value = doc.xref_get_key(xref, key)
+        if kind != "null":
+            return kind, value
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        if kind != "xref":
+            break
+        xref = int(parent.split()[0])
+    return "null", "null"
+
+
+def _object_digest(doc: "fitz.Document", xref: int, memo: Dict[int, str], active: Set[int]) -> str:
+    """
+    Digest of an object and everything it references, with references
+    replaced by the referenced objects' digests, so renumbering the
+    objects (a full re-save) does not change it.
+    """
+    digest = memo.get(xref)
+    if digest is not None:
+        return digest
+    if xref in active or not 0 < xref < doc.xref_length():
+        return "%d R" % xref
+    active.add(xref)
+    try:
+        source = doc.xref_object(xref, compressed=True)
+        h = hashlib.sha256(_REF_RE.sub(lambda m: _object_digest(doc, int(m.group(1)), memo, active), source).encode())
+        if doc.xref_is_stream(xref):
+            h.update(doc.xref_stream_raw(xref) or b"")
+    finally:
+        active.discard(xref)
+    digest = memo[xref] = h.hexdigest()
+    return digest
+
+
+def page_fingerprint(doc: "fitz.Document", page_number: int, memo: Optional[Dict[int, str]] = None) -> str:
+    """
+    SHA-256 of what a 1-based page looks like: its geometry, its decoded
+    content streams and its resources (fonts, images, form XObjects),
+    followed through every reference. Pass one `memo` for all pages of a
+    document so shared resources are hashed once. Annotations are not
+    part of the fingerprint.
+    """
+    memo = {} if memo is None else memo
+    page = doc[page_number - 1]
+    h = hashlib.sha256(("%r %r %d\n" % (tuple(page.mediabox), tuple(page.cropbox), page.rotation)).encode())
+    h.update(page.read_contents())
+    _, resources = _inherited(doc, page.xref, "Resources")  # "12 0 R" or an inline dict
+    h.update(_REF_RE.sub(lambda m: _object_digest(doc, int(m.group(1)), memo, set()), resources).encode())
+    return h.hexdigest()
+
+
+page_cache = ResultCache(
+    cache_dir=settings.PAGE_CACHE_DIR,
+    memory_items=settings.PAGE_CACHE_MEMORY_ITEMS,
+    disk_bytes=settings.PAGE_CACHE_DISK_BYTES,
+    ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+    version=settings.PARSER_CONFIG_VERSION,
+)
+
+
+@timed("page_cache")
+def reuse_pages(classification: PdfClassification, engine: str) -> Tuple[Dict[int, str], Dict[int, Page]]:
+    """
+    ({page_number: cache key}, {page_number: cached Page}) for the selected
+    pages. A page is reused whatever its number was in the revision it
+    was extracted from; scanned pages only under the same OCR settings.
+    Both are empty when the page cache is off (PAGE_CACHE_ENABLED, opt-in)
+    or the document could not be opened.
+    """
+    if not settings.PAGE_CACHE_ENABLED or classification.doc is None:
+        return {}, {}
+    memo: Dict[int, str] = {}
+    keys = {}
+    reused = {}
+    ocr_tag = ocr_settings_tag()
+    for n in classification.selected_pages:
+        # scanned pages are OCRed, so a change of OCR settings must not reuse them
+        tag = engine if classification.page_kinds[n - 1] == PAGE_DIGITAL else "%s-%s" % (engine, ocr_tag)
+        # fingerprint last: the disk tier shards on the key's last characters
+        keys[n] = "page-v%s-%s-%s" % (page_cache.version, tag, page_fingerprint(classification.doc, n, memo))
+        fields = page_cache.get(keys[n])
+        if fields is not None:
+            reused[n] = Page.from_dict(fields, page_number=n)
+    return keys, reused
+
+
+def remember_pages(keys: Dict[int, str], pages: List[Page], classification: PdfClassification) -> None:
+    """
+    Cache newly extracted pages. Born-digital pages that were only OCRed
+    because Docling failed or ran out of time are not cached, so the next
+    revision gets another chance at them.
+    """
+    kinds = classification.page_kinds
+    for page in pages:
+        key = keys.get(page.page_number)
+        if key is None:
+            continue
+        if page.engine == ENGINE_OCR and kinds[page.page_number - 1] == PAGE_DIGITAL:
+            continue
+        page_cache.put(key, page.to_dict())
@@ -0,0 +1,64 @@
+# app/page_ranges.py
+import re
+from typing import List, Optional, Sequence, Tuple
+
+_RANGE_RE = re.compile(r"^\s*(\d+)\s*(?:-\s*(\d+)\s*)?$")
+
+
+class PageSelection:
+    """
+    Which pages a caller wants: explicit ranges such as "1-3,7" and/or the
+    first N pages (both given -> their intersection). Page numbers are 1-based.
+    Raises ValueError for a malformed spec.
+    """
+
+    def __init__(self, ranges: Optional[str] = None, first_n: Optional[int] = None):
+        self.ranges: List[Tuple[int, int]] = []
+        if ranges:
+            for part in ranges.split(","):
+                m = _RANGE_RE.match(part)
+                if not m:
+                    raise ValueError("Invalid page range %r" % part.strip())
+                start = int(m.group(1))
+                end = int(m.group(2)) if m.group(2) else start
+                if start < 1 or end < start:
+                    raise ValueError("Invalid page range %r" % part.strip())
+                self.ranges.append((start, end))
+        if first_n is not None and first_n < 1:
+            raise ValueError("first_n_pages must be at least 1")
+        self.first_n = first_n
+
+    @property
+    def is_all(self) -> bool:
+        return not self.ranges and self.first_n is None
+
+    def resolve(self, page_count: int) -> List[int]:
+        """Sorted page numbers to process, clipped to the document."""
+        last = page_count if self.first_n is None else min(page_count, self.first_n)
+        if not self.ranges:
+            return list(range(1, last + 1))
+        pages = set()
+        for start, end in self.ranges:
+            pages.update(range(start, min(end, last) + 1))
+        return sorted(pages)
+
+    def cache_tag(self) -> str:
+        """Suffix that keeps partial results apart in the result cache."""
+        if self.is_all:
+            return ""
+        spec = ",".join("%d-%d" % r for r in self.ranges) or "all"
+        return "-pages-%s-first-%s" % (spec, self.first_n or "all")
+
+
+ALL_PAGES = PageSelection()
+
+
+def contiguous_runs(pages: Sequence[int]) -> List[Tuple[int, int]]:
+    """[1, 2, 3, 7, 8] -> [(1, 3), (7, 8)]"""
+    runs: List[Tuple[int, int]] = []
+    for n in sorted(pages):
+        if runs and n == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], n)
+        else:
+            runs.append((n, n))
+    return runs
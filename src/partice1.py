@@ -10,68 +10,255 @@ class Settings:
     AWS_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
     AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
     S3_BUCKET = os.getenv("S3_BUCKET", None)
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", None)
     ENV = os.getenv("ENV", "local")
     DEVICE = "cpu"  # CPU mode only
+    CONVERTER_POOL_SIZE = int(os.getenv("CONVERTER_POOL_SIZE", "2"))
+    OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+    OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+    # adaptive OCR (opt-in): OCR_LOW_DPI first, OCR_DPI again only below this mean word confidence (0-100)
+    OCR_ADAPTIVE = os.getenv("OCR_ADAPTIVE", "false").lower() in ("1", "true", "yes")
+    OCR_LOW_DPI = int(os.getenv("OCR_LOW_DPI", "200"))
+    OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "75"))
+    DETECT_MAX_SAMPLE_PAGES = int(os.getenv("DETECT_MAX_SAMPLE_PAGES", "8"))
+    DETECT_MIN_TEXT_CHARS = int(os.getenv("DETECT_MIN_TEXT_CHARS", "32"))
+    DETECT_IMAGE_COVERAGE = float(os.getenv("DETECT_IMAGE_COVERAGE", "0.6"))
+    # bump whenever parser output changes so cached results are not reused
+    PARSER_CONFIG_VERSION = os.getenv("PARSER_CONFIG_VERSION", "1")
+    RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "/tmp/docling-result-cache")
+    RESULT_CACHE_MEMORY_ITEMS = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "64"))
+    RESULT_CACHE_DISK_BYTES = int(os.getenv("RESULT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+    RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    # per-page results keyed by page content, reused across revisions of a document (same TTL); opt-in
+    PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+    PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "/tmp/docling-page-cache")
+    PAGE_CACHE_MEMORY_ITEMS = int(os.getenv("PAGE_CACHE_MEMORY_ITEMS", "2048"))
+    PAGE_CACHE_DISK_BYTES = int(os.getenv("PAGE_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "32"))
+    JOB_RESULT_TTL_SECONDS = int(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+    # staged pipeline used by batch extraction
+    PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+    PIPELINE_FETCH_WORKERS = int(os.getenv("PIPELINE_FETCH_WORKERS", "4"))
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+    S3_MAX_RETRIES = int(os.getenv("S3_MAX_RETRIES", "5"))
+    HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+    HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+    # downloads above this many bytes spill to a temp file and are mmapped
+    SPOOL_MAX_MEMORY_BYTES = int(os.getenv("SPOOL_MAX_MEMORY_BYTES", str(32 * 1024 * 1024)))
+    SPOOL_DIR = os.getenv("SPOOL_DIR", None)
+    MAX_PDF_BYTES = int(os.getenv("MAX_PDF_BYTES", str(1024 * 1024 * 1024)))
+    # objects at least this large are downloaded as parallel byte ranges
+    RANGED_MIN_BYTES = int(os.getenv("RANGED_MIN_BYTES", str(16 * 1024 * 1024)))
+    RANGED_PART_BYTES = int(os.getenv("RANGED_PART_BYTES", str(8 * 1024 * 1024)))
+    RANGED_CONCURRENCY = int(os.getenv("RANGED_CONCURRENCY", "8"))
+    # Docling converts born-digital pages this many at a time (a failed chunk is retried page by page)
+    STREAM_CHUNK_PAGES = int(os.getenv("STREAM_CHUNK_PAGES", "4"))
+    # a Docling chunk gets this many seconds per page before its pages are OCRed instead
+    PAGE_DEADLINE_SECONDS = float(os.getenv("PAGE_DEADLINE_SECONDS", "60"))
+    # sync /extract and /extract/stream give up after this long (0 = no limit)
+    REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "900"))
+    # engine for requests that do not name one: "docling" or "fast" (PyMuPDF text, Docling for tables)
+    DEFAULT_ENGINE = os.getenv("DEFAULT_ENGINE", "docling")
+    # engine="fast" sends a page to Docling when its drawings hold this many horizontal and vertical rules
+    FAST_TABLE_MIN_RULES = int(os.getenv("FAST_TABLE_MIN_RULES", "3"))
+    # /extract {"profile": ...} runs cProfile / pyinstrument in-process; off unless enabled
+    REQUEST_PROFILING_ENABLED = os.getenv("REQUEST_PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
 
 settings = Settings()    
 
 # s3 utils.py    --------------------------->
 # app/s3_utils.py
+import threading
 import boto3
 import requests
+from botocore.config import Config
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional, Tuple
 from urllib.parse import urlparse
-from io import BytesIO
 from app.config import settings
-
-def get_pdf_stream(file_uri: str) -> BytesIO:
-    """
-    Returns a BytesIO stream from:
-      - s3://bucket/key
-      - https://... (URL)
-      - key (using default S3 bucket)
-    """
-    pdf_stream = BytesIO()
-
+from app.logger import logger
+from app.pdf_buffer import PdfBuffer
+from app.ranged_download import RangeNotSupportedError, download_ranged, http_range_fetcher, s3_range_fetcher
+from app.metrics import timed
+
+# one client/session per process; both are safe to share between threads
+_clients_lock = threading.Lock()
+_s3_client = None
+_http_session: Optional[requests.Session] = None
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        with _clients_lock:
+            if _s3_client is None:
+                _s3_client = boto3.session.Session().client(
+                    "s3",
+                    aws_access_key_id=settings.AWS_ACCESS_KEY,
+                    aws_secret_access_key=settings.AWS_SECRET_KEY,
+                    region_name=settings.AWS_REGION,
+                    endpoint_url=settings.S3_ENDPOINT_URL,  # MinIO / local S3 stand-ins
+                    config=Config(
+                        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                        retries={"max_attempts": settings.S3_MAX_RETRIES, "mode": "standard"},
+                        tcp_keepalive=True,
+                    ),
+                )
+    return _s3_client
+
+def get_http_session() -> requests.Session:
+    global _http_session
+    if _http_session is None:
+        with _clients_lock:
+            if _http_session is None:
+                retry = Retry(
+                    total=settings.HTTP_MAX_RETRIES,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(["GET", "HEAD"]),
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=settings.HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _http_session = session
+    return _http_session
+
+def init_clients() -> None:
+    """Build the shared clients up front (called at startup)."""
+    get_s3_client()
+    get_http_session()
+
+def _is_http(file_uri: str) -> bool:
+    return file_uri.startswith("http://") or file_uri.startswith("https://")
+
+def _s3_location(file_uri: str) -> Tuple[str, str]:
     if file_uri.startswith("s3://"):
         parsed = urlparse(file_uri)
-        bucket = parsed.netloc
-        key = parsed.path.lstrip("/")
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=settings.AWS_ACCESS_KEY,
-            aws_secret_access_key=settings.AWS_SECRET_KEY,
-            region_name=settings.AWS_REGION,
-        )
-        s3.download_fileobj(bucket, key, pdf_stream)
-
-    elif file_uri.startswith("http://") or file_uri.startswith("https://"):
-        r = requests.get(file_uri, stream=True)
+        return parsed.netloc, parsed.path.lstrip("/")
+    if not settings.S3_BUCKET:
+        raise ValueError("S3_BUCKET not configured for plain key access")
+    return settings.S3_BUCKET, file_uri
+
+class SourceHead:
+    """What one HEAD of a source object said: ETag, size, byte ranges served."""
+
+    __slots__ = ("etag", "size", "ranges")
+
+    def __init__(self, etag: Optional[str], size: Optional[int], ranges: bool):
+        self.etag = etag
+        self.size = size
+        self.ranges = ranges
+
+def _http_head(file_uri: str) -> Optional[SourceHead]:
+    head = get_http_session().head(file_uri, allow_redirects=True, timeout=settings.HTTP_TIMEOUT_SECONDS)
+    if head.status_code != 200:
+        return None
+    length = head.headers.get("Content-Length", "")
+    return SourceHead(
+        head.headers.get("ETag"),
+        int(length) if length.isdigit() else None,
+        head.headers.get("Accept-Ranges", "").lower() == "bytes",
+    )
+
+def _s3_head(bucket: str, key: str) -> SourceHead:
+    head = get_s3_client().head_object(Bucket=bucket, Key=key)
+    return SourceHead(head.get("ETag"), head["ContentLength"], True)
+
+def _http_download(file_uri: str, head: Optional[SourceHead]) -> PdfBuffer:
+    session = get_http_session()
+    if head is None:
+        head = _http_head(file_uri)
+    size = head.size if head is not None else None
+    ranged = size is not None and size >= settings.RANGED_MIN_BYTES and head.ranges
+
+    if ranged:
+        fetch_range = http_range_fetcher(session, file_uri, head.etag, settings.HTTP_TIMEOUT_SECONDS)
+        pdf_stream = PdfBuffer(expected_size=size)
+        try:
+            download_ranged(pdf_stream, size, fetch_range,
+                            settings.RANGED_PART_BYTES, settings.RANGED_CONCURRENCY)
+            return pdf_stream
+        except RangeNotSupportedError:
+            logger.info("Range requests not honoured by %s; using a single stream", file_uri)
+            pdf_stream.close()
+
+    with session.get(file_uri, stream=True, timeout=settings.HTTP_TIMEOUT_SECONDS) as r:
         r.raise_for_status()
-        for chunk in r.iter_content(chunk_size=8192):
+        length = r.headers.get("Content-Length")
+        pdf_stream = PdfBuffer(expected_size=int(length) if length and length.isdigit() else None)
+        for chunk in r.iter_content(chunk_size=1024 * 1024):
             if chunk:
                 pdf_stream.write(chunk)
+    return pdf_stream
 
+def _s3_download(file_uri: str, head: Optional[SourceHead]) -> PdfBuffer:
+    bucket, key = _s3_location(file_uri)
+    s3 = get_s3_client()
+    if head is None or head.size is None:
+        head = _s3_head(bucket, key)
+    size = head.size
+    pdf_stream = PdfBuffer(expected_size=size)
+
+    if size >= settings.RANGED_MIN_BYTES:
+        download_ranged(pdf_stream, size, s3_range_fetcher(s3, bucket, key, head.etag),
+                        settings.RANGED_PART_BYTES, settings.RANGED_CONCURRENCY)
     else:
-        if not settings.S3_BUCKET:
-            raise ValueError("S3_BUCKET not configured for plain key access")
-        key = file_uri
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=settings.AWS_ACCESS_KEY,
-            aws_secret_access_key=settings.AWS_SECRET_KEY,
-            region_name=settings.AWS_REGION,
-        )
-        s3.download_fileobj(settings.S3_BUCKET, key, pdf_stream)
+        s3.download_fileobj(bucket, key, pdf_stream)
+    return pdf_stream
+
+@timed("download")
+def get_pdf_stream(file_uri: str, head: Optional[SourceHead] = None) -> PdfBuffer:
+    """
+    Returns a PdfBuffer (file-like, spills to disk when large) from:
+      - s3://bucket/key
+      - https://... (URL)
+      - key (using default S3 bucket)
+    Objects of RANGED_MIN_BYTES or more are fetched as concurrent byte-range
+    GETs (HTTP only when the server advertises Accept-Ranges: bytes).
+    Pass the head_source() result when there is one; otherwise the object
+    is HEADed here.
+    Raises PdfTooLargeError before downloading if the object is known to
+    exceed MAX_PDF_BYTES, or as soon as the limit is crossed otherwise.
+    """
+    if _is_http(file_uri):
+        pdf_stream = _http_download(file_uri, head)
+    else:
+        pdf_stream = _s3_download(file_uri, head)
 
     pdf_stream.seek(0)
     return pdf_stream
 
+@timed("etag")
+def head_source(file_uri: str) -> Optional[SourceHead]:
+    """
+    One HEAD of the object behind file_uri, or None if it failed. Its ETag
+    skips downloads of objects whose extraction result is cached; hand the
+    whole thing to get_pdf_stream() so the download does not HEAD again.
+    """
+    try:
+        if _is_http(file_uri):
+            return _http_head(file_uri)
+        if not file_uri.startswith("s3://") and not settings.S3_BUCKET:
+            return None
+        return _s3_head(*_s3_location(file_uri))
+    except Exception as e:
+        logger.warning("HEAD failed for %s: %s", file_uri, e)
+        return None
 
 # -------heading_utils.py
 # app/heading_utils.py
 import re
 from typing import List
-from difflib import SequenceMatcher
+from app.table_stitch import normalize_header, normalized_headers_match
 
 def normalize_text(t: str) -> str:
     return " ".join(t.strip().split()).lower()
@@ -132,13 +319,7 @@ def determine_heading_level(block) -> int:
     return 3
 
 def headers_match(h1: List[str], h2: List[str]) -> bool:
-    if not h1 or not h2 or len(h1) != len(h2):
-        return False
-    for a, b in zip(h1, h2):
-        na, nb = normalize_text(a), normalize_text(b)
-        if SequenceMatcher(None, na, nb).ratio() < 0.75:
-            return False
-    return True
+    return normalized_headers_match(normalize_header(h1), normalize_header(h2))
 
 
 # utils imports.py
@@ -153,135 +334,493 @@ def safe_import_docling():
   #   docling parser .py 
 # app/docling_parser.py
 from io import BytesIO
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple
 from app.config import settings
-from app.heading_utils import determine_heading_level, headers_match
-from app.utils_imports import safe_import_docling
-from pdf2image import convert_from_bytes
-import pytesseract
-import fitz
-
-DocumentConverter, InputFormat = safe_import_docling()
-
-def ocr_text_from_pdf_bytes(pdf_bytes: BytesIO) -> List[str]:
-    pdf_bytes.seek(0)
-    images = convert_from_bytes(pdf_bytes.read(), dpi=300)
-    texts = [pytesseract.image_to_string(img) for img in images]
-    pdf_bytes.seek(0)
-    return texts
+from app.logger import logger
+from app.heading_classifier import classify_pages
+from app.result_model import ENGINE_DOCLING, ENGINE_FAST, ExtractionResult, Page, Table
+from app.table_stitch import stitch_tables
+from app.converter_pool import converter_pool
+from app.ocr import collect_ocr_stats, iter_ocr_pages
+from app.native_text import fast_pages
+from app.pdf_detect import PAGE_SCANNED, PdfClassification, classify_pdf
+from app.page_cache import remember_pages, reuse_pages
+from app.pdf_buffer import converter_source
+from app.page_ranges import ALL_PAGES, PageSelection, contiguous_runs
+from app.metrics import timed
+from app.deadlines import DeadlineExceeded, ExtractionCancelled, PageTimeout, check_deadline, run_with_deadline
 
 def is_scanned_pdf(pdf_bytes: BytesIO) -> bool:
-    pdf_bytes.seek(0)
-    try:
-        data = pdf_bytes.read()
-        doc = fitz.open(stream=data, filetype="pdf")
-        for p in doc:
-            if p.get_text().strip():
-                pdf_bytes.seek(0)
-                return False
-        pdf_bytes.seek(0)
-        return True
-    except Exception:
-        pdf_bytes.seek(0)
-        return False
-
-def extract_structured(pdf_stream: BytesIO) -> Dict[str, Any]:
-    if is_scanned_pdf(pdf_stream):
-        ocr_pages = ocr_text_from_pdf_bytes(pdf_stream)
-        pages = []
-        for i, t in enumerate(ocr_pages, start=1):
-            pages.append({
-                "page_number": i,
-                "structure": [{"type": "paragraph", "text": t.strip()}],
-                "tables": []
-            })
-        return {"pages": pages, "merged_tables": []}
-
-    converter = DocumentConverter()
-    pdf_stream.seek(0)
-    result = converter.convert(pdf_stream)
+    classification = classify_pdf(pdf_bytes)
+    classification.close()
+    return classification.is_scanned
 
+@timed("extract")
+def extract_structured(pdf_stream: BytesIO, selection: PageSelection = ALL_PAGES,
+                       engine: str = ENGINE_DOCLING) -> ExtractionResult:
+    """
+    engine="fast" reads born-digital pages straight from their PyMuPDF text
+    and only sends pages that look like they hold a table to Docling.
+    Pages whose content did not change since an earlier extraction come
+    from the page cache; result.reused_pages counts them.
+    """
+    classification = classify_pdf(pdf_stream, selection)
+    try:
+        # pages unchanged since an earlier revision come from the page cache
+        keys, reused = reuse_pages(classification, engine)
+        pending = classification
+        if reused:
+            pending = classification.subset([n for n in classification.selected_pages if n not in reused])
+        with collect_ocr_stats() as ocr_stats:
+            docling_pages, ocr_pages = convert_document(pdf_stream, pending, engine)
+    finally:
+        classification.close()
+    pages_out, _ = structure_pages(docling_pages, ocr_pages)
+    remember_pages(keys, pages_out, classification)
+    pages_out = sorted(pages_out + list(reused.values()), key=lambda p: p.page_number)
+    all_tables = [table for page in pages_out for table in page.tables]
+    return build_result(pages_out, all_tables, reused_pages=len(reused) if keys else None,
+                        ocr=ocr_stats.summary() if ocr_stats.pages else None)
+
+def iter_extract(pdf_stream: BytesIO, selection: PageSelection = ALL_PAGES,
+                 engine: str = ENGINE_DOCLING) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming extract_structured(): yields ("page", Page) as each page is
+    converted or OCRed, in page order, then ("result", ExtractionResult).
+    """
+    classification = classify_pdf(pdf_stream, selection)
     pages_out = []
     all_tables = []
-    for page in result.document.pages:
-        page_num = getattr(page, "page_number", None) or (len(pages_out) + 1)
-        structure = []
-        page_tables = []
+    try:
+        for page in iter_pages(pdf_stream, classification, engine):
+            pages_out.append(page)
+            all_tables.extend(page.tables)
+            yield "page", page
+    finally:
+        classification.close()
+    yield "result", build_result(pages_out, all_tables)
+
+def iter_pages(pdf_stream: BytesIO, classification: PdfClassification,
+               engine: str = ENGINE_DOCLING) -> Iterator[Page]:
+    """
+    Pages in order: OCR page by page, Docling STREAM_CHUNK_PAGES pages at a
+    time; with engine="fast", Docling only for the pages with tables.
+    """
+    if not classification.page_kinds:
+        # could not classify: one Docling pass over everything, as extract_structured does
+        docling_pages, ocr_pages = convert_document(pdf_stream, classification)
+        yield from structure_pages(docling_pages, ocr_pages)[0]
+        return
+
+    for kind, first, last in classification.runs():
+        check_deadline()
+        if kind == PAGE_SCANNED:
+            yield from iter_ocr_pages(pdf_stream, pages=range(first, last + 1))
+            continue
+        if engine != ENGINE_FAST:
+            yield from iter_docling_pages(pdf_stream, first, last)
+            continue
+        built, table_pages = fast_pages(classification.doc, range(first, last + 1))
+        n = first
+        for start, end in contiguous_runs(table_pages):
+            yield from (built[i] for i in range(n, start))
+            yield from iter_docling_pages(pdf_stream, start, end)
+            n = end + 1
+        yield from (built[i] for i in range(n, last + 1))
+
+def iter_docling_pages(pdf_stream: BytesIO, first: int, last: int) -> Iterator[Page]:
+    """Docling over pages first..last, chunk by chunk; pages it fails on are OCRed."""
+    for docling_pages, failed_pages in iter_docling_chunks(pdf_stream, range(first, last + 1)):
+        ocr_pages = {}
+        if failed_pages:
+            ocr_pages = {p.page_number: p for p in iter_ocr_pages(pdf_stream, pages=failed_pages)}
+        yield from structure_pages(docling_pages, ocr_pages)[0]
+
+def iter_docling_chunks(pdf_stream: BytesIO,
+                        pages: Sequence[int]) -> Iterator[Tuple[List[Tuple[int, Any]], List[int]]]:
+    """
+    Docling over `pages`, STREAM_CHUNK_PAGES at a time: yields ((page
+    number, Docling page) pairs, page numbers it failed on) per chunk,
+    numbered from the chunk's first page. A chunk that raises is retried
+    page by page; a page that raises, runs past
+    PAGE_DEADLINE_SECONDS or is missing from the result counts as failed.
+    """
+    chunk = max(1, settings.STREAM_CHUNK_PAGES)
+    for start, end in contiguous_runs(pages):
+        for first in range(start, end + 1, chunk):
+            yield _convert_chunk(pdf_stream, first, min(first + chunk - 1, end))
+
+def _convert_chunk(pdf_stream: BytesIO, first: int, last: int,
+                   split: bool = True) -> Tuple[List[Tuple[int, Any]], List[int]]:
+    pages = list(range(first, last + 1))
+    try:
+        # a convert we stop waiting for keeps running, so it gets its own
+        # source (never this thread's stream) and hands its converter back
+        # itself when it finishes; waiting for a free converter does not
+        # count against the page deadline
+        source = converter_source(pdf_stream)
+        converter = converter_pool.acquire(check=check_deadline)
+        docling_pages = run_with_deadline(
+            _convert_range, converter, source, first, last,
+            timeout=settings.PAGE_DEADLINE_SECONDS * len(pages) or None,
+            cleanup=lambda: converter_pool.release(converter),
+        )
+    except (ExtractionCancelled, DeadlineExceeded):
+        raise
+    except PageTimeout as e:
+        logger.warning("Docling deadline passed for pages %d-%d: %s", first, last, e)
+        return [], pages
+    except Exception as e:
+        if not split or first == last:
+            logger.exception("Docling convert failed for pages %d-%d: %s", first, last, e)
+            return [], pages
+        docling_pages = None  # retry page by page
+    if docling_pages is None:
+        results = [_convert_chunk(pdf_stream, n, n, split=False) for n in pages]
+        return [p for converted, _ in results for p in converted], [n for _, failed in results for n in failed]
+    numbers = {n for n, _ in docling_pages}
+    missing = [n for n in pages if n not in numbers]
+    return docling_pages, missing
+
+def _convert_range(converter: Any, source: Any, first: int, last: int) -> List[Tuple[int, Any]]:
+    with timed("convert"):
+        return number_pages(converter.convert(source, page_range=(first, last)).document.pages, first)
+
+def number_pages(docling_pages: Sequence[Any], first: int) -> List[Tuple[int, Any]]:
+    """
+    (page number, Docling page) pairs for a conversion that started at page
+    `first`: a page without its own page_number is first + its offset.
+    """
+    return [(getattr(page, "page_number", None) or first + offset, page)
+            for offset, page in enumerate(docling_pages)]
 
-        for block in getattr(page, "blocks", []) or []:
-            text = (block.text or "").strip()
-            if not text:
-                continue
+# ---- stages (also driven one by one by app/pipeline.py) ----
 
-            level = determine_heading_level(block)
-            if level in (1, 2):
-                structure.append({"type": "heading", "level": level, "text": text})
-            else:
-                if text.lstrip().startswith(("- ", "* ", "•", "—")):
-                    structure.append({"type": "point", "text": text})
-                else:
-                    structure.append({"type": "paragraph", "text": text})
+def convert_document(pdf_stream: BytesIO, classification: PdfClassification,
+                     engine: str = ENGINE_DOCLING) -> Tuple[List[Any], Dict[int, Page]]:
+    """
+    Convert stage: Docling (or, with engine="fast", PyMuPDF text) for
+    born-digital pages, OCR for scanned ones and for the pages Docling
+    failed on or ran out of time for.
+    Returns ((page number, Docling page) pairs, {page_number: page built without Docling}).
+    """
+    ocr_pages = {}
+    scanned_pages = classification.scanned_pages
+    docling_pages, failed_pages = [], []
+    if engine == ENGINE_FAST and classification.page_kinds:
+        built, table_pages = fast_pages(classification.doc, classification.digital_pages)
+        ocr_pages.update(built)
+        if table_pages:
+            docling_pages, failed_pages = convert_docling_pages(pdf_stream, classification.subset(table_pages))
+    elif not classification.is_scanned:
+        docling_pages, failed_pages = convert_docling_pages(pdf_stream, classification)
+    wanted = sorted(set(scanned_pages) | set(failed_pages))
+    if wanted:
+        for p in iter_ocr_pages(pdf_stream, pages=wanted):
+            ocr_pages[p.page_number] = p
+    return docling_pages, ocr_pages
+
+def convert_docling_pages(pdf_stream: BytesIO,
+                          classification: PdfClassification) -> Tuple[List[Tuple[int, Any]], List[int]]:
+    """
+    Run Docling over the born-digital pages, chunk by chunk.
+    Returns ((page number, Docling page) pairs, page numbers to OCR instead). A document that
+    could not be classified is converted in one call.
+    """
+    if not classification.page_kinds:
+        return _convert_document(pdf_stream), []
+    docling_pages, failed_pages = [], []
+    for converted, failed in iter_docling_chunks(pdf_stream, classification.digital_pages):
+        docling_pages.extend(converted)
+        failed_pages.extend(failed)
+    return docling_pages, failed_pages
+
+@timed("convert")
+def _convert_document(pdf_stream: BytesIO) -> List[Tuple[int, Any]]:
+    with converter_pool.borrow() as converter:
+        return number_pages(converter.convert(converter_source(pdf_stream)).document.pages, 1)
+
+@timed("structure")
+def structure_pages(docling_pages: List[Tuple[int, Any]],
+                    ocr_pages: Dict[int, Page]) -> Tuple[List[Page], List[Table]]:
+    """
+    Structure stage: pages in page order plus every table found.
+    `docling_pages` are the convert stage's (page number, Docling page) pairs.
+    """
+    ocr_pages = dict(ocr_pages)
+    pages_out = []
+    text_pages = []  # (slot in pages_out, page number, docling page)
+    for page_num, page in docling_pages:
+        if page_num in ocr_pages:
+            pages_out.append(ocr_pages.pop(page_num))
+        else:
+            text_pages.append((len(pages_out), page_num, page))
+            pages_out.append(None)
 
+    # classify every text block of the document in one batch
+    structures = classify_pages([list(getattr(page, "blocks", []) or []) for _, _, page in text_pages])
+
+    all_tables = []
+    for (slot, page_num, page), structure in zip(text_pages, structures):
+        page_tables = []
         for tbl in getattr(page, "tables", []) or []:
             rows = []
             for r in getattr(tbl, "rows", []) or []:
                 cells = [(c.text or "").strip() for c in getattr(r, "cells", []) or []]
                 rows.append(cells)
             if rows:
-                table_obj = {"page": page_num, "rows": rows}
+                table_obj = Table(page_num, rows)
                 page_tables.append(table_obj)
                 all_tables.append(table_obj)
 
-        pages_out.append({
-            "page_number": page_num,
-            "structure": structure,
-            "tables": page_tables
-        })
-
-    merged = []
-    prev = None
-    for t in all_tables:
-        if not t["rows"]:
-            continue
-        header = t["rows"][0]
-        if prev and headers_match(prev["rows"][0], header) and t["page"] == prev["end_page"] + 1:
-            prev["rows"].extend(t["rows"][1:])
-            prev["end_page"] = t["page"]
-        else:
-            if prev:
-                merged.append(prev)
-            prev = {"start_page": t["page"], "end_page": t["page"], "rows": [row[:] for row in t["rows"]]}
-    if prev:
-        merged.append(prev)
-
-    merged_out = [{"start_page": m["start_page"], "end_page": m["end_page"], "rows": m["rows"]} for m in merged]
-
-    return {"pages": pages_out, "merged_tables": merged_out}
+        pages_out[slot] = Page(page_num, structure, page_tables, engine=ENGINE_DOCLING)
+    if ocr_pages:
+        pages_out.extend(ocr_pages.values())
+        pages_out.sort(key=lambda p: p.page_number)
+    return pages_out, all_tables
+
+def build_result(pages_out: List[Page], all_tables: List[Table], reused_pages: Optional[int] = None,
+                 ocr: Optional[Dict[str, Any]] = None) -> ExtractionResult:
+    """Merge stage: final result with cross-page tables merged."""
+    return ExtractionResult(pages_out, merge_tables(all_tables), reused_pages=reused_pages, ocr=ocr)
+
+@timed("merge")
+def merge_tables(all_tables: List[Table]) -> List[Dict[str, Any]]:
+    """Join consecutive-page tables whose headers match."""
+    return stitch_tables(all_tables, adjacent_pages=True)
 # main.py
 
 # app/main.py
-from fastapi import FastAPI
+import asyncio
+import json
+from contextlib import ExitStack
+from typing import List, Literal, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from app.s3_utils import get_pdf_stream
-from app.docling_parser import extract_structured
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from app.config import settings
+from app.deadlines import Deadline, DeadlineExceeded, ExtractionCancelled, deadline_iter, request_deadline
+from app.extraction import extract_uri, stream_uri
+from app.page_ranges import PageSelection
+from app.result_model import REQUEST_ENGINES
+from app.batch import extract_batch
+from app.converter_pool import converter_pool
+from app.jobs import QueueFullError, job_manager
+from app.ocr import shutdown_ocr_executor
+from app.s3_utils import init_clients
+from app.pdf_buffer import PdfTooLargeError
+from app.json_stream import dumps, encode_event
+from app.metrics import ProfilerBusyError, profiled, render_prometheus, request_timings
+from app.logger import logger
 
 app = FastAPI(title="Docling PDF Form Recognizer (CPU - Simple)")
 
-class ExtractRequest(BaseModel):
-    file_uri: str  # e.g., "s3://bucket/file.pdf"
+# how often a sync /extract checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
 
-@app.post("/extract")
-def extract_pdf(req: ExtractRequest):
-    pdf_stream = get_pdf_stream(req.file_uri)
-    result = extract_structured(pdf_stream)
-    return result
+@app.exception_handler(PdfTooLargeError)
+def pdf_too_large(request, exc: PdfTooLargeError):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
 
+@app.exception_handler(DeadlineExceeded)
+def deadline_exceeded(request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
 
+@app.exception_handler(ExtractionCancelled)
+def extraction_cancelled(request, exc: ExtractionCancelled):
+    # nobody is listening; 499 is what proxies log for "client closed request"
+    return JSONResponse(status_code=499, content={"detail": str(exc)})
 
+@app.on_event("startup")
+def start_workers():
+    init_clients()
+    converter_pool.warm()
+    job_manager.start()
 
+@app.on_event("shutdown")
+def stop_workers():
+    job_manager.stop()
+    shutdown_ocr_executor()
 
+class FastJSONResponse(JSONResponse):
+    """Encodes result models directly (orjson), skipping jsonable_encoder."""
+    def render(self, content) -> bytes:
+        return dumps(content)
 
+class ExtractRequest(BaseModel):
+    file_uri: str  # e.g., "s3://bucket/file.pdf"
+    mode: Literal["sync", "async"] = "sync"  # async -> returns a job id to poll
+    stream: bool = False  # sync only: NDJSON page events as each page is ready, as /extract/stream
+    pages: Optional[str] = None  # e.g., "1-3,7"
+    first_n_pages: Optional[int] = None
+    engine: Optional[Literal["docling", "fast"]] = None  # default: settings.DEFAULT_ENGINE
+    timings: bool = False  # sync, unstreamed only: add a per-stage timing breakdown
+    profile: Optional[Literal["cprofile", "pyinstrument"]] = None  # ... and a profiler report
+
+def page_selection(pages: Optional[str], first_n_pages: Optional[int]) -> PageSelection:
+    try:
+        return PageSelection(pages, first_n_pages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+def request_engine(engine: Optional[str]) -> str:
+    engine = engine or settings.DEFAULT_ENGINE
+    if engine not in REQUEST_ENGINES:
+        raise HTTPException(status_code=500, detail="DEFAULT_ENGINE must be one of %s" % ", ".join(REQUEST_ENGINES))
+    return engine
+
+async def run_until_disconnected(request: Request, fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs) in the threadpool under a REQUEST_DEADLINE_SECONDS
+    deadline; cancelled as soon as the client disconnects.
+    """
+    deadline = Deadline(settings.REQUEST_DEADLINE_SECONDS)
 
+    def run():
+        with request_deadline(deadline):
+            return fn(*args, **kwargs)
 
+    work = asyncio.ensure_future(run_in_threadpool(run))
+    try:
+        while not work.done():
+            await asyncio.wait({work}, timeout=DISCONNECT_POLL_SECONDS)
+            if not work.done() and await request.is_disconnected():
+                logger.info("Client disconnected; cancelling %s", request.url.path)
+                deadline.cancel()
+                break
+        return await work
+    finally:
+        deadline.cancel()
 
+@app.post("/extract")
+async def extract_pdf(req: ExtractRequest, request: Request):
+    selection = page_selection(req.pages, req.first_n_pages)
+    engine = request_engine(req.engine)
+    if req.timings or req.profile:
+        if req.mode == "async" or req.stream:
+            raise HTTPException(status_code=400, detail="timings / profile need a sync, unstreamed request")
+        return await run_until_disconnected(request, extract_with_timings, req, selection, engine)
+    if req.mode == "async":
+        try:
+            job = job_manager.submit(req.file_uri, selection, engine)
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+        return JSONResponse(status_code=202, content={"job_id": job.job_id, "status": job.status})
+
+    if req.stream:
+        return stream_events(req.file_uri, selection, engine, "ndjson")
+    result = await run_until_disconnected(request, extract_uri, req.file_uri, selection=selection, engine=engine)
+    return FastJSONResponse(result)
+
+def extract_with_timings(req: ExtractRequest, selection: PageSelection, engine: str) -> JSONResponse:
+    """The result plus "timings" (and "profile"), and a Server-Timing header."""
+    if req.profile and not settings.REQUEST_PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Request profiling is disabled")
+    profile = None
+    with ExitStack() as stack:
+        timings = stack.enter_context(request_timings())
+        if req.profile:
+            try:
+                profile = stack.enter_context(profiled(req.profile))
+            except ProfilerBusyError as e:
+                raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "5"})
+            except ValueError as e:  # e.g. pyinstrument not installed
+                raise HTTPException(status_code=400, detail=str(e))
+        result = extract_uri(req.file_uri, selection=selection, engine=engine)
+
+    content = dict(result if isinstance(result, dict) else result.json_fields(), timings=timings.breakdown())
+    if profile is not None:
+        content["profile"] = {"profiler": profile.kind, "report": profile.report}
+    return FastJSONResponse(content, headers={"Server-Timing": timings.server_timing()})
+
+@app.get("/metrics")
+def metrics():
+    """Per-stage extraction timing histograms and converter pool counters (Prometheus text format)."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+class StreamExtractRequest(BaseModel):
+    file_uri: str
+    pages: Optional[str] = None
+    first_n_pages: Optional[int] = None
+    engine: Optional[Literal["docling", "fast"]] = None
+    format: Literal["ndjson", "sse"] = "ndjson"
+
+@app.post("/extract/stream")
+def extract_pdf_stream(req: StreamExtractRequest):
+    """
+    One "page" event per page as soon as it is converted or OCRed, then a
+    final "merged_tables" event (or an "error" event if extraction fails).
+    """
+    selection = page_selection(req.pages, req.first_n_pages)
+    return stream_events(req.file_uri, selection, request_engine(req.engine), req.format)
+
+def stream_events(file_uri: str, selection: PageSelection, engine: str, fmt: str) -> StreamingResponse:
+    """stream_uri() events as NDJSON lines or SSE frames, produced in the threadpool."""
+    deadline = Deadline(settings.REQUEST_DEADLINE_SECONDS)
+
+    def events():
+        try:
+            for event, data in stream_uri(file_uri, selection, engine):
+                yield encode_event(event, data, fmt)
+        except ExtractionCancelled:
+            logger.info("Client disconnected; stopped streaming %s", file_uri)
+        except Exception as e:
+            logger.exception("Streamed extraction failed for %s", file_uri)
+            yield encode_event("error", {"detail": str(e)}, fmt)
+
+    async def body():
+        items = deadline_iter(deadline, events())
+        try:
+            async for chunk in iterate_in_threadpool(items):
+                yield chunk
+        finally:
+            # finished, or the client went away: stop any work still in flight
+            deadline.cancel()
+            items.close()
+
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type)
+
+class BatchExtractRequest(BaseModel):
+    file_uris: List[str]
+
+@app.post("/extract/batch")
+def extract_pdf_batch(req: BatchExtractRequest):
+    """Streams one NDJSON line per document as soon as it finishes."""
+    if len(req.file_uris) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail="Too many file_uris (max %d)" % settings.BATCH_MAX_ITEMS)
+
+    def lines():
+        for record in extract_batch(req.file_uris):
+            yield dumps(record) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return FastJSONResponse(job.to_status())
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    """Server-sent events with the job status every time it changes."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        seen = -1
+        while True:
+            version, finished = job.version, job.finished
+            if version != seen:
+                seen = version
+                status = job.to_status(include_result=False)
+                yield "data: %s\n\n" % json.dumps(status)
+            if finished:
+                break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
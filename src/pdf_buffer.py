@@ -0,0 +1,238 @@
+# app/pdf_buffer.py
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import Iterator, Optional
+
+import fitz
+
+from app.config import settings
+
+# Docling picks the backend from the name's suffix
+_STREAM_NAME = "document.pdf"
+
+
+class PdfTooLargeError(ValueError):
+    pass
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class PdfBuffer:
+    """
+    A downloaded PDF, file-like like the BytesIO it replaces.
+
+    Bytes stay in memory up to SPOOL_MAX_MEMORY_BYTES and spill to a named
+    temp file above that. view() exposes the bytes without copying (the
+    BytesIO buffer, or a read-only mmap of the file), and `path` lets tools
+    that read files themselves (fitz, pdftoppm, Docling) share the same
+    on-disk copy. snapshot() is the in-memory bytes as one immutable
+    object, taken once, for readers that need their own stream over them.
+    Writes past MAX_PDF_BYTES raise PdfTooLargeError.
+    """
+
+    def __init__(self, max_memory: Optional[int] = None, max_size: Optional[int] = None,
+                 expected_size: Optional[int] = None):
+        self.max_memory = settings.SPOOL_MAX_MEMORY_BYTES if max_memory is None else max_memory
+        self.max_size = settings.MAX_PDF_BYTES if max_size is None else max_size
+        self.path: Optional[str] = None
+        self._file = BytesIO()
+        self._mmap: Optional[mmap.mmap] = None
+        self._snapshot: Optional[bytes] = None
+        self._finalizer = None
+        self._write_lock = threading.Lock()
+        if expected_size is not None:
+            self.check_size(expected_size)
+            if expected_size > self.max_memory:
+                self._rollover()
+
+    def check_size(self, size: int) -> None:
+        if self.max_size and size > self.max_size:
+            raise PdfTooLargeError("PDF is %d bytes; the limit is %d" % (size, self.max_size))
+
+    # ---- file-like API ----
+
+    def write(self, data) -> int:
+        end = self._file.tell() + len(data)
+        self.check_size(end)
+        self._snapshot = None
+        if self.path is None and end > self.max_memory:
+            self._rollover()
+        return self._file.write(data)
+
+    def write_at(self, offset: int, data) -> None:
+        """Positional write for concurrent ranged downloads; keeps the file position."""
+        end = offset + len(data)
+        self.check_size(end)
+        with self._write_lock:
+            self._snapshot = None
+            if self.path is None and end > self.max_memory:
+                self._rollover()
+            if self.path is None:
+                pos = self._file.tell()
+                self._file.seek(offset)
+                self._file.write(data)
+                self._file.seek(pos)
+                return
+            self._file.flush()
+            fd = self._file.fileno()
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(fd, view, offset)
+                view = view[written:]
+                offset += written
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readinto(self, b) -> int:
+        return self._file.readinto(b)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    @property
+    def size(self) -> int:
+        if self.path is None:
+            return self._file.getbuffer().nbytes
+        self._file.flush()
+        return os.fstat(self._file.fileno()).st_size
+
+    # ---- zero-copy access ----
+
+    def view(self) -> memoryview:
+        """The PDF bytes without copying. Release the view before writing."""
+        if self.path is None:
+            return self._file.getbuffer()
+        if self._mmap is None:
+            self._file.flush()
+            if not self.size:
+                return memoryview(b"")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def snapshot(self) -> bytes:
+        """
+        The bytes of an in-memory PDF, copied once and then shared: a
+        BytesIO over bytes reads them in place. Spilled PDFs use `path`.
+        """
+        if self._snapshot is None:
+            with self.view() as view:
+                self._snapshot = view.tobytes()
+        return self._snapshot
+
+    def ensure_path(self) -> str:
+        """Spill to disk if needed and return the file path."""
+        if self.path is None:
+            self._rollover()
+        self._file.flush()
+        return self.path
+
+    def open_fitz(self) -> "fitz.Document":
+        if self.path is not None:
+            self._file.flush()
+            return fitz.open(self.path, filetype="pdf")
+        # fitz reads a memoryview in place (a BytesIO it would copy) and keeps it for the document's life
+        return fitz.open(stream=self.view(), filetype="pdf")
+
+    def _rollover(self) -> None:
+        fd, path = tempfile.mkstemp(suffix=".pdf", dir=settings.SPOOL_DIR)
+        f = os.fdopen(fd, "w+b")
+        memory = self._file
+        pos = memory.tell()
+        f.write(memory.getbuffer())
+        f.seek(pos)
+        self._file = f
+        self.path = path
+        self._finalizer = weakref.finalize(self, _unlink, path)
+
+    # ---- cleanup ----
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # a view is still alive; the mapping goes when it does
+            self._mmap = None
+        try:
+            self._file.close()
+        except BufferError:
+            pass  # an open fitz document still reads the memory; it goes when the document does
+        self._snapshot = None
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __enter__(self) -> "PdfBuffer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_fitz(pdf) -> "fitz.Document":
+    """Open a PdfBuffer or BytesIO with fitz without an extra .read() copy."""
+    if isinstance(pdf, PdfBuffer):
+        return pdf.open_fitz()
+    pdf.seek(0)
+    return fitz.open(stream=pdf, filetype="pdf")
+
+
+def converter_source(pdf):
+    """
+    What to hand Docling: the spilled file itself, or a DocumentStream of
+    its own over the in-memory bytes. Each call gets a fresh stream, so a
+    reader on another thread never moves this thread's file position, and
+    none of them copies the PDF again (see PdfBuffer.snapshot()).
+    """
+    # imported here: OCR workers, downloads and classification use this module without Docling
+    from docling.datamodel.base_models import DocumentStream
+
+    if isinstance(pdf, PdfBuffer):
+        if pdf.path is not None:
+            pdf.flush()
+            return Path(pdf.path)
+        data = pdf.snapshot()
+    else:
+        data = pdf.getvalue()  # in place for a BytesIO made from bytes
+    return DocumentStream(name=_STREAM_NAME, stream=BytesIO(data))
+
+
+@contextmanager
+def local_pdf_path(pdf) -> Iterator[str]:
+    """A filesystem path with the PDF bytes, for tools that only read files."""
+    if isinstance(pdf, PdfBuffer):
+        yield pdf.ensure_path()
+        return
+    with tempfile.NamedTemporaryFile(suffix=".pdf", dir=settings.SPOOL_DIR) as tmp:
+        pdf.seek(0)
+        shutil.copyfileobj(pdf, tmp)
+        tmp.flush()
+        pdf.seek(0)
+        yield tmp.name
@@ -0,0 +1,160 @@
+# app/pdf_detect.py
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+import fitz
+
+from app.config import settings
+from app.logger import logger
+from app.pdf_buffer import open_fitz
+from app.page_ranges import ALL_PAGES, PageSelection
+from app.metrics import timed
+
+PAGE_DIGITAL = "digital"
+PAGE_SCANNED = "scanned"
+PAGE_SKIPPED = "skipped"  # outside the caller's page selection
+
+
+class PdfClassification:
+    """
+    Per-page born-digital / scanned decision for one PDF.
+
+    Keeps the opened fitz document so later stages can reuse it instead of
+    parsing the bytes again. Call close() when the extraction is done.
+    """
+
+    def __init__(self, doc: Optional["fitz.Document"], page_kinds: List[str], owns_doc: bool = True):
+        self.doc = doc
+        self.page_kinds = page_kinds
+        self._owns_doc = owns_doc
+
+    def subset(self, pages: List[int]) -> "PdfClassification":
+        """Same document restricted to `pages`; closing it leaves the document open."""
+        wanted = set(pages)
+        kinds = [k if i in wanted else PAGE_SKIPPED for i, k in enumerate(self.page_kinds, start=1)]
+        return PdfClassification(self.doc, kinds, owns_doc=False)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_kinds)
+
+    @property
+    def selected_pages(self) -> List[int]:
+        """1-based page numbers to extract."""
+        return [i for i, kind in enumerate(self.page_kinds, start=1) if kind != PAGE_SKIPPED]
+
+    @property
+    def scanned_pages(self) -> List[int]:
+        """1-based page numbers that need OCR."""
+        return [i for i, kind in enumerate(self.page_kinds, start=1) if kind == PAGE_SCANNED]
+
+    @property
+    def digital_pages(self) -> List[int]:
+        return [i for i, kind in enumerate(self.page_kinds, start=1) if kind == PAGE_DIGITAL]
+
+    @property
+    def is_partial(self) -> bool:
+        return PAGE_SKIPPED in self.page_kinds
+
+    @property
+    def is_scanned(self) -> bool:
+        kinds = [k for k in self.page_kinds if k != PAGE_SKIPPED]
+        return bool(kinds) and all(k == PAGE_SCANNED for k in kinds)
+
+    @property
+    def is_mixed(self) -> bool:
+        return len(set(self.page_kinds) - {PAGE_SKIPPED}) > 1
+
+    def runs(self) -> List[Tuple[str, int, int]]:
+        """Selected pages as (kind, first, last) runs of consecutive pages of one kind."""
+        runs: List[Tuple[str, int, int]] = []
+        for n, kind in enumerate(self.page_kinds, start=1):
+            if kind == PAGE_SKIPPED:
+                continue
+            if runs and runs[-1][0] == kind and runs[-1][2] == n - 1:
+                runs[-1] = (kind, runs[-1][1], n)
+            else:
+                runs.append((kind, n, n))
+        return runs
+
+    def close(self) -> None:
+        if self.doc is not None and self._owns_doc:
+            self.doc.close()
+        self.doc = None
+
+
+def image_coverage(page) -> float:
+    """Fraction of the page area covered by images (overlaps counted twice, capped at 1)."""
+    page_area = abs(page.rect)
+    if not page_area:
+        return 0.0
+    covered = 0.0
+    for info in page.get_image_info():
+        covered += abs(fitz.Rect(info["bbox"]) & page.rect)
+    return min(covered / page_area, 1.0)
+
+
+def _mostly_image(page) -> bool:
+    # a page number or stamp on top of a full-page scan is still a scan
+    return image_coverage(page) >= settings.DETECT_IMAGE_COVERAGE
+
+
+def _sample_indexes(page_count: int, max_samples: int) -> List[int]:
+    if page_count <= max_samples:
+        return list(range(page_count))
+    step = (page_count - 1) / (max_samples - 1) if max_samples > 1 else 0
+    return sorted({round(i * step) for i in range(max_samples)})
+
+
+@timed("classify")
+def classify_pdf(pdf_bytes: BytesIO, selection: PageSelection = ALL_PAGES) -> PdfClassification:
+    """
+    Open the PDF once and classify the selected pages.
+
+    Every selected page's text layer is read: no text means scanned, at
+    least DETECT_MIN_TEXT_CHARS means digital, so a scanned page among
+    digital ones is never missed. Only the pages with a little text (a page
+    number or stamp) need the image coverage check, and that one is sampled:
+    at most DETECT_MAX_SAMPLE_PAGES evenly spaced short-text pages are
+    inspected, and if they agree the rest follow them; otherwise each one
+    is checked. Pages outside `selection` are marked PAGE_SKIPPED and never
+    read.
+    """
+    try:
+        doc = open_fitz(pdf_bytes)
+    except Exception as e:
+        logger.warning("fitz check failed: %s; treating as not scanned", e)
+        return PdfClassification(None, [])
+    finally:
+        pdf_bytes.seek(0)
+
+    try:
+        page_count = doc.page_count
+        selected = [n - 1 for n in selection.resolve(page_count)]
+        page_kinds = [PAGE_SKIPPED] * page_count
+        short_text = []
+        for i in selected:
+            chars = len(doc[i].get_text().strip())
+            if not chars:
+                page_kinds[i] = PAGE_SCANNED
+            elif chars >= settings.DETECT_MIN_TEXT_CHARS:
+                page_kinds[i] = PAGE_DIGITAL
+            else:
+                short_text.append(i)
+        samples = [short_text[i] for i in _sample_indexes(len(short_text), settings.DETECT_MAX_SAMPLE_PAGES)]
+        sampled = {i: _mostly_image(doc[i]) for i in samples}
+        uniform = set(sampled.values())
+        for i in short_text:
+            if i in sampled:
+                scanned = sampled[i]
+            elif len(uniform) == 1:
+                scanned = next(iter(uniform))
+            else:
+                scanned = _mostly_image(doc[i])
+            page_kinds[i] = PAGE_SCANNED if scanned else PAGE_DIGITAL
+    except Exception as e:
+        logger.warning("fitz check failed: %s; treating as not scanned", e)
+        doc.close()
+        return PdfClassification(None, [])
+
+    return PdfClassification(doc, page_kinds)
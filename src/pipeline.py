@@ -0,0 +1,246 @@
+# app/pipeline.py
+import threading
+import time
+from queue import Queue, Empty, Full
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from app.config import settings
+from app.logger import logger
+from app.s3_utils import get_pdf_stream, head_source
+from app.pdf_detect import classify_pdf
+from app.docling_parser import convert_document, structure_pages, build_result
+from app.result_cache import result_cache
+
+_STOP = object()
+_POLL_SECONDS = 0.1
+
+
+class PipelineItem:
+    """One document moving through the pipeline."""
+
+    def __init__(self, file_uri: str):
+        self.file_uri = file_uri
+        self.etag: Optional[str] = None
+        self.cache_key: Optional[str] = None
+        self.pdf = None
+        self.classification = None
+        self.docling_pages: List[Any] = []  # (page number, Docling page) pairs
+        self.ocr_pages: Dict[int, Dict[str, Any]] = {}
+        self.pages: List[Dict[str, Any]] = []
+        self.tables: List[Dict[str, Any]] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.result is not None or self.error is not None
+
+    def release(self) -> None:
+        if self.classification is not None:
+            self.classification.close()
+            self.classification = None
+        if self.pdf is not None:
+            self.pdf.close()
+            self.pdf = None
+
+    def to_record(self) -> Dict[str, Any]:
+        if self.error is not None:
+            return {"file_uri": self.file_uri, "error": self.error}
+        return {"file_uri": self.file_uri, "result": self.result}
+
+
+class Stage:
+    """A named step with its own worker threads, reading from a bounded queue."""
+
+    def __init__(self, name: str, fn: Callable[[PipelineItem], None], workers: int, queue_size: int):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.inbox: Queue = Queue(maxsize=queue_size)
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+        self._active = self.workers
+        self._lock = threading.Lock()
+
+    def note_depth(self) -> None:
+        depth = self.inbox.qsize()
+        with self._lock:
+            self.max_depth = max(self.max_depth, depth)
+
+    def stats(self, elapsed: float) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "processed": self.processed,
+                "busy_seconds": round(self.busy_seconds, 6),
+                "throughput_per_sec": round(self.processed / elapsed, 3) if elapsed > 0 else 0.0,
+                "queue_depth": self.inbox.qsize(),
+                "max_queue_depth": self.max_depth,
+            }
+
+
+# ---- stage functions ----
+
+def _fetch(item: PipelineItem) -> None:
+    head = head_source(item.file_uri)
+    item.etag = head.etag if head is not None else None
+    if item.etag:
+        cached = result_cache.get_by_source(item.file_uri, item.etag)
+        if cached is not None:
+            item.result = cached
+            return
+    item.pdf = get_pdf_stream(item.file_uri, head)
+    item.cache_key = result_cache.key_for(item.pdf)
+    cached = result_cache.get(item.cache_key)
+    if cached is not None:
+        item.result = cached
+        item.release()
+        _remember_source(item)
+
+
+def _remember_source(item: PipelineItem) -> None:
+    if item.etag:
+        result_cache.remember_source(item.file_uri, item.etag, item.cache_key)
+
+
+def _classify(item: PipelineItem) -> None:
+    item.classification = classify_pdf(item.pdf)
+
+
+def _convert(item: PipelineItem) -> None:
+    try:
+        item.docling_pages, item.ocr_pages = convert_document(item.pdf, item.classification)
+    finally:
+        item.release()
+
+
+def _structure(item: PipelineItem) -> None:
+    item.pages, item.tables = structure_pages(item.docling_pages, item.ocr_pages)
+    item.docling_pages, item.ocr_pages = [], {}
+
+
+def _merge(item: PipelineItem) -> None:
+    item.result = build_result(item.pages, item.tables)
+    item.pages, item.tables = [], []
+    result_cache.put(item.cache_key, item.result)
+    _remember_source(item)
+
+
+class ExtractionPipeline:
+    """
+    fetch -> classify -> convert/OCR -> structure -> merge, each stage on its
+    own threads with bounded queues in between. While one document converts
+    the next one is already downloading; a full queue blocks the stage in
+    front of it, so memory stays bounded by the queue sizes.
+
+    run() yields records in completion order; stats() reports per-stage
+    throughput and queue depth.
+    """
+
+    def __init__(self, workers: Optional[Dict[str, int]] = None, queue_size: Optional[int] = None):
+        workers = workers or {}
+        queue_size = queue_size or settings.PIPELINE_QUEUE_SIZE
+        default_workers = {
+            "fetch": settings.PIPELINE_FETCH_WORKERS,
+            "classify": 1,
+            "convert": settings.CONVERTER_POOL_SIZE,
+            "structure": 1,
+            "merge": 1,
+        }
+        fns = {"fetch": _fetch, "classify": _classify, "convert": _convert,
+               "structure": _structure, "merge": _merge}
+        self.stages = [
+            Stage(name, fns[name], workers.get(name, default_workers[name]), queue_size)
+            for name in ("fetch", "classify", "convert", "structure", "merge")
+        ]
+        self._output: Queue = Queue(maxsize=queue_size)
+        self._cancelled = threading.Event()
+        self._started_at: Optional[float] = None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+        return {stage.name: stage.stats(elapsed) for stage in self.stages}
+
+    def run(self, file_uris: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        self._started_at = time.perf_counter()
+        threads = [threading.Thread(target=self._feed, args=(file_uris,), name="pipeline-feed", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            next_stage = self.stages[i + 1] if i + 1 < len(self.stages) else None
+            for n in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work, args=(stage, next_stage),
+                    name="pipeline-%s-%d" % (stage.name, n), daemon=True,
+                ))
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                item = self._get(self._output)
+                if item is _STOP or item is None:
+                    break
+                yield item.to_record()
+        finally:
+            # consumer went away early: let blocked stages drain and exit
+            self._cancelled.set()
+            logger.info("Pipeline stats: %s", self.stats())
+
+    # ---- plumbing ----
+
+    def _put(self, q: Queue, item: Any) -> bool:
+        while not self._cancelled.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _get(self, q: Queue) -> Any:
+        while not self._cancelled.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except Empty:
+                continue
+        return None
+
+    def _feed(self, file_uris: Iterable[str]) -> None:
+        first = self.stages[0]
+        for file_uri in file_uris:
+            if not self._put(first.inbox, PipelineItem(file_uri)):
+                return
+            first.note_depth()
+        self._put(first.inbox, _STOP)
+
+    def _work(self, stage: Stage, next_stage: Optional[Stage]) -> None:
+        outbox = next_stage.inbox if next_stage is not None else self._output
+        while True:
+            item = self._get(stage.inbox)
+            if item is None:
+                return
+            if item is _STOP:
+                with stage._lock:
+                    stage._active -= 1
+                    last = stage._active == 0
+                # siblings need to see the sentinel too; the last one forwards it
+                self._put(outbox if last else stage.inbox, _STOP)
+                return
+
+            if not item.finished:
+                start = time.perf_counter()
+                try:
+                    stage.fn(item)
+                except Exception as e:
+                    logger.exception("Pipeline stage %s failed for %s", stage.name, item.file_uri)
+                    item.error = str(e)
+                    item.release()
+                with stage._lock:
+                    stage.processed += 1
+                    stage.busy_seconds += time.perf_counter() - start
+
+            if not self._put(outbox, item):
+                item.release()
+                return
+            if next_stage is not None:
+                next_stage.note_depth()
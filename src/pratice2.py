@@ -1,9 +1,12 @@
 import json
 import torch
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 from docling.document_converter import DocumentConverter
 
+from app.heading_classifier import BlockColumns, dict_heading_levels
+from app.table_stitch import stitch_tables
+
 
 # --------------------------
 # Helper functions
@@ -54,63 +57,64 @@ def extract_points(text: str) -> List[str]:
     return points
 
 
-def normalize_header(headers: List[str]) -> List[str]:
-    return [h.strip().lower() for h in headers if h.strip()]
-
-
 def merge_tables_across_pages(tables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Merges tables if headers match (table continues on next page)."""
-    merged = []
-    used = [False] * len(tables)
-
-    for i, t1 in enumerate(tables):
-        if used[i]:
-            continue
-        cur = {
-            "start_page": t1["page"],
-            "end_page": t1["page"],
-            "rows": t1["rows"].copy()
-        }
-        used[i] = True
-
-        for j, t2 in enumerate(tables[i + 1:], start=i + 1):
-            if used[j]:
-                continue
-            h1 = normalize_header(t1["rows"][0]) if t1["rows"] else []
-            h2 = normalize_header(t2["rows"][0]) if t2["rows"] else []
-
-            # Similar headers -> same table continuation
-            if h1 and h2 and (h1 == h2 or len(set(h1).intersection(h2)) / len(h1) > 0.7):
-                cur["rows"].extend(t2["rows"][1:])  # skip repeated header
-                cur["end_page"] = t2["page"]
-                used[j] = True
-        merged.append(cur)
-    return merged
+    """Merges tables if headers match (table continues on a later page)."""
+    return stitch_tables(tables, adjacent_pages=False)
 
 
 # --------------------------
 # Main PDF extraction logic
 # --------------------------
 
-def extract_pdf_structure(pdf_path: str) -> Dict[str, Any]:
-    """Extract headings, subheadings, points, paragraphs, and tables from PDF."""
+def page_runs(pages: Sequence[int]) -> List[Tuple[int, int]]:
+    """[1, 2, 3, 7] -> [(1, 3), (7, 7)]"""
+    runs = []
+    for n in sorted(set(pages)):
+        if runs and n == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], n)
+        else:
+            runs.append((n, n))
+    return runs
+
+
+def convert_pages(converter: DocumentConverter, pdf_path: str, pages: Optional[Sequence[int]]):
+    """Yield (page_number, page dict); only the requested pages are converted."""
+    runs = [None] if pages is None else page_runs(pages)
+    for run in runs:
+        if run is None:
+            result = converter.convert(pdf_path)
+        else:
+            result = converter.convert(pdf_path, page_range=run)
+        doc = getattr(result, "document", result)
+        doc_dict = doc.to_dict() if hasattr(doc, "to_dict") else doc
+        start = 1 if run is None else run[0]
+        yield from enumerate(doc_dict.get("pages", []), start=start)
+
+
+def extract_pdf_structure(pdf_path: str, pages: Optional[Sequence[int]] = None) -> Dict[str, Any]:
+    """
+    Extract headings, subheadings, points, paragraphs, and tables from PDF.
+    `pages` (1-based) limits conversion to those pages, e.g. range(1, 6).
+    """
     device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"🔹 Using device: {device}")
 
     converter = DocumentConverter()
     print(f"🔹 Processing PDF: {pdf_path}")
-    result = converter.convert(pdf_path)
-    doc = getattr(result, "document", result)
-    doc_dict = doc.to_dict() if hasattr(doc, "to_dict") else doc
 
     output = {"pages": [], "merged_tables": []}
     all_tables = []
 
-    for page_index, page in enumerate(doc_dict.get("pages", []), start=1):
+    converted = [(page_index, page.get("blocks", [])) for page_index, page in convert_pages(converter, pdf_path, pages)]
+    # heading rules (is_heading / is_subheading) for every block of the document in one pass
+    columns = BlockColumns.from_dict_blocks([block for _, blocks in converted for block in blocks])
+    levels = iter(dict_heading_levels(columns).tolist())
+
+    for page_index, blocks in converted:
         page_data = {"page_number": page_index, "structure": [], "tables": []}
-        blocks = page.get("blocks", [])
 
         for block in blocks:
+            level = next(levels)
             text = (block.get("text") or "").strip()
             if not text:
                 continue
@@ -135,10 +139,8 @@ def extract_pdf_structure(pdf_path: str) -> Dict[str, Any]:
                 continue
 
             # ----- Text Handling -----
-            if is_heading(block):
-                page_data["structure"].append({"type": "heading", "level": 1, "text": text})
-            elif is_subheading(block):
-                page_data["structure"].append({"type": "heading", "level": 2, "text": text})
+            if level:
+                page_data["structure"].append({"type": "heading", "level": level, "text": text})
             else:
                 pts = extract_points(text)
                 if pts:
@@ -0,0 +1,72 @@
+# app/ranged_download.py
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.pdf_buffer import PdfBuffer
+
+# fetch_range(first_byte, last_byte) -> bytes, both offsets inclusive
+RangeFetcher = Callable[[int, int], bytes]
+
+
+class RangeNotSupportedError(Exception):
+    """The server ignored the Range header; use a single streamed GET instead."""
+
+
+def http_range_fetcher(session: Any, url: str, etag: Optional[str], timeout: float) -> RangeFetcher:
+    """
+    Range GETs through a requests session (retries are the session's).
+    With an ETag a changed object answers 200 and RangeNotSupportedError
+    is raised, as it is for a server that ignores Range.
+    """
+    def fetch_range(first: int, last: int) -> bytes:
+        headers = {"Range": "bytes=%d-%d" % (first, last)}
+        if etag:
+            headers["If-Range"] = etag  # full body (200) if the object changed
+        # streamed, so a 200 (the whole object) is refused before its body is read
+        with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise RangeNotSupportedError(url)
+            return r.content
+
+    return fetch_range
+
+
+def s3_range_fetcher(s3: Any, bucket: str, key: str, etag: Optional[str]) -> RangeFetcher:
+    """Ranged get_object calls; with an ETag every part must come from that object version."""
+    def fetch_range(first: int, last: int) -> bytes:
+        kwargs = {"Bucket": bucket, "Key": key, "Range": "bytes=%d-%d" % (first, last)}
+        if etag:
+            kwargs["IfMatch"] = etag
+        return s3.get_object(**kwargs)["Body"].read()
+
+    return fetch_range
+
+
+def split_ranges(size: int, part_size: int) -> List[Tuple[int, int]]:
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+def download_ranged(dest: PdfBuffer, size: int, fetch_range: RangeFetcher,
+                    part_size: int, concurrency: int) -> None:
+    """
+    Fill `dest` with `size` bytes fetched as concurrent byte ranges.
+
+    Each worker writes its part straight to its offset, so at most
+    `concurrency` parts are held in memory at once. The first failure
+    cancels the remaining parts and is re-raised.
+    """
+    def fetch_part(first: int, last: int) -> None:
+        data = fetch_range(first, last)
+        if len(data) != last - first + 1:
+            raise IOError("Range %d-%d returned %d bytes" % (first, last, len(data)))
+        dest.write_at(first, data)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="range-get") as executor:
+        futures = [executor.submit(fetch_part, first, last) for first, last in split_ranges(size, part_size)]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        for fut in not_done:
+            fut.cancel()
+        for fut in done:
+            fut.result()
+    dest.seek(0)
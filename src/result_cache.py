@@ -0,0 +1,222 @@
+# app/result_cache.py
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+from app.logger import logger
+from app.json_stream import dumps, loads
+from app.metrics import timed
+from app.pdf_buffer import PdfBuffer
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ResultCache:
+    """
+    Content-addressed cache of extraction results.
+
+    Keys are the SHA-256 of the PDF bytes plus PARSER_CONFIG_VERSION, so a
+    parser change never serves stale output. Two tiers:
+      - memory: LRU of the most recent results
+      - disk:   one JSON file per key, bounded in total size, TTL expired
+    A small source index maps (file_uri, ETag) to a content key so known
+    objects can be served without downloading them again. Both tiers keep
+    the encoded JSON and every get() decodes a fresh copy: results come
+    back as dicts whichever tier they were found in, and a caller that
+    changes one cannot change the cached entry.
+    """
+
+    def __init__(self, cache_dir: str, memory_items: int, disk_bytes: int, ttl_seconds: int, version: str):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.version = version
+        self._memory: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_used: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    # ---- keys ----
+
+    @timed("hash")
+    def key_for(self, pdf_stream: BytesIO) -> str:
+        digest = hashlib.sha256()
+        if isinstance(pdf_stream, PdfBuffer):
+            # hash the buffer / mmap in place instead of reading copies
+            with pdf_stream.view() as view:
+                digest.update(view)
+        else:
+            pdf_stream.seek(0)
+            for chunk in iter(lambda: pdf_stream.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+            pdf_stream.seek(0)
+        return "%s-v%s" % (digest.hexdigest(), self.version)
+
+    def _source_key(self, file_uri: str, etag: str) -> str:
+        raw = "%s\n%s\n%s" % (file_uri, etag, self.version)
+        return "src-" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ---- public API ----
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        self._put(key, result)
+
+    def get_by_source(self, file_uri: str, etag: str, variant: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Fast path: result for an object whose ETag we have seen before.
+        `variant` is appended to the content key (e.g. a page selection tag).
+        """
+        key = self._get(self._source_key(file_uri, etag))
+        if key is None:
+            return None
+        return self.get(key + variant)
+
+    def remember_source(self, file_uri: str, etag: str, key: str) -> None:
+        self._put(self._source_key(file_uri, etag), key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_used or 0,
+            }
+
+    # ---- tiers ----
+
+    def _get(self, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires, data = entry
+                if expires > now:
+                    self._memory.move_to_end(key)
+                    return loads(data)
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime + self.ttl_seconds <= now:
+                self._remove(path)
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+            value = loads(data)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Dropping unreadable cache entry %s: %s", path, e)
+            self._remove(path)
+            return None
+
+        self._remember(key, data, mtime + self.ttl_seconds)
+        return value
+
+    def _put(self, key: str, value: Any) -> None:
+        data = dumps(value)
+        self._remember(key, data, time.time() + self.ttl_seconds)
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write cache entry %s: %s", path, e)
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            if self._disk_used is not None:
+                self._disk_used += os.path.getsize(path) - old_size
+        self._evict_disk()
+
+    def _remember(self, key: str, data: bytes, expires: float) -> None:
+        if self.memory_items <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (expires, data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[-2:], key + ".json")
+
+    def _remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_used is not None:
+                self._disk_used -= size
+
+    def _evict_disk(self) -> None:
+        with self._lock:
+            if self._disk_used is not None and self._disk_used <= self.disk_bytes:
+                return
+
+        # rescan: drop expired entries, then the oldest until under the bound
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if st.st_mtime + self.ttl_seconds <= now:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+        entries.sort()
+        used = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if used <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+                used -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_used = used
+
+
+result_cache = ResultCache(
+    cache_dir=settings.RESULT_CACHE_DIR,
+    memory_items=settings.RESULT_CACHE_MEMORY_ITEMS,
+    disk_bytes=settings.RESULT_CACHE_DISK_BYTES,
+    ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+    version=settings.PARSER_CONFIG_VERSION,
+)
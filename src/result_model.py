@@ -0,0 +1,112 @@
+# app/result_model.py
+from typing import Any, Dict, List, Optional
+
+# which engine produced a page
+ENGINE_DOCLING = "docling"  # Docling layout analysis
+ENGINE_FAST = "fast"  # PyMuPDF text blocks, no layout model
+ENGINE_OCR = "ocr"  # tesseract over the rendered page
+# engines a request can ask for (OCR is chosen per page, never requested)
+REQUEST_ENGINES = (ENGINE_DOCLING, ENGINE_FAST)
+
+
+class StructureItem:
+    """One heading / point / paragraph. `level` is only set for headings."""
+
+    __slots__ = ("type", "text", "level")
+
+    def __init__(self, type: str, text: str, level: Optional[int] = None):
+        self.type = type
+        self.text = text
+        self.level = level
+
+    def json_fields(self) -> Dict[str, Any]:
+        if self.level is None:
+            return {"type": self.type, "text": self.text}
+        return {"type": self.type, "level": self.level, "text": self.text}
+
+    to_dict = json_fields
+
+
+class Table:
+    __slots__ = ("page", "rows")
+
+    def __init__(self, page: int, rows: List[List[str]]):
+        self.page = page
+        self.rows = rows
+
+    def json_fields(self) -> Dict[str, Any]:
+        return {"page": self.page, "rows": self.rows}
+
+    to_dict = json_fields
+
+
+class Page:
+    __slots__ = ("page_number", "structure", "tables", "engine")
+
+    def __init__(self, page_number: int, structure: List[StructureItem], tables: List[Table],
+                 engine: Optional[str] = None):
+        self.page_number = page_number
+        self.structure = structure
+        self.tables = tables
+        self.engine = engine
+
+    def json_fields(self) -> Dict[str, Any]:
+        """Shallow: nested items stay objects for the encoder to visit."""
+        fields = {"page_number": self.page_number, "structure": self.structure, "tables": self.tables}
+        if self.engine is not None:
+            fields["engine"] = self.engine
+        return fields
+
+    @classmethod
+    def from_dict(cls, fields: Dict[str, Any], page_number: Optional[int] = None) -> "Page":
+        """Rebuild a page from to_dict() output, optionally under another page number."""
+        n = fields["page_number"] if page_number is None else page_number
+        structure = [StructureItem(item["type"], item["text"], item.get("level")) for item in fields["structure"]]
+        tables = [Table(n, table["rows"]) for table in fields["tables"]]
+        return cls(n, structure, tables, engine=fields.get("engine"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        fields = {
+            "page_number": self.page_number,
+            "structure": [item.to_dict() for item in self.structure],
+            "tables": [table.to_dict() for table in self.tables],
+        }
+        if self.engine is not None:
+            fields["engine"] = self.engine
+        return fields
+
+
+class ExtractionResult:
+    """
+    A finished extraction. Serializes to the same JSON as the old nested
+    dicts: {**leading, "pages": [...], "merged_tables": [...]}; `leading`
+    holds fields that come first (e.g. {"file": None}). "reused_pages"
+    follows when the page cache was consulted, "ocr" when pages were OCRed.
+    """
+
+    __slots__ = ("pages", "merged_tables", "leading", "reused_pages", "ocr")
+
+    def __init__(self, pages: List[Page], merged_tables: List[Dict[str, Any]],
+                 leading: Optional[Dict[str, Any]] = None, reused_pages: Optional[int] = None,
+                 ocr: Optional[Dict[str, Any]] = None):
+        self.pages = pages
+        self.merged_tables = merged_tables
+        self.leading = leading or {}
+        self.reused_pages = reused_pages  # pages served from the page cache
+        self.ocr = ocr  # OcrStats.summary()
+
+    def json_fields(self) -> Dict[str, Any]:
+        fields = dict(self.leading, pages=self.pages, merged_tables=self.merged_tables)
+        self._add_trailing(fields)
+        return fields
+
+    def to_dict(self) -> Dict[str, Any]:
+        fields = dict(self.leading, pages=[page.to_dict() for page in self.pages], merged_tables=self.merged_tables)
+        self._add_trailing(fields)
+        return fields
+
+    def _add_trailing(self, fields: Dict[str, Any]) -> None:
+        if self.reused_pages is not None:
+            fields["reused_pages"] = self.reused_pages
+        if self.ocr is not None:
+            fields["ocr"] = self.ocr
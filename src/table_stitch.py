@@ -0,0 +1,153 @@
+# app/table_stitch.py
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+HEADER_MATCH_RATIO = 0.75
+HEADER_OVERLAP = 0.7  # any-page mode: share of the earlier header's cells found in the later one
+
+
+def normalize_cell(cell: Any) -> str:
+    return " ".join(str(cell or "").split()).lower()
+
+
+def normalize_header(row: List[Any]) -> Tuple[str, ...]:
+    return tuple(normalize_cell(c) for c in row)
+
+
+def overlap_header(row: List[str]) -> Tuple[str, ...]:
+    """Any-page normalization: stripped, lowercased, empty cells dropped."""
+    return tuple(c.strip().lower() for c in row if c.strip())
+
+
+def cells_match(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    m = SequenceMatcher(None, a, b)
+    # cheap upper bounds first; ratio() is the expensive part
+    return (m.real_quick_ratio() >= HEADER_MATCH_RATIO
+            and m.quick_ratio() >= HEADER_MATCH_RATIO
+            and m.ratio() >= HEADER_MATCH_RATIO)
+
+
+def normalized_headers_match(h1: Tuple[str, ...], h2: Tuple[str, ...]) -> bool:
+    if not h1 or not h2 or len(h1) != len(h2):
+        return False
+    return all(cells_match(a, b) for a, b in zip(h1, h2))
+
+
+def headers_overlap(h1: Tuple[str, ...], h2: Tuple[str, ...]) -> bool:
+    """Any-page rule: h2 continues h1 when more than HEADER_OVERLAP of h1's cells appear in it."""
+    return bool(h1) and bool(h2) and (h1 == h2 or len(set(h1).intersection(h2)) / len(h1) > HEADER_OVERLAP)
+
+
+def overlap_prefix(header: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Index terms of an any-page header: the first len(cells) - needed + 1 of
+    its distinct cells in sorted order, where `needed` is the fewest shared
+    cells headers_overlap() accepts. A header that overlaps enough shares
+    `needed` cells with it, and at least one of them is among these, so
+    probing the index with every cell of a fragment finds every table it
+    could continue. Empty when only an identical header can match.
+    """
+    cells = sorted(set(header))
+    needed = next(k for k in range(1, len(header) + 1) if k / len(header) > HEADER_OVERLAP)
+    return tuple(cells[:len(cells) - needed + 1])
+
+
+class _Group:
+    __slots__ = ("order", "header", "start_page", "end_page", "rows")
+
+    def __init__(self, order: int, header: Tuple[str, ...], page: int, rows: List[List[Any]]):
+        self.order = order
+        self.header = header
+        self.start_page = page
+        self.end_page = page
+        self.rows = [row[:] for row in rows]
+
+    def absorb(self, page: int, rows: List[List[Any]]) -> None:
+        self.rows.extend(rows[1:])  # skip the repeated header
+        self.end_page = page
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"start_page": self.start_page, "end_page": self.end_page, "rows": self.rows}
+
+
+def stitch_tables(tables: List[Any], adjacent_pages: bool = True) -> List[Dict[str, Any]]:
+    """
+    Join table fragments whose header rows match into one table.
+
+    tables: [{"page": int, "rows": [[cell, ...], ...]}, ...] (or Table
+            objects) in page order.
+    adjacent_pages=True  -> a fragment continues the last table when that
+                            ended on the previous page and every header
+                            cell matches (normalized_headers_match); empty
+                            fragments are dropped.
+    adjacent_pages=False -> a fragment joins the earliest table whose header
+                            it overlaps (headers_overlap), wherever it is;
+                            a table never continued by one is kept, empty
+                            ones too.
+
+    Each header is normalized once. The adjacent mode only ever compares
+    with the last table. The any-page mode looks a fragment up in an
+    exact-header index and in an index of overlap_prefix() terms, and runs
+    headers_overlap() only on the tables found there, earliest first; the
+    index is a pre-filter and never hides a table the rule would accept.
+    """
+    if adjacent_pages:
+        return _stitch_adjacent(tables)
+    return _stitch_any_page(tables)
+
+
+def _page_rows(t: Any) -> Tuple[int, List[List[Any]]]:
+    return (t["page"], t["rows"]) if isinstance(t, dict) else (t.page, t.rows)
+
+
+def _stitch_adjacent(tables: List[Any]) -> List[Dict[str, Any]]:
+    groups: List[_Group] = []
+    for t in tables:
+        page, rows = _page_rows(t)
+        if not rows:
+            continue
+        header = normalize_header(rows[0])
+        last = groups[-1] if groups else None
+        if last is not None and page == last.end_page + 1 and normalized_headers_match(last.header, header):
+            last.absorb(page, rows)
+        else:
+            groups.append(_Group(len(groups), header, page, rows))
+    return [g.to_dict() for g in groups]
+
+
+def _stitch_any_page(tables: List[Any]) -> List[Dict[str, Any]]:
+    groups: List[_Group] = []
+    exact: Dict[Tuple[str, ...], _Group] = {}
+    by_cell: Dict[str, List[_Group]] = {}
+
+    for t in tables:
+        page, rows = _page_rows(t)
+        header = overlap_header(rows[0]) if rows else ()
+        group = _find_overlapping(header, exact, by_cell) if header else None
+        if group is not None:
+            group.absorb(page, rows)
+            continue
+
+        group = _Group(len(groups), header, page, rows)
+        groups.append(group)
+        if header:
+            exact.setdefault(header, group)
+            for cell in overlap_prefix(header):
+                by_cell.setdefault(cell, []).append(group)
+
+    return [g.to_dict() for g in groups]
+
+
+def _find_overlapping(header: Tuple[str, ...], exact: Dict[Tuple[str, ...], _Group],
+                      by_cell: Dict[str, List[_Group]]) -> Optional[_Group]:
+    """The earliest table `header` continues."""
+    candidates = {id(g): g for cell in set(header) for g in by_cell.get(cell, ())}
+    same = exact.get(header)
+    if same is not None:
+        candidates[id(same)] = same
+    for g in sorted(candidates.values(), key=lambda g: g.order):
+        if headers_overlap(g.header, header):
+            return g
+    return None
@@ -0,0 +1,296 @@
+"""
+KeycloakAuthenticationMiddleware key handling against a stub JWKS server:
+kid lookup, key rotation (static key and JWKS), unknown kids and
+concurrent lookups sharing one refresh.
+"""
+import asyncio
+import json
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from jwcrypto import jwk, jwt
+from jwcrypto.jws import InvalidJWSSignature
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "services"))
+
+try:
+    from config.settings import settings
+except ImportError:
+    # the service's config package is not part of this tree
+    settings = types.SimpleNamespace()
+    config = types.ModuleType("config")
+    config.settings = types.ModuleType("config.settings")
+    config.settings.settings = settings
+    sys.modules["config"] = config
+    sys.modules["config.settings"] = config.settings
+
+from second_main import (  # noqa: E402  (needs config.settings)
+    AUTH_STATS_PATH,
+    KeycloakAuthenticationMiddleware,
+    UnknownKeyIdError,
+)
+
+
+def make_key(kid=None) -> jwk.JWK:
+    return jwk.JWK.generate(kty="RSA", size=2048, kid=kid) if kid else jwk.JWK.generate(kty="RSA", size=2048)
+
+
+def make_token(key: jwk.JWK, email: str = "user@example.com") -> str:
+    header = {"alg": "RS256"}
+    if key.get("kid"):
+        header["kid"] = key["kid"]
+    token = jwt.JWT(header=header, claims={"email": email, "sub": "user"}, default_claims={"exp": None})
+    token.make_signed_token(key)
+    return token.serialize()
+
+
+def static_key(key: jwk.JWK) -> str:
+    """KEYCLOAK_PUBLIC_KEY form: the PEM body without its BEGIN / END lines."""
+    lines = key.export_to_pem().decode().strip().splitlines()
+    return "\n".join(lines[1:-1])
+
+
+class StubJwks:
+    """A JWKS endpoint whose key set can be swapped; counts fetches, each taking `delay` seconds."""
+
+    def __init__(self):
+        self.keys = []
+        self.fetches = 0
+        self.delay = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802
+                stub.fetches += 1
+                time.sleep(stub.delay)
+                body = json.dumps({"keys": [json.loads(k.export_public()) for k in stub.keys]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:%d/certs" % self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+KEY_A = make_key("a")
+KEY_B = make_key("b")
+KEY_C = make_key("c")
+
+
+@pytest.fixture(autouse=True)
+def auth_settings(monkeypatch):
+    monkeypatch.setattr(settings, "BYPASS_AUTH_SIG_CHECK", False, raising=False)
+    monkeypatch.setattr(settings, "KEYCLOAK_PUBLIC_KEY", static_key(KEY_A), raising=False)
+    monkeypatch.setattr(settings, "KEYCLOAK_JWKS_SOURCE", None, raising=False)
+
+
+@pytest.fixture
+def jwks():
+    stub = StubJwks()
+    stub.keys = [KEY_A, KEY_B]
+    yield stub
+    stub.close()
+
+
+def make_middleware(jwks_source=None, **kwargs) -> KeycloakAuthenticationMiddleware:
+    async def app(scope, receive, send):
+        body = json.dumps(scope["state"]["user"]).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": body})
+
+    return KeycloakAuthenticationMiddleware(
+        app, jwks_source=jwks_source, log_sample_rate=0, rejected_log_sample_rate=0, **kwargs
+    )
+
+
+def call(auth: KeycloakAuthenticationMiddleware, token: str, path: str = "/me"):
+    """(status, JSON body) of one GET `path` through the middleware."""
+    return asyncio.run(request(auth, token, path))
+
+
+async def request(auth: KeycloakAuthenticationMiddleware, token: str, path: str = "/me"):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": [(b"authorization", ("Bearer %s" % token).encode())],
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await auth(scope, receive, send)
+    status = sent[0]["status"]
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return status, json.loads(body)
+
+
+def test_jwks_kid_lookup(jwks):
+    auth = make_middleware(jwks.url)
+    try:
+        assert jwks.fetches == 0  # loaded by the first request, not while building the middleware
+        assert call(auth, make_token(KEY_A, "a@example.com")) == (200, {"email": "a@example.com"})
+        assert call(auth, make_token(KEY_B, "b@example.com")) == (200, {"email": "b@example.com"})
+        assert jwks.fetches == 1  # the initial load only
+    finally:
+        auth.jwks.stop()
+
+
+def test_jwks_token_signed_with_other_key_is_rejected(jwks):
+    auth = make_middleware(jwks.url)
+    forged = make_token(jwk.JWK.generate(kty="RSA", size=2048, kid="a"))
+    try:
+        auth.jwks.start()
+        with pytest.raises(InvalidJWSSignature):
+            auth._decode_token(forged)
+    finally:
+        auth.jwks.stop()
+
+
+def test_jwks_rotation_drops_cached_tokens(jwks):
+    auth = make_middleware(jwks.url)
+    token_a = make_token(KEY_A)
+    try:
+        assert call(auth, token_a)[0] == 200
+        assert call(auth, token_a)[0] == 200
+        assert auth.cache_stats()["hits"] == 1
+
+        jwks.keys = [KEY_B, KEY_C]
+        auth.jwks.refresh()
+        assert auth.cache_stats()["size"] == 0
+        with pytest.raises(UnknownKeyIdError):
+            auth._decode_token(token_a)
+        assert call(auth, token_a) == (401, {"detail": "Unknown signing key"})
+        assert call(auth, make_token(KEY_C))[0] == 200
+    finally:
+        auth.jwks.stop()
+
+
+def test_unknown_kid_refreshes_once(jwks):
+    auth = make_middleware(jwks.url)
+    token_c = make_token(KEY_C)
+    try:
+        # the initial load was just now: within min_refresh_gap, no fetch
+        assert call(auth, token_c) == (401, {"detail": "Unknown signing key"})
+        assert jwks.fetches == 1
+
+        auth.jwks.min_refresh_gap = 0
+        assert call(auth, token_c) == (401, {"detail": "Unknown signing key"})
+        assert jwks.fetches == 2  # one refresh, one retry
+
+        jwks.keys = [KEY_A, KEY_B, KEY_C]
+        assert call(auth, token_c)[0] == 200
+        assert jwks.fetches == 3
+        assert call(auth, token_c)[0] == 200
+        assert jwks.fetches == 3  # known now: no refresh
+    finally:
+        auth.jwks.stop()
+
+
+async def concurrently(auth, token, count=10):
+    return await asyncio.gather(*(request(auth, token) for _ in range(count)))
+
+
+def test_concurrent_first_requests_share_the_initial_load(jwks):
+    auth = make_middleware(jwks.url)
+    jwks.delay = 0.2
+    try:
+        responses = asyncio.run(concurrently(auth, make_token(KEY_A)))
+        assert [status for status, _ in responses] == [200] * 10
+        assert jwks.fetches == 1
+    finally:
+        auth.jwks.stop()
+
+
+def test_concurrent_unknown_kid_lookups_fetch_once(jwks):
+    auth = make_middleware(jwks.url)
+    try:
+        call(auth, make_token(KEY_A))
+        auth.jwks.min_refresh_gap = 0
+        jwks.delay = 0.2
+        token_c = make_token(KEY_C)
+
+        # still unknown after the refresh: the callers that waited take its answer
+        responses = asyncio.run(concurrently(auth, token_c))
+        assert responses == [(401, {"detail": "Unknown signing key"})] * 10
+        assert jwks.fetches == 2
+
+        jwks.keys = [KEY_A, KEY_B, KEY_C]
+        responses = asyncio.run(concurrently(auth, token_c))
+        assert [status for status, _ in responses] == [200] * 10
+        assert jwks.fetches == 3
+    finally:
+        auth.jwks.stop()
+
+
+def test_static_key_rotation_drops_cached_tokens(monkeypatch):
+    auth = make_middleware()
+    key = make_key()
+    monkeypatch.setattr(settings, "KEYCLOAK_PUBLIC_KEY", static_key(key))
+    token = make_token(key)
+    assert call(auth, token)[0] == 200
+    assert call(auth, token)[0] == 200
+    assert auth.cache_stats()["hits"] == 1
+
+    monkeypatch.setattr(settings, "KEYCLOAK_PUBLIC_KEY", static_key(make_key()))
+    assert call(auth, token) == (401, {"detail": "JWT Signature Verification failed"})
+    assert auth.cache_stats()["key_reloads"] == 2
+
+
+def test_only_module_excluded_paths_skip_auth():
+    auth = KeycloakAuthenticationMiddleware(
+        None, excluded_paths={"/health"}, log_sample_rate=0, rejected_log_sample_rate=0
+    )
+    passed = []
+
+    async def app(scope, receive, send):
+        passed.append(scope["path"])
+
+    auth.app = app
+
+    async def send(message):
+        pass
+
+    for path in ("/docs", "/health"):
+        scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+        asyncio.run(auth(scope, None, send))
+    assert passed == ["/docs"]
+
+
+def test_stats_path_is_off_by_default():
+    assert call(make_middleware(), make_token(KEY_A, "a@example.com"), "/auth/stats") == (
+        200, {"email": "a@example.com"}
+    )
+
+
+def test_stats_endpoint():
+    auth = make_middleware(stats_path=AUTH_STATS_PATH)
+    token = make_token(KEY_A)
+    assert call(auth, "not-a-token", "/auth/stats")[0] == 401
+    call(auth, token)
+    call(auth, token)
+    status, stats = call(auth, token, "/auth/stats")
+    assert status == 200
+    # misses: the malformed token and the first /me; hits: the second /me and this call
+    assert stats["hits"] == 2 and stats["misses"] == 2 and stats["size"] == 1
+    assert stats["key_reloads"] == 1
@@ -0,0 +1,107 @@
+"""
+Parity of the batch heading classifier with the per-block rules it
+replaced: heading_levels() / classify_pages() against
+determine_heading_level() and the old per-block structure loop.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.heading_classifier import POINT_PREFIXES, BlockColumns, classify_pages, heading_levels
+from app.heading_utils import determine_heading_level
+
+
+def block(text, size=None, font=None, x0=None, spans=True, bbox=True):
+    """A Docling-like text block; spans / bbox False leave them out, None makes them empty."""
+    return SimpleNamespace(
+        text=text,
+        spans=[SimpleNamespace(size=size, font=font)] if spans else ([] if spans is None else None),
+        bbox=(x0, 0, 100, 20) if bbox else (() if bbox is None else None),
+    )
+
+
+def legacy_structure(blocks, prefixes=POINT_PREFIXES):
+    """The per-block loop classify_pages() replaced."""
+    structure = []
+    for b in blocks:
+        text = (b.text or "").strip()
+        if not text:
+            continue
+        level = determine_heading_level(b)
+        if level in (1, 2):
+            structure.append({"type": "heading", "level": level, "text": text})
+        elif text.lstrip().startswith(prefixes):
+            structure.append({"type": "point", "text": text})
+        else:
+            structure.append({"type": "paragraph", "text": text})
+    return structure
+
+
+EDGE_CASES = [
+    # empty / missing text
+    block(""),
+    block("   ", size=24, font="Helvetica-Bold"),
+    block(None, size=12),
+    # bold vs non-bold around the size thresholds
+    block("plain text", size=14, font="Helvetica-Bold"),
+    block("plain text", size=14, font="Helvetica"),
+    block("plain text", size=13.9, font="Helvetica-Bold"),
+    block("plain text", size=18, font="Helvetica"),
+    block("plain text", size=17.99, font=None),
+    block("plain text", size=12, font=""),
+    block("plain text", size=24, font="ArialBold"),
+    # numbering beats size and case
+    block("1 Introduction", size=8),
+    block("1.2 Scope of work", size=24, font="Helvetica-Bold"),
+    block("1.2.3.4 Deep numbering", size=12),
+    block("12.  Spaced", size=12),
+    block("A. Appendix", size=8),
+    block("B.Missing space", size=8, x0=300),
+    block("2. numbered item", size=12),
+    block("3) numbered with paren", size=12),
+    # short / long upper and title case
+    block("OVERVIEW", size=8),
+    block("ONE TWO THREE FOUR FIVE SIX SEVEN EIGHT", size=8),
+    block("ONE TWO THREE FOUR FIVE SIX SEVEN EIGHT NINE", size=8),
+    block("Project Summary", size=8),
+    block("One Two Three Four Five Six Seven Eight Nine Ten", size=8),
+    block("One Two Three Four Five Six Seven Eight Nine Ten Eleven", size=8),
+    block("  padded Title  ", size=8),
+    block("x" * 130, size=12),
+    # points
+    block("- dash point", size=12),
+    block("• bullet", size=24),
+    block("-no space", size=12),
+    # malformed or empty spans fall through to the bbox
+    block("plain text", spans=False, x0=10),
+    block("plain text", spans=None, x0=60),
+    block("plain text", size="12", font="Helvetica-Bold", x0=39.9),
+    block("plain text", size=float("nan"), x0=40),
+    block("plain text", size=12, font=5, x0=89.9),
+    block("plain text", spans=False, x0=90),
+    block("plain text", spans=False, x0="7"),
+    block("plain text", spans=False, bbox=False),
+    block("plain text", spans=False, bbox=None),
+]
+
+
+@pytest.mark.parametrize("b", EDGE_CASES, ids=lambda b: repr(vars(b))[:60])
+def test_heading_level_matches_per_block_rules(b):
+    assert heading_levels(BlockColumns.from_docling_blocks([b])).tolist() == [determine_heading_level(b)]
+
+
+def test_heading_levels_of_all_edge_cases_at_once():
+    expected = [determine_heading_level(b) for b in EDGE_CASES]
+    assert heading_levels(BlockColumns.from_docling_blocks(EDGE_CASES)).tolist() == expected
+
+
+@pytest.mark.parametrize("prefixes", [POINT_PREFIXES, POINT_PREFIXES + ("-", "*")])
+def test_classify_pages_matches_per_block_loop(prefixes):
+    pages = [EDGE_CASES[:7], [], EDGE_CASES[7:25], EDGE_CASES[25:]]
+    batch = [[item.to_dict() for item in structure] for structure in classify_pages(pages, prefixes)]
+    assert batch == [legacy_structure(page, prefixes) for page in pages]
+
+
+def test_classify_pages_without_blocks():
+    assert classify_pages([]) == []
+    assert classify_pages([[], []]) == [[], []]
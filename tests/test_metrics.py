@@ -0,0 +1,25 @@
+"""
+/metrics rendering: stage histograms and the counters / gauges components
+register from their stats().
+"""
+from app import metrics
+from app.metrics import StatsMetrics, register_metrics, render_prometheus
+
+
+def test_registered_stats_are_rendered(monkeypatch):
+    monkeypatch.setattr(metrics, "_collectors", list(metrics._collectors))
+    stats = {"idle": 2, "hits": 5, "wait_seconds": 0.25}
+    register_metrics(StatsMetrics("pool", lambda: stats, {
+        "idle": ("gauge", "Idle items."),
+        "hits": ("counter", "Hits."),
+        "wait_seconds": ("counter", "Waiting."),
+    }))
+    stats["hits"] = 6  # read when rendered, not when registered
+    text = render_prometheus()
+    assert text.startswith("# HELP extraction_stage_seconds ")
+    assert text.endswith(
+        "# HELP pool_idle Idle items.\n# TYPE pool_idle gauge\npool_idle 2\n"
+        "# HELP pool_hits_total Hits.\n# TYPE pool_hits_total counter\npool_hits_total 6\n"
+        "# HELP pool_wait_seconds_total Waiting.\n# TYPE pool_wait_seconds_total counter\n"
+        "pool_wait_seconds_total 0.25\n"
+    )
@@ -0,0 +1,193 @@
+"""
+Ranged downloads against a local Range-serving HTTP server and moto's S3:
+part splitting, Range / If-Range headers, byte-exact reassembly of parts
+that finish out of order, retried parts and the failure paths.
+"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import pytest
+import requests
+from botocore.exceptions import ClientError
+from moto import mock_aws
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.pdf_buffer import PdfBuffer
+from app.ranged_download import (
+    RangeNotSupportedError,
+    download_ranged,
+    http_range_fetcher,
+    s3_range_fetcher,
+    split_ranges,
+)
+
+DATA = os.urandom(100_000 + 123)  # not a multiple of the part size
+PART = 10_000
+ETAG = '"v1"'
+
+
+class RangeServer:
+    """
+    Serves DATA with single byte ranges and records each GET's headers.
+    `behaviour(first, last)` may return "slow", "short", "fail_once",
+    "ignore" or None for a normal 206.
+    """
+
+    def __init__(self, behaviour=lambda first, last: None, etag=ETAG):
+        self.requests = []
+        self.failed = set()
+        self.behaviour = behaviour
+        self.etag = etag
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802
+                server.requests.append(dict(self.headers))
+                spec = self.headers.get("Range", "")
+                first, last = (int(x) for x in spec[len("bytes="):].split("-"))
+                how = server.behaviour(first, last)
+                if_range = self.headers.get("If-Range")
+                if how == "ignore" or (if_range is not None and if_range != server.etag):
+                    return self._send(200, DATA)
+                if how == "fail_once" and (first, last) not in server.failed:
+                    server.failed.add((first, last))
+                    return self._send(503, b"busy")
+                if how == "slow":
+                    time.sleep(0.2)
+                part = DATA[first:last + 1]
+                if how == "short":
+                    part = part[:-1]
+                self._send(206, part, {"Content-Range": "bytes %d-%d/%d" % (first, last, len(DATA))})
+
+            def _send(self, status, body, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client refused a 200 before reading it
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:%d/doc.pdf" % self.http.server_address[1]
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(*args, **kwargs):
+        servers.append(RangeServer(*args, **kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def session(retries=0):
+    """A session like s3_utils.get_http_session(): 5xx GETs are retried by the adapter."""
+    s = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0, status_forcelist=(503,), allowed_methods=frozenset(["GET"]))
+    s.mount("http://", HTTPAdapter(max_retries=retry))
+    return s
+
+
+def download(fetch_range, size=len(DATA), concurrency=4, **buffer_kwargs):
+    dest = PdfBuffer(expected_size=size, **buffer_kwargs)
+    download_ranged(dest, size, fetch_range, PART, concurrency)
+    return dest
+
+
+def test_split_ranges():
+    assert split_ranges(25, 10) == [(0, 9), (10, 19), (20, 24)]
+    assert split_ranges(20, 10) == [(0, 9), (10, 19)]
+    assert split_ranges(1, 10) == [(0, 0)]
+    assert split_ranges(0, 10) == []
+
+
+@pytest.mark.parametrize("max_memory", [None, 1])  # in memory / spilled to a temp file
+def test_parts_reassemble_byte_exact(serve, max_memory):
+    server = serve()
+    dest = download(http_range_fetcher(session(), server.url, ETAG, 5), max_memory=max_memory)
+    with dest:
+        assert (dest.path is not None) == (max_memory == 1)
+        assert dest.tell() == 0 and dest.read() == DATA
+    ranges = sorted(r["Range"] for r in server.requests)
+    assert ranges == sorted("bytes=%d-%d" % part for part in split_ranges(len(DATA), PART))
+    assert all(r["If-Range"] == ETAG for r in server.requests)
+
+
+def test_parts_finishing_out_of_order(serve):
+    # the first parts are the slowest, so later offsets are written first
+    server = serve(lambda first, last: "slow" if first < 3 * PART else None)
+    with download(http_range_fetcher(session(), server.url, None, 5)) as dest:
+        assert dest.read() == DATA
+    assert "If-Range" not in server.requests[0]
+
+
+def test_failed_part_is_retried(serve):
+    server = serve(lambda first, last: "fail_once" if first == 5 * PART else None)
+    with download(http_range_fetcher(session(retries=2), server.url, ETAG, 5)) as dest:
+        assert dest.read() == DATA
+    assert len(server.requests) == len(split_ranges(len(DATA), PART)) + 1
+
+
+def test_part_failing_past_its_retries_fails_the_download(serve):
+    server = serve(lambda first, last: "fail_once" if first == 0 else None)
+    with pytest.raises(requests.RequestException):  # RetryError once the session gives up
+        download(http_range_fetcher(session(), server.url, ETAG, 5), concurrency=1)
+    # the failure cancels the parts that had not started
+    assert len(server.requests) < len(split_ranges(len(DATA), PART))
+
+
+def test_short_part_fails_the_download(serve):
+    server = serve(lambda first, last: "short" if first == 2 * PART else None)
+    with pytest.raises(IOError, match="Range 20000-29999 returned 9999 bytes"):
+        download(http_range_fetcher(session(), server.url, ETAG, 5))
+
+
+def test_ignored_range_or_changed_object_is_refused(serve):
+    server = serve(lambda first, last: "ignore")
+    with pytest.raises(RangeNotSupportedError):
+        download(http_range_fetcher(session(), server.url, ETAG, 5), concurrency=1)
+
+    server = serve(etag='"v2"')  # If-Range no longer matches: the whole object comes back
+    with pytest.raises(RangeNotSupportedError):
+        download(http_range_fetcher(session(), server.url, ETAG, 5), concurrency=1)
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="docs")
+        client.put_object(Bucket="docs", Key="doc.pdf", Body=DATA)
+        yield client
+
+
+def test_s3_parts_reassemble_byte_exact(s3):
+    etag = s3.head_object(Bucket="docs", Key="doc.pdf")["ETag"]
+    with download(s3_range_fetcher(s3, "docs", "doc.pdf", etag)) as dest:
+        assert dest.read() == DATA
+
+
+def test_s3_object_replaced_mid_download_fails(s3):
+    etag = s3.head_object(Bucket="docs", Key="doc.pdf")["ETag"]
+    s3.put_object(Bucket="docs", Key="doc.pdf", Body=DATA[::-1])
+    with pytest.raises(ClientError, match="PreconditionFailed"):
+        download(s3_range_fetcher(s3, "docs", "doc.pdf", etag))
@@ -0,0 +1,118 @@
+"""
+stitch_tables() against the merges it replaced: the last-table loop of
+docling_parser.merge_tables (adjacent_pages=True) and the all-pairs
+pratice2.merge_tables_across_pages (adjacent_pages=False), on the corpus
+tables, the stitching benchmark's fragments and random fragments.
+"""
+import random
+import sys
+from difflib import SequenceMatcher
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+from app.table_stitch import stitch_tables  # noqa: E402
+from bench_table_stitch import legacy_merge, synthetic_fragments  # noqa: E402  (the old pratice2 merge)
+
+
+def legacy_adjacent(tables):
+    """docling_parser.merge_tables before table_stitch."""
+    def normalize_text(t):
+        return " ".join(t.strip().split()).lower()
+
+    def headers_match(h1, h2):
+        if not h1 or not h2 or len(h1) != len(h2):
+            return False
+        return all(SequenceMatcher(None, normalize_text(a), normalize_text(b)).ratio() >= 0.75
+                   for a, b in zip(h1, h2))
+
+    merged = []
+    prev = None
+    for t in tables:
+        if not t["rows"]:
+            continue
+        header = t["rows"][0]
+        if prev and headers_match(prev["rows"][0], header) and t["page"] == prev["end_page"] + 1:
+            prev["rows"].extend(t["rows"][1:])
+            prev["end_page"] = t["page"]
+        else:
+            if prev:
+                merged.append(prev)
+            prev = {"start_page": t["page"], "end_page": t["page"], "rows": [row[:] for row in t["rows"]]}
+    if prev:
+        merged.append(prev)
+    return merged
+
+
+CELLS = ["Invoice Number", "invoice no.", "lnvoice number", "Date", "date ", "Amount", "amount",
+         "Total", "Owner", "", "  ", "Qty", "Quantity", "Status", "status", "Notes"]
+
+
+def random_fragments(seed: int, count: int = 300):
+    """Fragments with OCR-style variants, duplicate and empty cells, empty tables and several per page."""
+    rng = random.Random(seed)
+    fragments = []
+    page = 1
+    headers = []
+    for _ in range(count):
+        if rng.random() < 0.4:
+            page += rng.choice((1, 1, 1, 2))
+        if headers and rng.random() < 0.6:
+            header = list(rng.choice(headers))
+            if rng.random() < 0.3:
+                header[rng.randrange(len(header))] = rng.choice(CELLS)
+            if rng.random() < 0.1:
+                header.append(rng.choice(CELLS))
+        else:
+            header = [rng.choice(CELLS) for _ in range(rng.randint(1, 6))]
+            headers.append(header)
+        if rng.random() < 0.05:
+            rows = []
+        else:
+            rows = [header] + [[str(rng.randrange(100)) for _ in header] for _ in range(rng.randint(0, 3))]
+        fragments.append({"page": page, "rows": rows})
+    return fragments
+
+
+def corpus_tables():
+    pytest.importorskip("fitz")
+    from corpus import build_document
+    return build_document("tables", scale=0.5)[1]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_adjacent_pages_matches_last_table_loop(seed):
+    fragments = random_fragments(seed)
+    assert stitch_tables(fragments, adjacent_pages=True) == legacy_adjacent(fragments)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_any_page_matches_all_pairs_merge(seed):
+    fragments = random_fragments(seed)
+    assert stitch_tables(fragments, adjacent_pages=False) == legacy_merge(fragments)
+
+
+def test_benchmark_fragments():
+    fragments = synthetic_fragments(1000)
+    assert stitch_tables(fragments, adjacent_pages=True) == legacy_adjacent(fragments)
+    assert stitch_tables(fragments, adjacent_pages=False) == legacy_merge(fragments)
+
+
+def test_corpus_tables():
+    fragments = corpus_tables()
+    assert stitch_tables(fragments, adjacent_pages=True) == legacy_adjacent(fragments)
+    assert stitch_tables(fragments, adjacent_pages=False) == legacy_merge(fragments)
+
+
+def test_any_page_overlap_is_not_limited_to_the_first_cell():
+    # "invoice number" / "invoice no." differ by more than one edit, the other cells carry the overlap
+    fragments = [
+        {"page": 1, "rows": [["Invoice Number", "Date", "Amount", "Owner"], ["1", "2", "3", "4"]]},
+        {"page": 7, "rows": [["Notes"], ["x"]]},
+        {"page": 9, "rows": [["invoice no.", "Date", "Amount", "Owner"], ["5", "6", "7", "8"]]},
+    ]
+    merged = stitch_tables(fragments, adjacent_pages=False)
+    assert merged == legacy_merge(fragments)
+    assert [(m["start_page"], m["end_page"]) for m in merged] == [(1, 9), (7, 7)]